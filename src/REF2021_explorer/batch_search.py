@@ -0,0 +1,193 @@
+# pylint: disable=E0401
+""" Batch search of many terms in the statements in one pass.
+
+Searching for dozens of terms one at a time scans the statements once per
+term. Instead, the terms are compiled into a trie, and the trie into one
+regular expression, a lookahead that the regex engine runs over each text
+in a single pass and that stops at every position where some term starts,
+so that overlapping occurrences are all found. The trie is then walked
+from those positions only, to count every term starting there. Like an
+Aho-Corasick automaton, this finds all the terms in one pass, but the pass
+runs in the regex engine rather than character by character in Python.
+
+The terms are matched as case-insensitive substrings, as `ILIKE '%term%'`
+would, on the case-folded texts of trigram_index. The occurrences are
+counted per record and term, then summed by institution (and unit of
+assessment) into a hit matrix:
+
+    matrix = hit_matrix("unit_env_statements", "People", ["EDI", "Athena SWAN"])
+"""
+import re
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import REF2021_explorer.codebook as cb
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.records as rs
+import REF2021_explorer.trigram_index as ti
+
+# the key of the term numbers in the trie nodes, which no character can be
+TERMS_KEY = ""
+
+
+def parse_terms(text):
+    """Parse a list of terms, one per line.
+
+    Args:
+        text (str): The terms, one per line; blank lines are left out.
+
+    Returns:
+        (list): The distinct terms, in order.
+    """
+
+    return list(
+        dict.fromkeys(line.strip() for line in text.splitlines() if line.strip())
+    )
+
+
+def build_trie(terms):
+    """Build the trie of some terms.
+
+    Args:
+        terms (list): The case-folded terms.
+
+    Returns:
+        (dict): The root node; every node maps the next characters to the
+            child nodes, and TERMS_KEY to the numbers of the terms ending
+            there, if any.
+    """
+
+    trie = {}
+    for number, term in enumerate(terms):
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node.setdefault(TERMS_KEY, []).append(number)
+
+    return trie
+
+
+def trie_pattern(node):
+    """Translate a trie node into a regular expression matching its terms.
+
+    Args:
+        node (dict): The node; see build_trie.
+
+    Returns:
+        (str): The regular expression, which shares the common prefixes of
+            the terms so that every position is checked in one step.
+    """
+
+    branches = [
+        re.escape(char) + trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char != TERMS_KEY
+    ]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if TERMS_KEY in node:
+        pattern = f"(?:{pattern})?"
+
+    return pattern
+
+
+def build_matcher(terms):
+    """Compile some terms into a multi-term matcher.
+
+    Args:
+        terms (list): The case-folded terms.
+
+    Returns:
+        (dict, re.Pattern, int): The trie of the terms, the lookahead pattern
+            matching at every position where one of them starts and the
+            length of the longest term.
+    """
+
+    trie = build_trie(terms)
+    pattern = re.compile(f"(?={trie_pattern(trie)})", re.DOTALL)
+
+    return trie, pattern, max((len(term) for term in terms), default=0)
+
+
+def count_occurrences(matcher, text, nterms):
+    """Count the occurrences of some terms in a text.
+
+    Args:
+        matcher (tuple): The matcher of the terms; see build_matcher.
+        text (str): The case-folded text.
+        nterms (int): The number of terms.
+
+    Returns:
+        (list): The number of occurrences of every term.
+    """
+
+    trie, pattern, longest = matcher
+    counts = [0] * nterms
+    for match in pattern.finditer(text):
+        node = trie
+        for char in text[match.start() : match.start() + longest]:
+            node = node.get(char)
+            if node is None:
+                break
+            for number in node.get(TERMS_KEY, []):
+                counts[number] += 1
+
+    return counts
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def count_terms(page, section, terms, version):  # pylint: disable=W0613
+    """Count the occurrences of some terms in every record of a section.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        terms (tuple): The terms.
+        version (str): The version of the data source, used as cache key.
+
+    Returns:
+        (pandas.DataFrame): The counts, indexed by record id, one column per
+            term.
+    """
+
+    index = ti.get_index(page, section)
+    matcher = build_matcher([ti.fold(term) for term in terms])
+    counts = np.zeros((len(index["records"]), len(terms)), dtype=np.int64)
+    for number, text in enumerate(index["texts"]):
+        counts[number] = count_occurrences(matcher, text, len(terms))
+
+    return pd.DataFrame(
+        counts, index=pd.Index(index["records"], name="Record"), columns=list(terms)
+    )
+
+
+def hit_matrix(page, section, terms, by=None, records=None):
+    """Count the occurrences of some terms by institution (or other groups).
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        terms (list): The terms.
+        by (list): The key columns to group the records by; defaults to the
+            institution name.
+        records (array-like): The record ids to count; defaults to all.
+
+    Returns:
+        (pandas.DataFrame): The number of occurrences of every term (columns)
+            in every group (rows).
+    """
+
+    by = by or [cb.COL_INST_NAME]
+    counts = count_terms(
+        page, section, tuple(terms), rw.source_entry("data", page)["version"]
+    )
+    if records is not None:
+        counts = counts.loc[counts.index.isin(np.asarray(records))]
+    keys = rs.get_keys(page).loc[counts.index, by]
+
+    return counts.groupby(
+        [keys[column] for column in by], observed=True, sort=True
+    ).sum()
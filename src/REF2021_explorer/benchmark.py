@@ -0,0 +1,170 @@
+# pylint: disable=E0401
+""" Benchmarks of the data processing kernels.
+
+Compares the counting kernels in process, which count category codes with
+np.bincount, with the pandas value_counts and groupby they replace, on a
+dataset replicated 1x, 10x and 100x, and checks that they agree:
+
+    python -m REF2021_explorer.benchmark data/Results.parquet
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import REF2021_explorer.process as proc
+
+SCALES = [1, 10, 100]
+REPEAT = 5
+
+
+def pandas_counts(dset, col, sort=True):
+    """Count a column with pandas, as calculate_counts used to.
+
+    Args:
+        dset (pandas.DataFrame): The dataset to use.
+        col (str): The column to use.
+        sort (bool): Whether to sort the counts.
+
+    Returns:
+        (pandas.DataFrame): The counts and percentages.
+    """
+
+    dset_stats = (
+        dset[col]
+        .cat.remove_unused_categories()
+        .value_counts(sort=sort)
+        .to_frame(name="records")
+    )
+    dset_stats["records (%)"] = np.round(100 * dset_stats["records"] / dset.shape[0])
+    dset_stats.index.name = col
+
+    return dset_stats
+
+
+def pandas_grouped_counts(dset, columns):
+    """Count groups with pandas, as calculate_grouped_counts used to.
+
+    Args:
+        dset (pandas.DataFrame): The dataset to use.
+        columns (list): The columns to use for grouping.
+
+    Returns:
+        (pandas.DataFrame): The grouped counts and percentages.
+    """
+
+    dset_stats = (
+        dset[columns].groupby(columns, observed=True).size().to_frame(name="records")
+    )
+    dset_stats["records (%)"] = np.round(
+        100 * dset_stats["records"] / dset_stats["records"].sum()
+    )
+
+    return dset_stats.reset_index()
+
+
+def timed(func, *args, repeat=REPEAT):
+    """Time a function.
+
+    Args:
+        func (callable): The function.
+        *args: The arguments of the function.
+        repeat (int): The number of runs.
+
+    Returns:
+        (float, object): The best time in milliseconds and the result.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+
+    return 1000 * min(timings), result
+
+
+def compare(reference, kernel, dset, column_groups, repeat=REPEAT):
+    """Time a kernel and the pandas function it replaces on column groups.
+
+    Args:
+        reference (callable): The pandas function.
+        kernel (callable): The kernel.
+        dset (pandas.DataFrame): The dataset to use.
+        column_groups (list): The arguments of the functions after the
+            dataset, one per measurement.
+        repeat (int): The number of runs per measurement.
+
+    Returns:
+        (float, float, bool): The total times in milliseconds of the pandas
+            function and of the kernel, and whether the results agree.
+    """
+
+    reference_time, kernel_time, agree = 0, 0, True
+    for columns in column_groups:
+        elapsed, expected = timed(reference, dset, columns, repeat=repeat)
+        reference_time += elapsed
+        elapsed, result = timed(kernel, dset, columns, repeat=repeat)
+        kernel_time += elapsed
+        agree = agree and result.equals(expected)
+
+    return reference_time, kernel_time, agree
+
+
+def benchmark_counts(dset, scales=None, repeat=REPEAT):
+    """Compare the counting kernels with pandas.
+
+    Every categorical column is counted alone, and the consecutive pairs and
+    triples of categorical columns are counted together.
+
+    Args:
+        dset (pandas.DataFrame): The dataset to use.
+        scales (list): The numbers of copies of the dataset; defaults to SCALES.
+        repeat (int): The number of runs per measurement.
+
+    Returns:
+        (pandas.DataFrame): The total times in milliseconds per scale and
+            number of columns, and whether the results agree.
+    """
+
+    fields = proc.get_column_lists(dset, "category")
+    groups = {
+        1: (pandas_counts, proc.calculate_counts, fields),
+        2: (
+            pandas_grouped_counts,
+            proc.calculate_grouped_counts,
+            [fields[position : position + 2] for position in range(len(fields) - 1)],
+        ),
+        3: (
+            pandas_grouped_counts,
+            proc.calculate_grouped_counts,
+            [fields[position : position + 3] for position in range(len(fields) - 2)],
+        ),
+    }
+    rows = []
+    for scale in scales or SCALES:
+        scaled = pd.concat([dset] * scale, ignore_index=True)
+        for size, (reference, kernel, column_groups) in groups.items():
+            reference_time, kernel_time, agree = compare(
+                reference, kernel, scaled, column_groups, repeat=repeat
+            )
+            rows.append(
+                {
+                    "rows": scaled.shape[0],
+                    "columns": size,
+                    "groups": len(column_groups),
+                    "pandas (ms)": reference_time,
+                    "bincount (ms)": kernel_time,
+                    "speed-up": reference_time / kernel_time,
+                    "identical": agree,
+                }
+            )
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    for fname in sys.argv[1:] or ["data/Results.parquet"]:
+        print(fname)
+        print(benchmark_counts(pd.read_parquet(fname)).round(2).to_string(index=False))
@@ -4,13 +4,8 @@
 """
 import textwrap
 import logging
-import json
-from pathlib import Path
 from typing import Optional, Literal, TypedDict, Union, Tuple
 import pandas as pd
-import pyarrow.dataset
-import pyarrow.acero
-import duckdb
 import streamlit as st
 
 from pandas.api.types import (
@@ -20,6 +15,7 @@ from pandas.api.types import (
 )
 
 import REF2021_explorer.read_write as rw
+import REF2021_explorer.database as db
 import REF2021_explorer.shared_content as sh
 
 DEFAULT_MODEL = "gpt-3.5-turbo"
@@ -42,26 +38,6 @@ class TableInfo(TypedDict):
     columns: list[SchemaField]
 
 
-def unique_values(dataset: pyarrow.dataset.Dataset, column: str) -> list[str]:
-    """Returns unique values in a column of a dataset"""
-
-    return (
-        pyarrow.acero.Declaration.from_sequence(
-            [
-                pyarrow.acero.Declaration(
-                    "scan", pyarrow.acero.ScanNodeOptions(dataset)
-                ),
-                pyarrow.acero.Declaration(
-                    "aggregate", pyarrow.acero.AggregateNodeOptions([], [column])
-                ),
-            ]
-        )
-        .to_table()
-        .column(0)
-        .to_pylist()
-    )
-
-
 def get_column_type(column: dict[str, Optional[str]]) -> str:
     """Returns the type of a column in a parquet file"""
 
@@ -71,11 +47,11 @@ def get_column_type(column: dict[str, Optional[str]]) -> str:
     return column.get("pandas_type") or column.get("numpy_type") or "string"
 
 
-def get_schema(file: Path, enum_columns: None) -> TableInfo:
-    """Returns parquet file schema as a dictionary of tables that can be passed to the LLM
+def get_schema(catalog: dict, enum_columns: None) -> TableInfo:
+    """Returns a data source schema as a dictionary of tables that can be passed to the LLM
 
     Args:
-        db (str): Filename of file in parquet format
+        catalog (dict): Metadata catalog of the data source, see metadata.get_catalog
         enum_columns (list[str]): List of columns that should be considered
             enumerations, i.e the unique items in that column will be
             visible to the LLM; defaults to None
@@ -86,14 +62,8 @@ def get_schema(file: Path, enum_columns: None) -> TableInfo:
 
     if enum_columns is None:
         enum_columns = []
-    ds = pyarrow.dataset.dataset(file)
-    metadata = ds.schema.metadata
-    metadata_schema_bytes = metadata[list(metadata.keys())[0]]
-    metadata_schema = json.loads(metadata_schema_bytes.decode("utf-8"))
-    out_schema: TableInfo = {"rows": ds.count_rows(), "columns": []}
-    for column in metadata_schema["columns"]:
-        if column["name"] is None:  # skip unnamed columns, usually pandas indices
-            continue
+    out_schema: TableInfo = {"rows": catalog["rows"], "columns": []}
+    for column in catalog["columns"]:
         out_schema["columns"].append(
             {
                 "name": column["name"],
@@ -102,9 +72,7 @@ def get_schema(file: Path, enum_columns: None) -> TableInfo:
             }
         )
         if column["name"] in enum_columns:
-            out_schema["columns"][-1]["distinct_values"] = unique_values(
-                ds, column["name"]
-            )
+            out_schema["columns"][-1]["distinct_values"] = column.get("values")
     return out_schema
 
 
@@ -196,7 +164,7 @@ def run_sql(sql_stmt: str) -> Union[str, pd.DataFrame]:
         Union[str, pd.DataFrame]: Results of the SQL statement
     """
 
-    results = list(duckdb.query(sql_stmt.replace("`", '"')).fetchall())
+    results = db.query(sql_stmt.replace("`", '"')).fetchall()
     print("RESULTS", results)
     if len(results) == 1 and len(results[0]) == 1:
         return str(results[0][0])
@@ -285,7 +253,7 @@ def schema_to_text(schema: TableInfo) -> str:
         str: String representation of the table schema
     """
 
-    text = [f"CREATE TABLE '{rw.CHAT_DB}' ("]
+    text = [f'CREATE TABLE "{rw.CHAT_TABLE}" (']
     for field in schema["columns"]:
         if not field["name"].strip():
             continue
@@ -80,6 +80,19 @@ COLUMNS_UNIT_ENVIRONMENT_STATEMENTS = [
     "Collaboration and contribution to the research base, economy and society",
 ]
 
+COLUMNS_INSTITUTION_ENVIRONMENT_STATEMENTS = [
+    "Context and mission",
+    "Strategy",
+    "People",
+    "Income, infrastructure and facilities",
+]
+
+COLUMNS_ENVIRONMENT_STATEMENTS = list(
+    dict.fromkeys(
+        COLUMNS_INSTITUTION_ENVIRONMENT_STATEMENTS + COLUMNS_UNIT_ENVIRONMENT_STATEMENTS
+    )
+)
+
 ADDED_SUFFIXES = ["(added)", "(binned)"]
 
 ADDED_DESCRIPTIONS = {
@@ -0,0 +1,225 @@
+# pylint: disable=E0401
+""" Ranked search across every text section of every text-bearing source.
+
+One query is run on the search index (see search_index) of every section
+of the institution and unit environment statements and of the impact case
+studies at once, each in a worker of a process-wide pool of processes, so
+that the total time is close to that of the slowest section rather than
+their sum. The workers read the persisted indexes, building them the first
+time, and keep them in memory for the next queries.
+
+The best hits of every section are merged by their BM25 score, labelled
+with their source and section:
+
+    hits, totals = search('"research culture" OR "open research"')
+"""
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import REF2021_explorer.codebook as cb
+import REF2021_explorer.database as db
+import REF2021_explorer.metadata as md
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.search_index as si
+
+LOGGER = logging.getLogger(__name__)
+
+# settings
+WORKERS = int(os.environ.get("REF2021_SEARCH_WORKERS", "4"))
+
+# the text sections searched, by page
+SOURCES = {
+    "inst_env_statements": cb.COLUMNS_INSTITUTION_ENVIRONMENT_STATEMENTS,
+    "unit_env_statements": cb.COLUMNS_UNIT_ENVIRONMENT_STATEMENTS,
+    "impacts": [cb.COL_IMPACT_SUMMARY, cb.COL_IMPACT_DETAILS],
+}
+
+PAGE_COLUMN = "page"
+SECTION_COLUMN = "section"
+RECORD_COLUMN = "Record"
+SCORE_COLUMN = "score"
+HITS_COLUMN = "hits"
+
+_pools = []
+_pools_lock = threading.Lock()
+# the digest and index of the latest version of every section loaded by a
+# worker process, by page and section
+_indexes = {}
+
+
+def searcher():
+    """Get the process-wide pool of processes running the section searches.
+
+    The workers are spawned rather than forked, so that they do not inherit
+    the threads and locks of the server.
+
+    Returns:
+        (concurrent.futures.ProcessPoolExecutor): The pool.
+    """
+
+    with _pools_lock:
+        if not _pools:
+            _pools.append(
+                ProcessPoolExecutor(
+                    max_workers=WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            )
+
+    return _pools[0]
+
+
+def search_section(
+    page, section, fname, digest, query, k
+):  # pylint: disable=R0913,R0917
+    """Search a section, in a worker process.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        fname (str): The local file name or snapshot path of the source.
+        digest (str): The content hash of the source.
+        query (str): The query; see search_index.parse_query.
+        k (int): The number of hits to return.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray, int): The ids and scores of the best
+            hits and the number of hits; see search_index.search.
+    """
+
+    key = (page, section)
+    if key not in _indexes or _indexes[key][0] != digest:
+        # replace the index of a superseded version, so that it is released
+        _indexes.pop(key, None)
+        _indexes[key] = (digest, si.open_index(page, section, fname, digest))
+
+    return si.search(_indexes[key][1], query, k=k)
+
+
+def submit_searches(query, k, sources):
+    """Submit the search of every text section of some sources to the pool.
+
+    Args:
+        query (str): The query; see search_index.parse_query.
+        k (int): The number of hits to return from every section.
+        sources (dict): The sections to search, by page.
+
+    Returns:
+        (dict): The future result of every section, by page and section, or
+            None for the sections whose source cannot be read.
+    """
+
+    futures = {}
+    for page, sections in sources.items():
+        try:
+            entry = rw.source_entry("data", page)
+        except Exception as error:  # pylint: disable=W0718
+            LOGGER.warning("Search of %s failed: %s", page, error)
+            futures.update({(page, section): None for section in sections})
+            continue
+        for section in sections:
+            futures[(page, section)] = searcher().submit(
+                search_section,
+                page,
+                section,
+                entry["path"],
+                entry["hash"],
+                query,
+                k,
+            )
+
+    return futures
+
+
+def search(query, k=si.TOP_K, sources=None):
+    """Search every text section of the sources at once.
+
+    A section whose source cannot be read is left out, with a warning.
+
+    Args:
+        query (str): The query; see search_index.parse_query.
+        k (int): The number of hits to return.
+        sources (dict): The sections to search, by page; defaults to SOURCES.
+
+    Returns:
+        (pandas.DataFrame, pandas.DataFrame): The best k hits of all the
+            sections, best first, with their page, section, record id and
+            score, and the number of hits of every section, missing for the
+            sections left out.
+    """
+
+    hits = []
+    totals = []
+    for (page, section), future in submit_searches(
+        query, k, sources or SOURCES
+    ).items():
+        total = None
+        if future is not None:
+            try:
+                record_ids, scores, total = future.result()
+                hits.append(
+                    pd.DataFrame(
+                        {
+                            PAGE_COLUMN: page,
+                            SECTION_COLUMN: section,
+                            RECORD_COLUMN: record_ids,
+                            SCORE_COLUMN: scores,
+                        }
+                    )
+                )
+            except Exception as error:  # pylint: disable=W0718
+                LOGGER.warning("Search of %s %s failed: %s", page, section, error)
+        totals.append({PAGE_COLUMN: page, SECTION_COLUMN: section, HITS_COLUMN: total})
+
+    dset_hits = (
+        pd.concat(
+            hits
+            or [
+                pd.DataFrame(
+                    columns=[PAGE_COLUMN, SECTION_COLUMN, RECORD_COLUMN, SCORE_COLUMN]
+                )
+            ],
+            ignore_index=True,
+        )
+        .sort_values(SCORE_COLUMN, ascending=False, kind="stable")
+        .head(k)
+        .reset_index(drop=True)
+    )
+
+    return dset_hits, pd.DataFrame(totals).astype({HITS_COLUMN: "Int64"})
+
+
+def hit_texts(page, section, record_ids):
+    """Read the label columns and the section of some hits of a data source.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        record_ids (array-like): The record ids.
+
+    Returns:
+        (pandas.DataFrame): The institution name (and unit of assessment, if
+            the source has one) and the section, indexed by record id.
+    """
+
+    fields = md.column_names(md.get_catalog(page))
+    columns = [
+        column
+        for column in [cb.COL_INST_NAME, cb.COL_UNIT_OF_ASSESSMENT]
+        if column in fields
+    ]
+    names = ", ".join(f'"{column}"' for column in [RECORD_COLUMN, *columns, section])
+
+    return (
+        db.query(
+            f'SELECT {names} FROM "{page}" WHERE "{RECORD_COLUMN}" IN (SELECT UNNEST(?))',
+            [[int(record) for record in record_ids]],
+        )
+        .df()
+        .set_index(RECORD_COLUMN)
+    )
@@ -0,0 +1,184 @@
+# pylint: disable=E0401
+""" Process-wide DuckDB catalog with a view for every data source.
+
+Every entry in read_write.sources is exposed as a view named after its page
+(e.g. "results" or "inst_env_statements"), created on first use from the
+local copy of the file at its current manifest version. All the SQL in the
+app runs on cursors of one shared connection, so repeated queries reuse the
+parsed parquet metadata and the buffer pool. The snapshot tables of the
+sources too large to load are registered on each cursor instead, so that
+they are scanned in place.
+"""
+import os
+import re
+import logging
+import threading
+
+import duckdb
+
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.snapshot as sn
+
+LOGGER = logging.getLogger(__name__)
+
+# settings
+MEMORY_LIMIT = os.environ.get("REF2021_DUCKDB_MEMORY_LIMIT", "1GB")
+THREADS = int(os.environ.get("REF2021_DUCKDB_THREADS", "2"))
+# load the sources into in-memory tables instead of views over the files
+MATERIALISE = os.environ.get("REF2021_DUCKDB_MATERIALISE", "").lower() in [
+    "1",
+    "true",
+    "yes",
+]
+
+_connections = []
+_registered = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def quote(column):
+    """Quote a column name for SQL.
+
+    Args:
+        column (str): The column name.
+
+    Returns:
+        (str): The quoted identifier.
+    """
+
+    return '"' + column.replace('"', '""') + '"'
+
+
+def connection():
+    """Get the process-wide DuckDB connection.
+
+    Returns:
+        (duckdb.DuckDBPyConnection): The connection.
+    """
+
+    with _lock:
+        if not _connections:
+            _connections.append(
+                duckdb.connect(
+                    config={"memory_limit": MEMORY_LIMIT, "threads": THREADS}
+                )
+            )
+            _connections[0].execute("SET enable_object_cache = true")
+
+    return _connections[0]
+
+
+def cursor():
+    """Get the DuckDB cursor of the current thread.
+
+    Cursors share the catalog of the process-wide connection but can be
+    used concurrently, one per Streamlit script thread.
+
+    Returns:
+        (duckdb.DuckDBPyConnection): The cursor.
+    """
+
+    if getattr(_local, "cursor", None) is None:
+        _local.cursor = connection().cursor()
+
+    return _local.cursor
+
+
+def register(page):
+    """Create or update the view of a data source at its current version.
+
+    Args:
+        page (str): The page of the data source, used as the view name.
+    """
+
+    entry = rw.source_entry("data", page)
+    if sn.is_snapshot_path(entry["path"]) and rw.is_planned(page):
+        register_table(page, entry)
+        return
+    if _registered.get(page) == entry["version"]:
+        return
+
+    with _lock:
+        if _registered.get(page) != entry["version"]:
+            if sn.is_snapshot_path(entry["path"]):
+                # Arrow tables are only visible to the connection they are
+                # registered with, so copy the snapshot table into the catalog
+                _connections[0].register(
+                    f"{page}_snapshot", sn.read_table(entry["path"])
+                )
+                _connections[0].execute(
+                    f'CREATE OR REPLACE TABLE "{page}" AS '
+                    f'SELECT * FROM "{page}_snapshot"'
+                )
+                _connections[0].unregister(f"{page}_snapshot")
+            else:
+                relation = "TABLE" if MATERIALISE else "VIEW"
+                fname = entry["path"].replace("'", "''")
+                _connections[0].execute(
+                    f'CREATE OR REPLACE {relation} "{page}" AS '
+                    f"SELECT * FROM read_parquet('{fname}')"
+                )
+            _registered[page] = entry["version"]
+            LOGGER.info("Registered %s version %s", page, entry["version"])
+
+
+def register_table(page, entry):
+    """Register the snapshot table of a data source on the current cursor.
+
+    Arrow tables are only visible to the connection they are registered
+    with, so the memory-mapped table of a source too large to load is
+    registered on every cursor that queries it instead of being copied
+    into the catalog.
+
+    Args:
+        page (str): The page of the data source, used as the view name.
+        entry (dict): The snapshot entry of the source.
+    """
+
+    tables = cursor_tables()
+    if tables.get(page) != entry["version"]:
+        cursor().register(page, sn.read_table(entry["path"]))
+        tables[page] = entry["version"]
+
+
+def cursor_tables():
+    """Get the versions of the tables registered on the current cursor.
+
+    Returns:
+        (dict): The versions keyed by page.
+    """
+
+    if getattr(_local, "tables", None) is None:
+        _local.tables = {}
+
+    return _local.tables
+
+
+def register_referenced(sql_stmt):
+    """Register the data sources referenced in a SQL statement.
+
+    Args:
+        sql_stmt (str): The SQL statement.
+    """
+
+    connection()
+    for page in rw.sources["data"]:
+        if re.search(rf'(?:\bFROM|\bJOIN|,)\s+"?{page}\b', sql_stmt, re.I):
+            register(page)
+
+
+def query(sql_stmt, params=None):
+    """Run a SQL statement on the catalog.
+
+    Args:
+        sql_stmt (str): The SQL statement, referencing the sources by page name.
+        params (list): The values of the prepared statement parameters.
+
+    Returns:
+        (duckdb.DuckDBPyConnection): The cursor holding the result.
+    """
+
+    register_referenced(sql_stmt)
+
+    return cursor().execute(sql_stmt, params)
@@ -0,0 +1,490 @@
+# pylint: disable=E0401
+""" Bitmap-indexed filters of the datasets.
+
+The index of a dataset is built once per version and filled lazily, the
+first time a column is filtered:
+
+- a categorical column gets one bit-packed bitmap per category, so that a
+  selection of categories is the OR of their bitmaps,
+- a numeric column gets its row positions sorted by value, so that a range
+  of values is found with two binary searches,
+- a column with missing values gets the bitmap of those rows, so that they
+  can be kept with the MISSING_VALUE_LABEL choice of the levels and values
+  filters.
+
+The bitmap of each filter is kept in the session state between reruns, so
+a rerun only recomputes the filters that changed and combines the bitmaps
+of all filters with a bitwise AND. Filtering returns the positions of the
+selected rows, and no rows at all while nothing is filtered out.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.shared_content as sh
+
+# categorical columns with more categories are filtered with their sorted codes
+MAX_BITMAP_LEVELS = 1024
+# numeric columns with fewer distinct values are filtered by value
+MAX_VALUES = 10
+
+
+def build_index(dset):
+    """Create the (empty) filter index of a dataset.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+
+    Returns:
+        (dict): The number of rows, and the bitmaps, sorted positions and
+            missing value bitmaps of the columns, added as they are filtered.
+    """
+
+    return {"rows": dset.shape[0], "bitmaps": {}, "sorted": {}, "missing": {}}
+
+
+def get_index(page):
+    """Get the filter index of the data for a page at its current version.
+
+    Args:
+        page (str): The page to get the index for.
+
+    Returns:
+        (dict): The filter index; see build_index.
+    """
+
+    entry = rw.source_entry("data", page)
+
+    return load_index(page, entry["path"], entry["version"])
+
+
+@st.cache_resource(show_spinner=False, max_entries=rw.CACHE_ENTRIES)
+def load_index(page, fname, version):
+    """Create the filter index in a cache shared by every session.
+
+    The index is filled as the columns are filtered, by any session.
+
+    Args:
+        page (str): The page to get the index for.
+        fname (str): The local file name or snapshot path.
+        version (str): The manifest version of the file, used as cache key.
+
+    Returns:
+        (dict): The filter index; see build_index.
+    """
+
+    return build_index(rw.data_loader()(page, fname, version))
+
+
+def positions_to_bitmap(positions, rows):
+    """Pack row positions into a bitmap.
+
+    Args:
+        positions (numpy.ndarray): The row positions.
+        rows (int): The number of rows.
+
+    Returns:
+        (numpy.ndarray): The bit-packed bitmap, as uint8.
+    """
+
+    selected = np.zeros(rows, dtype=bool)
+    selected[positions] = True
+
+    return np.packbits(selected)
+
+
+def sorted_index(dset, index, column):
+    """Get the values of a column in ascending order and their row positions.
+
+    Categorical columns are sorted by their codes. Missing values are left out.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): The sorted values and their positions.
+    """
+
+    if column not in index["sorted"]:
+        if isinstance(dset[column].dtype, pd.CategoricalDtype):
+            values = dset[column].cat.codes.to_numpy()
+            present = values >= 0
+        else:
+            values = dset[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            present = ~np.isnan(values)
+        positions = np.flatnonzero(present)
+        order = np.argsort(values[positions], kind="stable")
+        index["sorted"][column] = (values[positions][order], positions[order])
+
+    return index["sorted"][column]
+
+
+def missing_bitmap(dset, index, column):
+    """Get the bitmap of the rows missing a value of a column.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column.
+
+    Returns:
+        (numpy.ndarray): The bitmap of the rows with a missing value.
+    """
+
+    if column not in index["missing"]:
+        index["missing"][column] = positions_to_bitmap(
+            np.flatnonzero(dset[column].isna().to_numpy(dtype=bool)), index["rows"]
+        )
+
+    return index["missing"][column]
+
+
+def equal_to_bitmap(dset, index, column, selected):
+    """Get the bitmap of the rows equal to some values, with the sorted index.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column.
+        selected (numpy.ndarray): The values, or the codes of categorical
+            columns.
+
+    Returns:
+        (numpy.ndarray): The bitmap of the selected rows.
+    """
+
+    values, positions = sorted_index(dset, index, column)
+    starts = np.searchsorted(values, selected, side="left")
+    stops = np.searchsorted(values, selected, side="right")
+
+    return positions_to_bitmap(
+        np.concatenate(
+            [positions[start:stop] for start, stop in zip(starts, stops)]
+            or [np.array([], dtype=np.int64)]
+        ),
+        index["rows"],
+    )
+
+
+def level_bitmaps(dset, index, column):
+    """Get the bitmaps of the categories of a categorical column.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column.
+
+    Returns:
+        (numpy.ndarray): One bitmap per category code, as rows of uint8.
+    """
+
+    if column not in index["bitmaps"]:
+        codes, positions = sorted_index(dset, index, column)
+        bounds = np.searchsorted(codes, np.arange(len(dset[column].cat.categories) + 1))
+        bitmaps = np.zeros((len(bounds) - 1, -(-index["rows"] // 8)), dtype=np.uint8)
+        for code, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            bitmaps[code] = positions_to_bitmap(positions[start:stop], index["rows"])
+        index["bitmaps"][column] = bitmaps
+
+    return index["bitmaps"][column]
+
+
+def select_levels(dset, index, column, selected):
+    """Get the bitmap of the rows in some categories.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The categorical column.
+        selected (list): The selected categories.
+
+    Returns:
+        (numpy.ndarray): The bitmap of the selected rows.
+    """
+
+    codes = dset[column].cat.categories.get_indexer(selected)
+    codes = codes[codes >= 0]
+    if len(dset[column].cat.categories) > MAX_BITMAP_LEVELS:
+        return equal_to_bitmap(dset, index, column, codes)
+    if len(codes) == 0:
+        return np.zeros(-(-index["rows"] // 8), dtype=np.uint8)
+
+    return np.bitwise_or.reduce(level_bitmaps(dset, index, column)[codes], axis=0)
+
+
+def select_values(dset, index, column, selected):
+    """Get the bitmap of the rows with some values of a numeric column.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The numeric column.
+        selected (list): The selected values.
+
+    Returns:
+        (numpy.ndarray): The bitmap of the selected rows.
+    """
+
+    return equal_to_bitmap(dset, index, column, np.asarray(selected, dtype=np.float64))
+
+
+def select_range(dset, index, column, low, high):
+    """Get the bitmap of the rows with values in a closed range.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The numeric column.
+        low (float): The lowest value.
+        high (float): The highest value.
+
+    Returns:
+        (numpy.ndarray): The bitmap of the selected rows.
+    """
+
+    values, positions = sorted_index(dset, index, column)
+    start = np.searchsorted(values, low, side="left")
+    stop = np.searchsorted(values, high, side="right")
+
+    return positions_to_bitmap(positions[start:stop], index["rows"])
+
+
+def select_pattern(dset, index, column, pattern, case=True):
+    """Get the bitmap of the rows whose text contains a pattern.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column.
+        pattern (str): The regular expression, searched for literally if it
+            is not a valid one.
+        case (bool): Whether the search is case sensitive.
+
+    Returns:
+        (numpy.ndarray): The bitmap of the selected rows.
+    """
+
+    try:
+        re.compile(pattern)
+        regex = True
+    except re.error:
+        regex = False
+    matches = (
+        dset[column]
+        .astype(str)
+        .str.contains(pattern, case=case, regex=regex, na=False)
+        .to_numpy(dtype=bool, na_value=False)
+    )
+
+    return positions_to_bitmap(np.flatnonzero(matches), index["rows"])
+
+
+def combine(bitmaps, rows):
+    """Combine the bitmaps of some filters.
+
+    Args:
+        bitmaps (list): The bitmaps of the filters.
+        rows (int): The number of rows.
+
+    Returns:
+        (numpy.ndarray): The positions of the rows selected by every filter,
+            or None if there are no filters.
+    """
+
+    if not bitmaps:
+        return None
+
+    return np.flatnonzero(
+        np.unpackbits(np.bitwise_and.reduce(bitmaps, axis=0), count=rows)
+    )
+
+
+def column_kind(dset, index, column):
+    """Get the kind of filter of a column.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column.
+
+    Returns:
+        (str): "levels" for categorical columns, "values" for numeric columns
+            with fewer than MAX_VALUES distinct values, "range" for the other
+            numeric columns and "pattern" for any other column.
+    """
+
+    dtype = dset[column].dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return "levels"
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        values, _ = sorted_index(dset, index, column)
+        distinct = np.count_nonzero(np.diff(values)) + 1 if len(values) else 0
+        return "values" if distinct < MAX_VALUES else "range"
+
+    return "pattern"
+
+
+def column_choices(dset, index, column, kind):
+    """Get the choices offered by the filter of a column.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column.
+        kind (str): The kind of filter; see column_kind.
+
+    Returns:
+        (list or tuple): The values to choose from for "levels" and "values"
+            filters, followed by MISSING_VALUE_LABEL if some values are
+            missing, the lowest and highest values for "range" filters, or
+            None for "pattern" filters and empty columns.
+    """
+
+    if kind == "pattern":
+        return None
+    values, _ = sorted_index(dset, index, column)
+    missing = [sh.MISSING_VALUE_LABEL] if len(values) < index["rows"] else []
+    if kind == "levels":
+        return list(dset[column].cat.categories[np.unique(values)]) + missing
+    if kind == "values":
+        return np.unique(values).tolist() + missing
+    if len(values) == 0:
+        return None
+
+    return (float(values[0]), float(values[-1]))
+
+
+def filter_widget(column, kind, choices, key):
+    """Display the widget of a filter.
+
+    Args:
+        column (str): The column to filter on.
+        kind (str): The kind of filter; see column_kind.
+        choices (list or tuple): The choices of the filter; see column_choices.
+        key (str): The key of the filters.
+
+    Returns:
+        (tuple): The kind of filter and its state, or None if the widget
+            leaves every row selected.
+    """
+
+    left, right = st.columns((1, 20))
+    left.write("↳")
+    label = sh.FILTER_VALUES_PROMPT.format(column=column)
+    if kind in ["levels", "values"]:
+        selected = right.multiselect(
+            label, choices, default=choices, key=f"{key}_{column}"
+        )
+        return None if len(selected) == len(choices) else (kind, tuple(selected))
+    if kind == "range":
+        if choices is None or choices[0] == choices[1]:
+            return None
+        low, high = choices
+        selected = right.slider(
+            label,
+            low,
+            high,
+            (low, high),
+            step=(high - low) / 100,
+            key=f"{key}_{column}",
+        )
+        return None if tuple(selected) == (low, high) else (kind, tuple(selected))
+    pattern = right.text_input(
+        sh.FILTER_PATTERN_PROMPT.format(column=column), key=f"{key}_{column}"
+    )
+
+    return (kind, pattern) if pattern else None
+
+
+def select(dset, index, column, state):
+    """Get the bitmap of a filter.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset.
+        column (str): The column to filter on.
+        state (tuple): The kind of filter and its state; see filter_widget.
+
+    Returns:
+        (numpy.ndarray): The bitmap of the selected rows.
+    """
+
+    kind, selected = state
+    if kind in ["levels", "values"]:
+        values = [value for value in selected if value != sh.MISSING_VALUE_LABEL]
+        if kind == "levels":
+            bitmap = select_levels(dset, index, column, values)
+        else:
+            bitmap = select_values(dset, index, column, values)
+        if len(values) < len(selected):
+            bitmap = bitmap | missing_bitmap(dset, index, column)
+        return bitmap
+    if kind == "range":
+        return select_range(dset, index, column, *selected)
+
+    return select_pattern(dset, index, column, selected)
+
+
+def filter_rows(dset, index=None, key="filters"):
+    """Display the filters of a dataset and select the rows they keep.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset, e.g. from get_index;
+            built for this rerun if missing or built for another dataset.
+        key (str): The key of the widgets and of the cached filters.
+
+    Returns:
+        (numpy.ndarray): The positions of the selected rows, or None if no
+            rows are filtered out.
+    """
+
+    if index is None or index["rows"] != dset.shape[0]:
+        index = build_index(dset)
+    # the bitmaps of the filters, kept between reruns for the same index
+    cache = st.session_state.get(f"{key}_bitmaps")
+    if cache is None or cache["index"] is not index:
+        cache = {"index": index, "bitmaps": {}}
+        st.session_state[f"{key}_bitmaps"] = cache
+
+    bitmaps = []
+    with st.container():
+        columns = st.multiselect(
+            sh.FILTER_COLUMNS_PROMPT, dset.columns, key=f"{key}_multiselect"
+        )
+        for column in columns:
+            kind = column_kind(dset, index, column)
+            state = filter_widget(
+                column, kind, column_choices(dset, index, column, kind), key
+            )
+            if state is None:
+                continue
+            if cache["bitmaps"].get(column, (None, None))[0] != state:
+                cache["bitmaps"][column] = (state, select(dset, index, column, state))
+            bitmaps.append(cache["bitmaps"][column][1])
+    rows = combine(bitmaps, index["rows"])
+
+    return None if rows is not None and len(rows) == index["rows"] else rows
+
+
+def filter_dataframe(dset, index=None, key="filters"):
+    """Display the filters of a dataset and get the rows they keep.
+
+    Args:
+        dset (pandas.DataFrame): The dataset.
+        index (dict): The filter index of the dataset; see filter_rows.
+        key (str): The key of the widgets and of the cached filters.
+
+    Returns:
+        (pandas.DataFrame): The dataset itself if no rows are filtered out,
+            else the selected rows.
+    """
+
+    rows = filter_rows(dset, index=index, key=key)
+
+    return dset if rows is None else dset.take(rows)
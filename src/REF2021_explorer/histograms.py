@@ -0,0 +1,189 @@
+# pylint: disable=E0401
+""" Vectorised histograms of numeric columns.
+
+The finite values of a column are sorted once and cached, after which any
+binning is computed from the bin edges alone: the count of a bin (a, b] is
+the number of values up to b minus the number up to a, found with
+np.searchsorted. Labels are formatted per bin, never per row.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+EQUAL_WIDTH = "Equal width"
+QUANTILE = "Quantile"
+LOG = "Log"
+BIN_METHODS = [EQUAL_WIDTH, QUANTILE, LOG]
+
+COUNT_COLUMN = "records"
+PERCENT_COLUMN = "records (%)"
+
+# widen the lowest bin like pandas.cut, so that the minimum is included
+EDGE_ADJUSTMENT = 0.001
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def sorted_values(values):
+    """Sort the finite values of a column.
+
+    Args:
+        values (numpy.ndarray): The values of the column.
+
+    Returns:
+        (numpy.ndarray): The finite values as floats, in ascending order.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    return np.sort(values[np.isfinite(values)])
+
+
+def equal_width_edges(values, bins):
+    """Get the edges of equal-width bins, as pandas.cut does.
+
+    Args:
+        values (numpy.ndarray): The sorted values.
+        bins (int): The number of bins.
+
+    Returns:
+        (numpy.ndarray): The bin edges.
+    """
+
+    low, high = values[0], values[-1]
+    if low == high:
+        adjustment = EDGE_ADJUSTMENT * abs(low) if low != 0 else EDGE_ADJUSTMENT
+        return np.linspace(low - adjustment, high + adjustment, bins + 1)
+    edges = np.linspace(low, high, bins + 1)
+    edges[0] -= (high - low) * EDGE_ADJUSTMENT
+
+    return edges
+
+
+def quantile_edges(values, bins):
+    """Get the edges of bins holding about the same number of values.
+
+    Args:
+        values (numpy.ndarray): The sorted values.
+        bins (int): The number of bins; fewer bins are returned when the
+            quantiles coincide.
+
+    Returns:
+        (numpy.ndarray): The bin edges.
+    """
+
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+    if len(edges) == 1:
+        return equal_width_edges(values, 1)
+    edges[0] = np.nextafter(edges[0], -np.inf)
+
+    return edges
+
+
+def log_edges(values, bins):
+    """Get the edges of bins of equal width on a log scale.
+
+    Args:
+        values (numpy.ndarray): The sorted values, which must be positive.
+        bins (int): The number of bins.
+
+    Returns:
+        (numpy.ndarray): The bin edges.
+    """
+
+    if values[0] == values[-1]:
+        return equal_width_edges(values, 1)
+    edges = np.geomspace(values[0], values[-1], bins + 1)
+    edges[0] = np.nextafter(values[0], -np.inf)
+    edges[-1] = values[-1]
+
+    return edges
+
+
+def bin_edges(values, bins, method=EQUAL_WIDTH):
+    """Get the bin edges of sorted values.
+
+    Args:
+        values (numpy.ndarray): The sorted values; see sorted_values.
+        bins (int): The number of bins.
+        method (str): One of BIN_METHODS.
+
+    Returns:
+        (numpy.ndarray): The bin edges, or None if there are no values to
+            bin (e.g. no positive values for log bins).
+    """
+
+    if method == LOG:
+        values = values[np.searchsorted(values, 0, side="right") :]
+    if len(values) == 0:
+        return None
+    if method == QUANTILE:
+        return quantile_edges(values, bins)
+    if method == LOG:
+        return log_edges(values, bins)
+
+    return equal_width_edges(values, bins)
+
+
+def bin_counts(values, edges):
+    """Count the sorted values in the right-closed bins (a, b].
+
+    Args:
+        values (numpy.ndarray): The sorted values.
+        edges (numpy.ndarray): The bin edges.
+
+    Returns:
+        (numpy.ndarray): The count of each bin.
+    """
+
+    return np.diff(np.searchsorted(values, edges, side="right"))
+
+
+def bin_labels(edges):
+    """Format the bin labels, with as many decimals as the bin widths need.
+
+    Args:
+        edges (numpy.ndarray): The bin edges.
+
+    Returns:
+        (list): The labels, e.g. "(0, 10]".
+    """
+
+    widths = np.diff(edges)
+    smallest = widths[widths > 0].min() if np.any(widths > 0) else 1
+    decimals = int(np.ceil(-np.log10(smallest))) if smallest < 1 else 0
+    rounded = np.round(edges, decimals) + 0.0  # + 0.0 turns -0.0 into 0.0
+
+    return [
+        f"({left:.{decimals}f}, {right:.{decimals}f}]"
+        for left, right in zip(rounded[:-1], rounded[1:])
+    ]
+
+
+def histogram(values, bins, method=EQUAL_WIDTH, column_name=None):
+    """Calculate the counts and percentages of a histogram.
+
+    Args:
+        values (numpy.ndarray or pandas.Series): The values of the column.
+        bins (int): The number of bins.
+        method (str): One of BIN_METHODS.
+        column_name (str): The name of the column, used as the index name.
+
+    Returns:
+        (pandas.DataFrame): The count and percentage of each bin, indexed
+            by the bin labels, or None if there are no values to bin.
+    """
+
+    values = sorted_values(np.asarray(values))
+    edges = bin_edges(values, bins, method)
+    if edges is None:
+        return None
+    counts = bin_counts(values, edges)
+    dset_plot = pd.DataFrame(
+        {
+            COUNT_COLUMN: counts,
+            PERCENT_COLUMN: np.round(100 * counts / len(values)),
+        },
+        index=pd.Index(bin_labels(edges), name=column_name),
+    )
+
+    return dset_plot
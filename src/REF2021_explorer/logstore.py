@@ -0,0 +1,126 @@
+# pylint: disable=E0401
+""" Line-indexed store of the processing logs.
+
+A log is parsed once into its text and the offsets of its lines, so that
+pages, the tail and the lines matching a keyword are sliced out of the
+text without splitting it, and only the visible lines are sent to the
+browser.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 100
+
+
+def build_store(fname):
+    """Parse a processing log into a line-indexed store.
+
+    The log is read as tab-separated fields, which are shown separated by
+    commas and without quotes.
+
+    Args:
+        fname (str): The local file name of the log.
+
+    Returns:
+        (dict): The store, with the text of the log and the offsets of
+            the starts of its lines followed by the end of the text.
+    """
+
+    logs = pd.read_csv(fname, sep="\t", header=None)
+    text = logs.to_csv(header=False, index=False).replace('"', "")
+    ends = [match.end() for match in re.finditer("\n", text)]
+    if not text.endswith("\n"):
+        ends.append(len(text))
+
+    return {"text": text, "offsets": np.array([0, *ends], dtype=np.int64)}
+
+
+def line_count(store):
+    """Get the number of lines in a store.
+
+    Args:
+        store (dict): The log store.
+
+    Returns:
+        (int): The number of lines.
+    """
+
+    return len(store["offsets"]) - 1
+
+
+def get_lines(store, line_numbers):
+    """Get some lines of a store.
+
+    Args:
+        store (dict): The log store.
+        line_numbers (iterable): The zero-based numbers of the lines.
+
+    Returns:
+        (list): The lines, without their line breaks.
+    """
+
+    offsets = store["offsets"]
+
+    return [
+        store["text"][offsets[number] : offsets[number + 1]].rstrip("\r\n")
+        for number in line_numbers
+    ]
+
+
+def page_count(total, size=PAGE_SIZE):
+    """Get the number of pages needed to show some lines.
+
+    Args:
+        total (int): The number of lines.
+        size (int): The number of lines per page.
+
+    Returns:
+        (int): The number of pages, at least 1.
+    """
+
+    return max(-(-total // size), 1)
+
+
+def page_range(total, number, size=PAGE_SIZE, from_end=False):
+    """Get the range of line positions shown on a page.
+
+    Args:
+        total (int): The number of lines.
+        number (int): The one-based page number.
+        size (int): The number of lines per page.
+        from_end (bool): Whether to number the pages from the end, so that
+            page 1 is the tail.
+
+    Returns:
+        (range): The positions of the lines on the page, in order.
+    """
+
+    if from_end:
+        stop = max(total - (number - 1) * size, 0)
+        return range(max(stop - size, 0), stop)
+
+    start = min((number - 1) * size, total)
+
+    return range(start, min(start + size, total))
+
+
+def search(store, keyword):
+    """Find the lines containing a keyword, ignoring case.
+
+    Args:
+        store (dict): The log store.
+        keyword (str): The keyword.
+
+    Returns:
+        (numpy.ndarray): The zero-based numbers of the matching lines.
+    """
+
+    positions = [
+        match.start()
+        for match in re.finditer(re.escape(keyword), store["text"], re.IGNORECASE)
+    ]
+    if not positions:
+        return np.array([], dtype=np.int64)
+
+    return np.unique(np.searchsorted(store["offsets"], positions, side="right") - 1)
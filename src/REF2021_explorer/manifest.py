@@ -0,0 +1,229 @@
+# pylint: disable=E0401
+""" Data manifest used to version the cached data and logs.
+
+The manifest lists the name, size, content hash and version of every data
+file and log. Cached reads are keyed by the manifest version, and a
+background refresher revalidates the files, preloads any new version and
+then swaps it in, so sessions keep reading the previous version until the
+new one is ready.
+
+Run as a module to write the manifest of the current files:
+
+    python -m REF2021_explorer.manifest manifest.json
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import defaultdict
+
+import REF2021_explorer.mirror as mr
+
+LOGGER = logging.getLogger(__name__)
+
+# settings
+MANIFEST_LOCATION = os.environ.get("REF2021_MANIFEST")
+REFRESH_INTERVAL = float(os.environ.get("REF2021_REFRESH_INTERVAL", "3600"))
+
+VERSION_LENGTH = 12
+
+_current = {}
+_lock = threading.Lock()
+_location_locks = defaultdict(threading.Lock)
+_refreshers = []
+
+
+def file_hash(fname):
+    """Calculate the content hash of a local file.
+
+    Args:
+        fname (str): The file name.
+
+    Returns:
+        (str): The content hash.
+    """
+
+    digest = hashlib.new(mr.HASH_ALGORITHM)
+    for chunk in mr.read_chunks(fname):
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def build_entry(location, version=None):
+    """Build the manifest entry for a file, mirroring it if it is remote.
+
+    Args:
+        location (str): The file path or URL.
+        version (str): The version to record; defaults to the short content hash.
+
+    Returns:
+        (dict): The manifest entry with the name, size, hash, version and
+            local path of the file.
+    """
+
+    fname = mr.fetch(location)
+    if mr.is_remote(location):
+        digest = Path(fname).name
+    else:
+        digest = file_hash(fname)
+
+    return {
+        "name": Path(location).name,
+        "size": os.path.getsize(fname),
+        "hash": digest,
+        "version": version or digest[:VERSION_LENGTH],
+        "path": fname,
+    }
+
+
+def build(locations):
+    """Build a manifest for a list of files.
+
+    Args:
+        locations (list): The file paths or URLs.
+
+    Returns:
+        (dict): The manifest entries keyed by file name.
+    """
+
+    entries = [build_entry(location) for location in locations]
+
+    return {
+        entry["name"]: {key: entry[key] for key in ["size", "hash", "version"]}
+        for entry in entries
+    }
+
+
+def read(location):
+    """Read a published manifest.
+
+    Args:
+        location (str): The file path or URL of the manifest.
+
+    Returns:
+        (dict): The manifest entries keyed by file name.
+    """
+
+    with open(mr.fetch(location), encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def current(location):
+    """Get the current manifest entry for a file.
+
+    The entry is built on first use, once even if several threads ask for
+    it at the same time, and is afterwards only replaced by the refresher,
+    so this is a dictionary lookup on warm paths.
+
+    Args:
+        location (str): The file path or URL.
+
+    Returns:
+        (dict): The manifest entry.
+    """
+
+    entry = _current.get(location)
+    if entry is None:
+        with _lock:
+            location_lock = _location_locks[location]
+        with location_lock:
+            entry = _current.get(location)
+            if entry is None:
+                entry = build_entry(location)
+                with _lock:
+                    _current[location] = entry
+
+    return entry
+
+
+def refresh(preload):
+    """Revalidate every file in use and swap in the new versions.
+
+    When a published manifest is configured, only files whose version
+    differs from the published one are revalidated.
+
+    Args:
+        preload (callable): Called with the location and the new entry
+            to load a new version into the caches before it is swapped in.
+
+    Returns:
+        (list): The locations that were updated.
+    """
+
+    published = read(MANIFEST_LOCATION) if MANIFEST_LOCATION else None
+    updated = []
+    for location, entry in list(_current.items()):
+        version = None
+        if published is not None:
+            version = published.get(entry["name"], {}).get("version")
+            if version is None or version == entry["version"]:
+                continue
+        new_entry = build_entry(location, version)
+        if new_entry["hash"] == entry["hash"]:
+            continue
+        preload(location, new_entry)
+        with _lock:
+            _current[location] = new_entry
+        updated.append(location)
+        LOGGER.info("Updated %s to version %s", location, new_entry["version"])
+
+    return updated
+
+
+def run_refresher(preload, interval):
+    """Refresh the manifest periodically.
+
+    Args:
+        preload (callable): The preload function passed to refresh.
+        interval (float): The number of seconds between refreshes.
+    """
+
+    while True:
+        time.sleep(interval)
+        try:
+            refresh(preload)
+        except Exception as error:  # pylint: disable=W0718
+            LOGGER.warning("Manifest refresh failed: %s", error)
+
+
+def start_refresher(preload, interval=None):
+    """Start the background refresher once per process.
+
+    Args:
+        preload (callable): The preload function passed to refresh.
+        interval (float): The number of seconds between refreshes;
+            defaults to REFRESH_INTERVAL, and 0 disables the refresher.
+    """
+
+    if interval is None:
+        interval = REFRESH_INTERVAL
+    if interval <= 0 or mr.OFFLINE:
+        return
+    with _lock:
+        if not _refreshers:
+            _refreshers.append(
+                threading.Thread(
+                    target=run_refresher,
+                    args=(preload, interval),
+                    name="manifest-refresher",
+                    daemon=True,
+                )
+            )
+            _refreshers[0].start()
+
+
+if __name__ == "__main__":
+    # pylint: disable=C0412
+    from REF2021_explorer.read_write import sources
+
+    manifest = build([*sources["data"].values(), *sources["logs"].values()])
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w", encoding="utf-8") as output_file:
+            json.dump(manifest, output_file, indent=2)
+    else:
+        json.dump(manifest, sys.stdout, indent=2)
@@ -0,0 +1,313 @@
+# pylint: disable=E0401
+# pylint: disable=E1101
+""" Metadata and statistics catalog of the data sources.
+
+The catalog of a source lists its row count and, for every column, the
+dtype, null count, numeric min/max/mean/std and category levels. It is
+built once per manifest version from the parquet footer and DuckDB
+aggregates streamed over the file, persisted as a JSON sidecar next to the
+mirrored files, and cached in memory, so widgets and field descriptions
+never scan the data.
+"""
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+import REF2021_explorer.codebook as cb
+import REF2021_explorer.database as db
+import REF2021_explorer.manifest as mf
+import REF2021_explorer.mirror as mr
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.snapshot as sn
+
+METADATA_DIR = "metadata"
+CATALOG_FORMAT = 2
+# the distinct values of a string column are only listed up to this many, and
+# when none is longer than MAX_VALUE_LENGTH; category levels are always listed
+MAX_VALUES = 1000
+MAX_VALUE_LENGTH = 200
+
+
+def get_catalog(page):
+    """Get the catalog of a page's data source at its current version.
+
+    Args:
+        page (str): The page to get the catalog for.
+
+    Returns:
+        (dict): The catalog; see build_catalog.
+    """
+
+    if sn.contains(f"catalog/{page}"):
+        entry = sn.entry(f"catalog/{page}")
+    else:
+        entry = mf.current(rw.sources["data"][page])
+
+    return load_catalog(entry["path"], entry["hash"])
+
+
+@st.cache_resource(show_spinner=False, max_entries=rw.CACHE_ENTRIES)
+def load_catalog(fname, digest):
+    """Load the catalog from its sidecar, building it if needed.
+
+    Args:
+        fname (str): The local file name, or the snapshot path of a
+            prebuilt catalog.
+        digest (str): The content hash of the file, naming the sidecar.
+
+    Returns:
+        (dict): The catalog; see build_catalog.
+    """
+
+    if sn.is_snapshot_path(fname):
+        return sn.read_json(fname)
+
+    sidecar = mr.CACHE_DIR / METADATA_DIR / f"{digest}.json"
+    try:
+        with open(sidecar, encoding="utf-8") as sidecar_file:
+            catalog = json.load(sidecar_file)
+        if catalog.get("format") == CATALOG_FORMAT:
+            return catalog
+    except (OSError, json.JSONDecodeError):
+        pass
+
+    catalog = build_catalog(fname)
+    try:
+        sidecar.parent.mkdir(parents=True, exist_ok=True)
+        with open(sidecar, "w", encoding="utf-8") as sidecar_file:
+            json.dump(catalog, sidecar_file)
+    except OSError:
+        pass
+
+    return catalog
+
+
+def pandas_columns(pfile):
+    """Get the pandas metadata of the columns of a parquet file.
+
+    Args:
+        pfile (pyarrow.parquet.ParquetFile): The parquet file.
+
+    Returns:
+        (list): The pandas column metadata, in file order.
+    """
+
+    metadata = pfile.schema_arrow.metadata or {}
+    if b"pandas" in metadata:
+        return json.loads(metadata[b"pandas"])["columns"]
+
+    return [
+        {
+            "name": field.name,
+            "field_name": field.name,
+            "pandas_type": str(field.type),
+            "numpy_type": str(field.type),
+        }
+        for field in pfile.schema_arrow
+    ]
+
+
+def footer_statistics(pfile, field_name):
+    """Combine the row group statistics of a column.
+
+    Args:
+        pfile (pyarrow.parquet.ParquetFile): The parquet file.
+        field_name (str): The name of the column in the file.
+
+    Returns:
+        (int, object, object): The null count, min and max; min and max
+            are None when the statistics are missing.
+    """
+
+    index = pfile.schema_arrow.get_field_index(field_name)
+    nulls, minimum, maximum = 0, None, None
+    for row_group in range(pfile.metadata.num_row_groups):
+        statistics = pfile.metadata.row_group(row_group).column(index).statistics
+        if statistics is None:
+            return None, None, None
+        nulls += statistics.null_count
+        if statistics.has_min_max:
+            minimum = (
+                statistics.min if minimum is None else min(minimum, statistics.min)
+            )
+            maximum = (
+                statistics.max if maximum is None else max(maximum, statistics.max)
+            )
+
+    return nulls, minimum, maximum
+
+
+def dtype_name(column):
+    """Get the pandas dtype name of a column from its pandas metadata.
+
+    Args:
+        column (dict): The pandas column metadata.
+
+    Returns:
+        (str): The dtype name.
+    """
+
+    if column["pandas_type"] == "categorical":
+        return "category"
+
+    return column["numpy_type"]
+
+
+def column_expression(column):
+    """Get the SQL expression scanning a column for the catalog.
+
+    The categorical and text columns are scanned as strings, so that the
+    category levels are listed as strings and the lengths are measured on
+    the text of the values.
+
+    Args:
+        column (dict): The catalog entry of the column.
+
+    Returns:
+        (str): The expression.
+    """
+
+    if "min" in column:
+        return db.quote(column["field_name"])
+
+    return f"CAST({db.quote(column['field_name'])} AS VARCHAR)"
+
+
+def scan_columns(fname, columns):
+    """Add the statistics computed from the data to catalog columns.
+
+    Args:
+        fname (str): The local file name.
+        columns (list): The catalog entries of the columns to scan, updated
+            with their mean/std, or their number of distinct values and,
+            within MAX_VALUES and MAX_VALUE_LENGTH, the values themselves.
+    """
+
+    source = "read_parquet('" + fname.replace("'", "''") + "')"
+    aggregates = {}
+    for column in columns:
+        name = column_expression(column)
+        if "min" in column:
+            for statistic in ["min", "max", "avg", "stddev_samp"]:
+                aggregates[(column["name"], statistic)] = f"{statistic}({name})"
+        else:
+            aggregates[(column["name"], "distinct")] = f"count(DISTINCT {name})"
+            aggregates[(column["name"], "length")] = f"max(length({name}))"
+    statistics = {}
+    if aggregates:
+        row = (
+            db.cursor()
+            .execute(f"SELECT {', '.join(aggregates.values())} FROM {source}")
+            .fetchone()
+        )
+        statistics = dict(zip(aggregates, row))
+
+    for column in columns:
+        if "min" in column:
+            if column["min"] is None:  # no footer statistics
+                column["min"] = statistics[(column["name"], "min")]
+                column["max"] = statistics[(column["name"], "max")]
+            column["mean"] = statistics[(column["name"], "avg")]
+            column["std"] = statistics[(column["name"], "stddev_samp")]
+            continue
+        column["distinct"] = statistics[(column["name"], "distinct")]
+        longest = statistics[(column["name"], "length")] or 0
+        if column["dtype"] == "category" or (
+            column["distinct"] <= MAX_VALUES and longest <= MAX_VALUE_LENGTH
+        ):
+            name = column_expression(column)
+            rows = (
+                db.cursor()
+                .execute(
+                    f"SELECT DISTINCT {name} FROM {source} WHERE {name} IS NOT NULL"
+                )
+                .fetchall()
+            )
+            column["values"] = sorted(value for (value,) in rows)
+
+
+def build_catalog(fname):
+    """Build the catalog of a parquet file.
+
+    Row counts, null counts and min/max come from the footer; mean/std and
+    the number of distinct values come from one DuckDB aggregate over the
+    numeric, categorical and string columns, and the category levels and
+    short lists of distinct values from a SELECT DISTINCT of their column,
+    so the file is streamed instead of read into memory. Only the number of
+    distinct values is kept for the other text columns, and the environment
+    statements are not scanned at all.
+
+    Args:
+        fname (str): The local file name.
+
+    Returns:
+        (dict): The catalog, with the row count and the list of columns.
+    """
+
+    pfile = pq.ParquetFile(fname)
+    schema = pfile.schema_arrow
+    columns = []
+    for column in pandas_columns(pfile):
+        if column["name"] is None:  # skip unnamed columns, usually pandas indices
+            continue
+        nulls, minimum, maximum = footer_statistics(pfile, column["field_name"])
+        columns.append(
+            {
+                "name": column["name"],
+                "field_name": column["field_name"],
+                "dtype": dtype_name(column),
+                "pandas_type": column["pandas_type"],
+                "numpy_type": column["numpy_type"],
+                "nulls": nulls,
+            }
+        )
+        arrow_type = schema.field(column["field_name"]).type
+        if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type):
+            columns[-1].update({"min": minimum, "max": maximum})
+
+    scanned = [
+        column
+        for column in columns
+        if "min" in column
+        or (
+            column["dtype"] in ["category", "object"]
+            and column["name"] not in cb.FIELDS_TO_NOT_DISPLAY
+            and column["name"] not in cb.COLUMNS_ENVIRONMENT_STATEMENTS
+            and not pa.types.is_null(schema.field(column["field_name"]).type)
+        )
+    ]
+    scan_columns(fname, scanned)
+
+    return {
+        "format": CATALOG_FORMAT,
+        "rows": pfile.metadata.num_rows,
+        "row_groups": pfile.metadata.num_row_groups,
+        "columns": columns,
+    }
+
+
+def column_names(catalog):
+    """Get the column names of a catalog, in file order.
+
+    Args:
+        catalog (dict): The catalog.
+
+    Returns:
+        (list): The column names.
+    """
+
+    return [column["name"] for column in catalog["columns"]]
+
+
+def column_statistics(catalog):
+    """Get the column statistics of a catalog keyed by column name.
+
+    Args:
+        catalog (dict): The catalog.
+
+    Returns:
+        (dict): The column entries keyed by name.
+    """
+
+    return {column["name"]: column for column in catalog["columns"]}
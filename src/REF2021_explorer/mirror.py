@@ -0,0 +1,309 @@
+# pylint: disable=E0401
+""" Local content-addressed mirror for the remote data files and logs. """
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from http import HTTPStatus
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+LOGGER = logging.getLogger(__name__)
+
+# settings
+CACHE_DIR = Path(
+    os.environ.get("REF2021_CACHE_DIR", Path.home() / ".cache" / "REF2021_explorer")
+)
+OFFLINE = os.environ.get("REF2021_OFFLINE", "").lower() in ["1", "true", "yes"]
+REQUEST_TIMEOUT = float(os.environ.get("REF2021_REQUEST_TIMEOUT", "30"))
+REQUEST_RETRIES = int(os.environ.get("REF2021_REQUEST_RETRIES", "3"))
+RETRY_BACKOFF = float(os.environ.get("REF2021_RETRY_BACKOFF", "0.5"))
+
+REMOTE_SCHEMES = ["http", "https", "file"]
+OBJECTS_DIR = "objects"
+INDEX_FILE = "index.json"
+CHUNK_SIZE = 1024 * 1024
+HASH_ALGORITHM = "sha256"
+RETRY_STATUSES = [
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+]
+
+# the index lock guards the index file, the location locks serialise the
+# fetches of one location while different locations download concurrently
+_lock = threading.RLock()
+_location_locks = defaultdict(threading.Lock)
+_local = threading.local()
+
+
+def is_remote(location):
+    """Check whether a location has to be mirrored.
+
+    Args:
+        location (str): The file path or URL.
+
+    Returns:
+        (bool): True for http(s) and file URLs, False for plain paths.
+    """
+
+    return urlparse(str(location)).scheme in REMOTE_SCHEMES
+
+
+def session():
+    """Get the HTTP session of the current thread.
+
+    The session keeps connections alive between requests and retries
+    connection errors and transient server errors with exponential backoff.
+
+    Returns:
+        (requests.Session): The session.
+    """
+
+    if getattr(_local, "session", None) is None:
+        retry = Retry(
+            total=REQUEST_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET", "HEAD"],
+        )
+        _local.session = requests.Session()
+        _local.session.mount("http://", HTTPAdapter(max_retries=retry))
+        _local.session.mount("https://", HTTPAdapter(max_retries=retry))
+
+    return _local.session
+
+
+def object_path(digest):
+    """Get the path of a mirrored object.
+
+    Args:
+        digest (str): The content hash of the object.
+
+    Returns:
+        (pathlib.Path): The path of the object in the cache directory.
+    """
+
+    return CACHE_DIR / OBJECTS_DIR / digest[:2] / digest
+
+
+def read_index():
+    """Read the index mapping locations to mirrored objects.
+
+    Returns:
+        (dict): The index entries keyed by location.
+    """
+
+    try:
+        with open(CACHE_DIR / INDEX_FILE, encoding="utf-8") as index_file:
+            return json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_index(index):
+    """Atomically write the index of mirrored objects.
+
+    Args:
+        index (dict): The index entries keyed by location.
+    """
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=CACHE_DIR, suffix=".tmp", delete=False, encoding="utf-8"
+    ) as index_file:
+        json.dump(index, index_file, indent=2, sort_keys=True)
+    os.replace(index_file.name, CACHE_DIR / INDEX_FILE)
+
+
+def get_entry(location):
+    """Get the index entry of a location if its object is still on disk.
+
+    Args:
+        location (str): The file path or URL.
+
+    Returns:
+        (dict): The index entry or None if the location is not mirrored.
+    """
+
+    entry = read_index().get(str(location))
+    if entry is None or not object_path(entry["hash"]).exists():
+        return None
+
+    return entry
+
+
+def store(chunks):
+    """Store a stream of bytes as a content-addressed object.
+
+    Args:
+        chunks (iterable): The byte chunks to store.
+
+    Returns:
+        (str, int): The content hash and the size of the object.
+    """
+
+    digest = hashlib.new(HASH_ALGORITHM)
+    size = 0
+    (CACHE_DIR / OBJECTS_DIR).mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=CACHE_DIR / OBJECTS_DIR, suffix=".tmp", delete=False
+    ) as object_file:
+        try:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                object_file.write(chunk)
+        except BaseException:
+            # a download failing midway leaves no partial object behind
+            object_file.close()
+            os.unlink(object_file.name)
+            raise
+
+    target = object_path(digest.hexdigest())
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(object_file.name, target)
+
+    return digest.hexdigest(), size
+
+
+def read_chunks(fname):
+    """Read a local file in chunks.
+
+    Args:
+        fname (str): The file name.
+
+    Yields:
+        (bytes): The next chunk of the file.
+    """
+
+    with open(fname, "rb") as source_file:
+        while chunk := source_file.read(CHUNK_SIZE):
+            yield chunk
+
+
+def fetch_file(location, entry):
+    """Mirror a file URL, revalidating it by size and modification time.
+
+    Args:
+        location (str): The file URL.
+        entry (dict): The current index entry or None.
+
+    Returns:
+        (dict): The new index entry.
+    """
+
+    fname = url2pathname(urlparse(location).path)
+    stat = os.stat(fname)
+    if (
+        entry is not None
+        and entry["size"] == stat.st_size
+        and entry.get("mtime") == stat.st_mtime
+    ):
+        return entry
+
+    digest, size = store(read_chunks(fname))
+
+    return {"hash": digest, "size": size, "mtime": stat.st_mtime}
+
+
+def fetch_url(location, entry):
+    """Mirror a http(s) URL, revalidating it with its ETag.
+
+    Args:
+        location (str): The URL.
+        entry (dict): The current index entry or None.
+
+    Returns:
+        (dict): The new index entry.
+    """
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    with session().get(
+        location, headers=headers, stream=True, timeout=REQUEST_TIMEOUT
+    ) as response:
+        if response.status_code == HTTPStatus.NOT_MODIFIED and entry is not None:
+            return entry
+        response.raise_for_status()
+        digest, size = store(response.iter_content(CHUNK_SIZE))
+
+        return {
+            "hash": digest,
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+
+def fetch(location, offline=None):
+    """Get a local copy of a file, mirroring it first if it is remote.
+
+    Remote files are stored in the cache directory under their content
+    hash and revalidated against the source on every call. If the source
+    cannot be reached, or in offline mode, the last mirrored copy is used.
+
+    Args:
+        location (str): The file path or URL.
+        offline (bool): Whether to skip revalidation; defaults to OFFLINE.
+
+    Returns:
+        (str): The path of the local copy.
+    """
+
+    if not is_remote(location):
+        return location
+    if offline is None:
+        offline = OFFLINE
+
+    with _lock:
+        location_lock = _location_locks[location]
+    with location_lock:
+        entry = get_entry(location)
+        if offline:
+            if entry is None:
+                raise FileNotFoundError(f"{location} is not available offline")
+            return str(object_path(entry["hash"]))
+
+        try:
+            if urlparse(location).scheme == "file":
+                new_entry = fetch_file(location, entry)
+            else:
+                new_entry = fetch_url(location, entry)
+        except (OSError, requests.RequestException) as error:
+            if entry is None:
+                raise
+            LOGGER.warning("Using mirrored copy of %s: %s", location, error)
+            return str(object_path(entry["hash"]))
+
+        if new_entry is not entry:
+            with _lock:
+                index = read_index()
+                index[location] = new_entry
+                write_index(index)
+
+    return str(object_path(new_entry["hash"]))
+
+
+def clear():
+    """Remove every mirrored file from the cache directory."""
+
+    with _lock:
+        shutil.rmtree(CACHE_DIR / OBJECTS_DIR, ignore_errors=True)
+        write_index({})
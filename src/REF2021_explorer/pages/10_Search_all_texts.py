@@ -0,0 +1,24 @@
+# pylint: disable=C0103
+# pylint: disable=R0801
+# pylint: disable=E0401
+""" Search of all the text sections page """
+import streamlit as st
+
+import REF2021_explorer.visualisations as vis
+import REF2021_explorer.shared_content as sh
+
+PAGE = "search"
+
+sh.page_config(PAGE)
+sh.sidebar_settings()
+sh.sidebar_content(PAGE)
+st.title(sh.PAGE_TITLES[PAGE])
+
+with st.container(border=True):
+    st.markdown(sh.SEARCH_ALL_TEXT)
+    keyword = st.text_input(
+        sh.SEARCH_TERM_PROMPT, key="all_search_term", help=sh.SEARCH_SYNTAX_TEXT
+    )
+
+    if keyword:
+        vis.display_cross_search(keyword)
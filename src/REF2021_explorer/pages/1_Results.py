@@ -1,14 +1,11 @@
 # pylint: disable=C0103
 # pylint: disable=R0801
 # pylint: disable=E0401
-# pylint: disable=R1729
 """ Results page"""
-import numpy as np
-import altair as alt
 import streamlit as st
-from streamlit_extras.dataframe_explorer import dataframe_explorer
 
-import REF2021_explorer.codebook as cb
+import REF2021_explorer.filters as flt
+import REF2021_explorer.read_write as rw
 import REF2021_explorer.visualisations as vis
 import REF2021_explorer.shared_content as sh
 
@@ -18,8 +15,8 @@ PAGE = "results"
 
 vis.display_metrics(dset)
 
-dset_explore = dataframe_explorer(dset)
-if dset_explore.shape[0] == 0:
+rows = flt.filter_rows(dset, index=flt.get_index(PAGE), key=f"filters_{PAGE}")
+if rows is not None and len(rows) == 0:
     st.warning(sh.NO_SELECTED_RECORDS_WARNING)
 else:
     data_prefix = ""
@@ -27,80 +24,19 @@ else:
         f"{sh.SELECTED_LABEL} {sh.RECORDS_LABEL.lower()}",
         f"{sh.SELECTED_LABEL} {sh.INSTITUTIONS_LABEL.lower()}",
     ]
-    if dset_explore.shape[0] < dset.shape[0]:
+    if rows is not None:
         data_prefix = " selected"
 
+    # the profile views are built once per version; only the rows are taken
+    profiles = rw.get_profiles(PAGE)
+
     tabs = st.tabs(sh.PROFILE_HEADERS.values())
-    column_prefixes = [f"{key} profile - " for key, _ in sh.PROFILE_HEADERS.items()]
     for key, value in sh.PROFILE_HEADERS.items():
         with tabs[list(sh.PROFILE_HEADERS.values()).index(value)]:
-            columns_prefix = f"{key} profile - "
-            exclude_prefixes = column_prefixes.copy()
-            exclude_prefixes.remove(columns_prefix)
-            columns = [
-                col
-                for col in dset.columns
-                if col != cb.COL_MAIN_PANEL_NAME
-                and (
-                    col.startswith(columns_prefix)
-                    or not any(
-                        [col.startswith(exclude) for exclude in exclude_prefixes]
-                    )
-                )
-            ]
-            if key == "Outputs":
-                columns = [
-                    col
-                    for col in columns
-                    if not col.startswith("Impact")
-                    and not col.startswith("Total number")
-                ]
-            elif key == "Impact":
-                columns = [
-                    col
-                    for col in columns
-                    if not col.startswith("Output")
-                    and not col.startswith("Total number")
-                ]
-            elif key == "Environment":
-                columns = [
-                    col
-                    for col in columns
-                    if not col.startswith("Output")
-                    and not col.startswith("Impact")
-                    and not col.startswith("Total number")
-                ]
-
-            dset_to_display = dset_explore[columns].copy()
+            dset_to_display = profiles[key]
+            if rows is not None:
+                dset_to_display = dset_to_display.take(rows)
             vis.display_metrics(dset_to_display, labels=labels)
-            dset_to_display.columns = [
-                col.replace(columns_prefix, "")
-                .replace(" stars", "*")
-                .replace(" star", "*")
-                .replace("Output submissions - ", "Outputs - ")
-                .replace("Output submissions", "Outputs")
-                .replace(" (added)", "")
-                for col in dset_to_display.columns
-            ]
-            # calculate GPA
-            dset_to_display["GPA"] = np.round(
-                (
-                    (
-                        dset_to_display["4*"] * 4
-                        + dset_to_display["3*"] * 3
-                        + dset_to_display["2*"] * 2
-                        + dset_to_display["1*"]
-                    )
-                    / 100
-                ),
-                decimals=2,
-            )
-            # insert the GPA column after Unclassified
-            dset_to_display.insert(
-                dset_to_display.columns.get_loc("Unclassified") + 1,
-                "GPA",
-                dset_to_display.pop("GPA"),
-            )
 
             st.dataframe(dset_to_display, hide_index=True, use_container_width=False)
 
@@ -129,23 +65,14 @@ else:
                 )
 
                 if column_x and column_y:
-                    correlation_coefficient = dset_to_display[column_x].corr(
-                        dset_to_display[column_y]
+                    vis.show_scatter_chart(
+                        dset_to_display,
+                        column_x,
+                        column_y,
+                        correlations=rw.get_correlations(
+                            PAGE, key, columns_x + ["4*", "3*", "2*", "1*"], rows
+                        ),
                     )
-                    scatter = (
-                        alt.Chart(dset_to_display)
-                        .mark_circle()
-                        .encode(x=column_x, y=column_y)
-                    )
-                    line = scatter.transform_regression(column_x, column_y).mark_line(
-                        color="red"
-                    )
-
-                    chart = (scatter + line).properties(
-                        title=f"Correlation coefficient: {correlation_coefficient:.2f}"
-                    )
-
-                    st.altair_chart(chart, use_container_width=True)
 
 # with st.expander(sh.VISUALISE_HEADER):
 #     vis.display_data_explorer(dset)
@@ -9,14 +9,17 @@ import REF2021_explorer.shared_content as sh
 
 PAGE = "impacts"
 
-(dset, logs) = sh.prepare_page(PAGE)
+(dset, logs) = sh.prepare_page(PAGE, preview=vis.display_streaming_preview, plan=True)
 
-vis.display_metrics(dset)
+if dset is None:
+    vis.display_planned_explorer(PAGE)
+else:
+    vis.display_metrics(dset)
 
-vis.display_data_explorer(dset)
+    vis.display_data_explorer(dset, page=PAGE)
 
-with st.expander(sh.DESCRIBE_HEADER):
-    vis.display_data_description(dset, description=sh.GROUPS_DESCRIPTION)
+    with st.expander(sh.DESCRIBE_HEADER):
+        vis.display_data_description(dset, description=sh.GROUPS_DESCRIPTION, page=PAGE)
 
 with st.expander(sh.LOGS_HEADER):
     vis.display_logs(logs)
@@ -3,11 +3,11 @@
 # pylint: disable=E0401
 """ Institution environment statements page """
 import streamlit as st
-import fastparquet as fp
-import duckdb
 
 import REF2021_explorer.codebook as cb
 import REF2021_explorer.read_write as rw
+import REF2021_explorer.records as rs
+import REF2021_explorer.metadata as md
 import REF2021_explorer.visualisations as vis
 import REF2021_explorer.shared_content as sh
 
@@ -20,13 +20,10 @@ sh.sidebar_content(PAGE)
 st.title(sh.PAGE_TITLES[PAGE])
 
 # dataset
-fname = rw.sources["data"][PAGE]
-metadata = fp.ParquetFile(fname)
-columns_to_read = ["Record", cb.COL_INST_NAME]
-columns_with_text = [
-    column for column in metadata.columns if column not in columns_to_read
-]
-dset = rw.read_parquet(fname, columns_to_read)
+fields = md.column_names(md.get_catalog(PAGE))
+key_columns = ["Record", cb.COL_INST_NAME]
+columns_with_text = [column for column in fields if column not in key_columns]
+dset = rs.get_keys(PAGE)
 
 # logs
 logs = rw.get_logs(PAGE)
@@ -43,35 +40,26 @@ with st.container(border=True):
         dset[cb.COL_INST_NAME].unique(),
         placeholder=sh.SELECT_INSTITUTION_PLACEHOLDER,
     )
-    section = st.selectbox(sh.SELECT_SECTION_PROMPT, metadata.columns[1:-1])
+    section = st.selectbox(sh.SELECT_SECTION_PROMPT, fields[1:-1])
 
-    keyword = st.text_input(sh.SEARCH_TERM_PROMPT, key="inst_search_term")
+    keyword = st.text_input(
+        sh.SEARCH_TERM_PROMPT, key="inst_search_term", help=sh.SEARCH_SYNTAX_TEXT
+    )
+    exact = st.toggle(sh.EXACT_SEARCH_PROMPT, key="exact_search")
 
+    records = None
+    if institutions:
+        records = dset.index[dset[cb.COL_INST_NAME].isin(institutions)]
     if section and keyword:
-        if not institutions:
-            query_result = duckdb.query(
-                f"""
-                SELECT * FROM read_parquet('{fname}')
-                WHERE "{section}" ILIKE '%{keyword}%'
-            """
-            )
-        else:
-            institutions = str(tuple(institutions))
-            query_result = duckdb.query(
-                f"""
-                SELECT * FROM read_parquet('{fname}')
-                WHERE "{cb.COL_INST_NAME}" IN {institutions} AND "{section}" ILIKE '%{keyword}%'
-            """
-            )
-        qdset = query_result.to_df()
-        if qdset.shape[0] == 0:
-            st.error(sh.NO_SELECTED_RECORDS_WARNING)
-        else:
-            st.metric(sh.HITS_LABEL, qdset.shape[0])
-            st.dataframe(qdset[[cb.COL_INST_NAME, section]])
+        vis.display_statement_search(
+            PAGE, section, keyword, [cb.COL_INST_NAME], records=records, exact=exact
+        )
+
+with st.expander(sh.BATCH_SEARCH_HEADER):
+    vis.display_batch_search(PAGE, section, [cb.COL_INST_NAME], records=records)
 
 with st.expander(sh.DESCRIBE_HEADER):
-    vis.display_fields(dset)
+    vis.display_fields(dset, page=PAGE)
     for column_name in columns_with_text:
         st.markdown(f"**{column_name}** - *{sh.EXTRACTED_TEXT_DESCRIPTION}*")
     vis.display_logs(logs)
@@ -3,14 +3,12 @@
 # pylint: disable=E0401
 """ Results chat page """
 import os
-import json
-from pathlib import Path
 import pandas as pd
 import openai
 import streamlit as st
-import pyarrow.parquet as pq
 
 import REF2021_explorer.shared_content as sh
+import REF2021_explorer.metadata as md
 import REF2021_explorer.read_write as rw
 from REF2021_explorer import chat
 
@@ -19,15 +17,14 @@ OPENAITOKEN_AVAILABLE = False
 PAGE = "results_chat"
 
 # get the categorical columns
-pfile = pq.ParquetFile(rw.CHAT_DB)
-json_struct = json.loads(pfile.metadata.metadata[b"pandas"])
+CATALOG = md.get_catalog(rw.CHAT_TABLE)
 ENUM_COLUMNS = [
     column["name"]
-    for column in json_struct["columns"]
+    for column in CATALOG["columns"]
     if column["pandas_type"] == "categorical"
 ]
 
-SCHEMA = chat.get_schema(Path(rw.CHAT_DB), ENUM_COLUMNS)
+SCHEMA = chat.get_schema(CATALOG, ENUM_COLUMNS)
 SCHEMA_TEXT = chat.schema_to_text(SCHEMA)
 
 sh.page_config(PAGE)
@@ -0,0 +1,315 @@
+# pylint: disable=E0401
+""" Filter-to-SQL planner for the data sources too large to load.
+
+The filters of the data explorer are translated into the WHERE clause of a
+DuckDB query on the source's parquet file (category IN-lists, numeric
+BETWEEN ranges and regular expressions), so that the counts and
+distributions are computed as SQL aggregates and only the matching rows
+of the shown columns are ever materialised. The filter widgets are built
+from the metadata catalog, without reading the data.
+
+Sources larger than read_write.PLANNED_SOURCE_BYTES are explored this way
+on the pages that support it; see shared_content.prepare_page.
+"""
+import os
+import re
+
+import pandas as pd
+import streamlit as st
+
+import REF2021_explorer.codebook as cb
+import REF2021_explorer.database as db
+import REF2021_explorer.filters as flt
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.shared_content as sh
+
+# settings
+MAX_ROWS = int(os.environ.get("REF2021_PLANNED_MAX_ROWS", "10000"))
+
+
+def column_kinds(catalog):
+    """Get the kind of filter and the choices of every column of a catalog.
+
+    Args:
+        catalog (dict): The catalog; see metadata.get_catalog.
+
+    Returns:
+        (dict): The (kind, choices) tuples keyed by column, as
+            filters.column_kind and filters.column_choices would give them.
+    """
+
+    kinds = {}
+    for column in catalog["columns"]:
+        if column["dtype"] == "category" and "values" in column:
+            # the null count is None when the footer has no statistics
+            missing = [sh.MISSING_VALUE_LABEL] if column["nulls"] != 0 else []
+            kinds[column["name"]] = ("levels", column["values"] + missing)
+        elif "min" in column:
+            choices = None
+            if column["min"] is not None:
+                choices = (float(column["min"]), float(column["max"]))
+            kinds[column["name"]] = ("range", choices)
+        else:
+            kinds[column["name"]] = ("pattern", None)
+
+    return kinds
+
+
+def category_columns(catalog):
+    """Get the categorical columns of a catalog that can be charted.
+
+    Args:
+        catalog (dict): The catalog.
+
+    Returns:
+        (list): The column names; see process.get_column_lists.
+    """
+
+    return [
+        column["name"]
+        for column in catalog["columns"]
+        if column["dtype"] == "category"
+        and column["name"] not in cb.CATEGORY_FIELDS_EXCLUDE_CHARTS
+    ]
+
+
+def filter_states(catalog, key="filters"):
+    """Display the filters of a data source from its catalog.
+
+    Args:
+        catalog (dict): The catalog.
+        key (str): The key of the widgets.
+
+    Returns:
+        (dict): The state of every filter leaving out some rows, keyed by
+            column; see filters.filter_widget.
+    """
+
+    kinds = column_kinds(catalog)
+    states = {}
+    with st.container():
+        columns = st.multiselect(
+            sh.FILTER_COLUMNS_PROMPT, list(kinds), key=f"{key}_multiselect"
+        )
+        for column in columns:
+            state = flt.filter_widget(column, *kinds[column], key)
+            if state is not None:
+                states[column] = state
+
+    return states
+
+
+def condition(column, state):
+    """Translate the state of a filter into a SQL condition.
+
+    Args:
+        column (str): The column.
+        state (tuple): The kind of filter and its state.
+
+    Returns:
+        (str, list): The condition and the values of its parameters.
+    """
+
+    kind, selected = state
+    if kind in ["levels", "values"]:
+        values = [value for value in selected if value != sh.MISSING_VALUE_LABEL]
+        conditions = []
+        if values:
+            placeholders = ", ".join(["?"] * len(values))
+            conditions.append(f"{db.quote(column)} IN ({placeholders})")
+        if len(values) < len(selected):
+            conditions.append(f"{db.quote(column)} IS NULL")
+        if not conditions:
+            return "FALSE", []
+        return "(" + " OR ".join(conditions) + ")", values
+    if kind == "range":
+        return f"{db.quote(column)} BETWEEN ? AND ?", list(selected)
+    try:
+        re.compile(selected)
+        function = "regexp_matches"
+    except re.error:
+        function = "contains"
+
+    return f"{function}(CAST({db.quote(column)} AS VARCHAR), ?)", [selected]
+
+
+def where_clause(states, not_null=None):
+    """Translate the filter states into a SQL WHERE clause.
+
+    Args:
+        states (dict): The filter states keyed by column.
+        not_null (list): Columns whose missing values are left out too.
+
+    Returns:
+        (str, list): The clause, empty if there are no conditions, and the
+            values of its parameters.
+    """
+
+    conditions = []
+    params = []
+    for column, state in states.items():
+        sql, values = condition(column, state)
+        conditions.append(sql)
+        params.extend(values)
+    conditions.extend(f"{db.quote(column)} IS NOT NULL" for column in not_null or [])
+    if not conditions:
+        return "", []
+
+    return " WHERE " + " AND ".join(conditions), params
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def run(sql_stmt, params, page, version):  # pylint: disable=W0613
+    """Run a query on a data source, caching the result per version.
+
+    Args:
+        sql_stmt (str): The SQL statement.
+        params (tuple): The values of its parameters.
+        page (str): The page of the data source.
+        version (str): The version of the data source, used as cache key.
+
+    Returns:
+        (pandas.DataFrame): The result.
+    """
+
+    return db.query(sql_stmt, list(params)).df()
+
+
+def query(page, sql_stmt, params):
+    """Run a query on the current version of a data source.
+
+    Args:
+        page (str): The page of the data source.
+        sql_stmt (str): The SQL statement.
+        params (list): The values of its parameters.
+
+    Returns:
+        (pandas.DataFrame): The result.
+    """
+
+    version = rw.source_entry("data", page)["version"]
+
+    return run(sql_stmt, tuple(params), page, version)
+
+
+def count_rows(page, states):
+    """Count the rows and institutions selected by the filters.
+
+    Args:
+        page (str): The page of the data source.
+        states (dict): The filter states keyed by column.
+
+    Returns:
+        (int, int): The number of rows and of distinct institutions.
+    """
+
+    where, params = where_clause(states)
+    result = query(
+        page,
+        f"SELECT count(*), count(DISTINCT {db.quote(cb.COL_INST_NAME)}) "
+        f'FROM "{page}"{where}',
+        params,
+    )
+
+    return int(result.iloc[0, 0]), int(result.iloc[0, 1])
+
+
+def count_values(page, states, column, nrecords):
+    """Count the values of a column in the selected rows.
+
+    Args:
+        page (str): The page of the data source.
+        states (dict): The filter states keyed by column.
+        column (str): The column.
+        nrecords (int): The number of selected rows, for the percentages.
+
+    Returns:
+        (pandas.DataFrame): The counts and percentages, as
+            process.calculate_counts gives them.
+    """
+
+    where, params = where_clause(states, not_null=[column])
+    dset_stats = query(
+        page,
+        f'SELECT {db.quote(column)}, count(*) AS records FROM "{page}"{where} '
+        f"GROUP BY {db.quote(column)} ORDER BY records DESC, {db.quote(column)}",
+        params,
+    ).set_index(column)
+    dset_stats["records (%)"] = (100 * dset_stats["records"] / nrecords).round()
+
+    return dset_stats
+
+
+def count_groups(page, states, columns):
+    """Count the combinations of values of some columns in the selected rows.
+
+    Args:
+        page (str): The page of the data source.
+        states (dict): The filter states keyed by column.
+        columns (list): The columns.
+
+    Returns:
+        (pandas.DataFrame): The grouped counts and percentages, as
+            process.calculate_grouped_counts gives them.
+    """
+
+    where, params = where_clause(states, not_null=columns)
+    names = ", ".join(db.quote(column) for column in columns)
+    dset_stats = query(
+        page,
+        f'SELECT {names}, count(*) AS records FROM "{page}"{where} '
+        f"GROUP BY {names} ORDER BY {names}",
+        params,
+    )
+    dset_stats["records (%)"] = (
+        100 * dset_stats["records"] / dset_stats["records"].sum()
+    ).round()
+
+    return dset_stats
+
+
+def shown_columns(catalog):
+    """Get the columns of a catalog shown when browsing the selected rows.
+
+    The long text columns are left out, as in the catalog scan, so that only
+    the short fields of the matching rows are materialised.
+
+    Args:
+        catalog (dict): The catalog.
+
+    Returns:
+        (list): The field names of the columns, in file order.
+    """
+
+    return [
+        column["field_name"]
+        for column in catalog["columns"]
+        if column["name"] not in cb.FIELDS_TO_NOT_DISPLAY
+        and column["name"] not in cb.COLUMNS_ENVIRONMENT_STATEMENTS
+    ]
+
+
+def select_rows(page, states, catalog, limit=MAX_ROWS):
+    """Get the first rows selected by the filters.
+
+    Args:
+        page (str): The page of the data source.
+        states (dict): The filter states keyed by column.
+        catalog (dict): The catalog of the data source, for the categories.
+        limit (int): The maximum number of rows.
+
+    Returns:
+        (pandas.DataFrame): The rows of the shown columns (see
+            shown_columns), with the categorical columns restored.
+    """
+
+    where, params = where_clause(states)
+    names = ", ".join(db.quote(column) for column in shown_columns(catalog))
+    dset = query(page, f'SELECT {names} FROM "{page}"{where} LIMIT ?', [*params, limit])
+    for column in catalog["columns"]:
+        if column["dtype"] == "category" and column["name"] in dset.columns:
+            dset[column["name"]] = dset[column["name"]].astype(
+                pd.CategoricalDtype(column.get("values"))
+            )
+
+    return dset
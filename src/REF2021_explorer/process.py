@@ -1,54 +1,393 @@
 # pylint: disable=E0401
 """ Functions for processing the data. """
 import numpy as np
+import pandas as pd
 import REF2021_explorer.codebook as cb
 
+# combinations are counted densely with np.bincount up to this many per row
+DENSE_COMBINATIONS_PER_ROW = 4
+DENSE_COMBINATIONS_MIN = 1024
 
-def calculate_counts(dset, col, sort=True):
+PROFILES = ["Outputs", "Impact", "Environment", "Overall"]
+# the columns of the other submission types hidden from each profile
+PROFILE_EXCLUDED_PREFIXES = {
+    "Outputs": ["Impact", "Total number"],
+    "Impact": ["Output", "Total number"],
+    "Environment": ["Output", "Impact", "Total number"],
+    "Overall": [],
+}
+PROFILE_RENAMES = [
+    (" stars", "*"),
+    (" star", "*"),
+    ("Output submissions - ", "Outputs - "),
+    ("Output submissions", "Outputs"),
+    (" (added)", ""),
+]
+GPA_COLUMN = "GPA"
+GPA_WEIGHTS = {"4*": 4, "3*": 3, "2*": 2, "1*": 1}
+
+# larger scatter plots are sent as the counts of a grid of SCATTER_BINS bins
+MAX_SCATTER_POINTS = 5000
+SCATTER_BINS = 100
+
+
+def calculate_counts(dset, col, sort=True, cube=None):
     """Calculate counts and percentages for a column.
 
     Args:
         dset (pandas.DataFrame): The dataset to use.
         col (str): The column to use
         sort (bool): Whether to sort the counts.
+        cube (dict): The aggregation cube of the dataset, used instead of
+            counting when it holds the column; see build_cube.
     """
 
+    if cube is not None and sort and col in cube["counts"]:
+        return cube["counts"][col]
+
     col_count = "records"
     col_perc = "records (%)"
-    dset_stats = (
-        dset[col]
-        .cat.remove_unused_categories()
-        .value_counts(sort=sort)
-        .to_frame(name=col_count)
-    )
+    column = dset[col]
+    if column.dtype.name == "category":
+        # count the category codes, missing values have code -1
+        codes = column.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(column.cat.categories))
+        used = np.flatnonzero(counts)
+        dset_stats = pd.Series(
+            counts[used],
+            index=pd.CategoricalIndex(column.cat.categories[used], name=col),
+            name="count",
+        )
+        if sort:
+            dset_stats = dset_stats.sort_values(ascending=False)
+        dset_stats = dset_stats.to_frame(name=col_count)
+    else:
+        dset_stats = column.value_counts(sort=sort).to_frame(name=col_count)
     dset_stats[col_perc] = np.round(100 * dset_stats[col_count] / dset.shape[0])
     dset_stats.index.name = col
 
     return dset_stats
 
 
-def calculate_grouped_counts(dset, columns):
+def count_combinations(codes, sizes):
+    """Count the combinations of category codes.
+
+    The codes are combined into a single index into the array of all the
+    combinations, counted with np.bincount, or with np.unique when there
+    are many more combinations than rows.
+
+    Args:
+        codes (list): The category codes of each column, without missing values.
+        sizes (list): The number of categories of each column.
+
+    Returns:
+        (list, numpy.ndarray): The codes of each column for the observed
+            combinations, in lexicographic order, and their counts.
+    """
+
+    flat = np.ravel_multi_index(codes, sizes)
+    dense_limit = DENSE_COMBINATIONS_PER_ROW * len(flat) + DENSE_COMBINATIONS_MIN
+    if np.prod(sizes, dtype=np.float64) <= dense_limit:
+        counts = np.bincount(flat, minlength=int(np.prod(sizes)))
+        observed = np.flatnonzero(counts)
+        counts = counts[observed]
+    else:
+        observed, counts = np.unique(flat, return_counts=True)
+
+    return list(np.unravel_index(observed, sizes)), counts
+
+
+def calculate_grouped_counts(dset, columns, cube=None):
     """Calculate counts and percentages for a grouped dataset.
 
     Args:
         dset (pandas.DataFrame): The dataset to use.
         columns (list): The columns to use for grouping.
+        cube (dict): The aggregation cube of the dataset, used instead of
+            counting when it holds the columns; see build_cube.
 
     Returns:
         dset_stats (pandas.DataFrame): The grouped dataset.
     """
 
+    if cube is not None and tuple(columns) in cube["pairs"]:
+        return cube["pairs"][tuple(columns)]
+
     col_count = "records"
     col_perc = "records (%)"
 
-    dset_stats = (
-        dset[columns].groupby(columns, observed=True).size().to_frame(name=col_count)
-    )
+    if all(dset[column].dtype.name == "category" for column in columns):
+        codes = [dset[column].cat.codes.to_numpy() for column in columns]
+        # like groupby, skip the rows with missing values
+        observed = np.logical_and.reduce([column_codes >= 0 for column_codes in codes])
+        combinations, counts = count_combinations(
+            [column_codes[observed] for column_codes in codes],
+            [len(dset[column].cat.categories) for column in columns],
+        )
+        dset_stats = pd.DataFrame(
+            {
+                column: pd.Categorical.from_codes(
+                    column_codes, dtype=dset[column].dtype
+                )
+                for column, column_codes in zip(columns, combinations)
+            }
+        )
+        dset_stats[col_count] = counts.astype(np.int64)
+    else:
+        dset_stats = (
+            dset[columns]
+            .groupby(columns, observed=True)
+            .size()
+            .to_frame(name=col_count)
+            .reset_index()
+        )
     dset_stats[col_perc] = np.round(
         100 * dset_stats[col_count] / dset_stats[col_count].sum()
     )
 
-    return dset_stats.reset_index()
+    return dset_stats
+
+
+def swap_grouped_counts(dset_stats, columns):
+    """Reorder grouped counts as if grouped by the columns in reverse order.
+
+    Args:
+        dset_stats (pandas.DataFrame): The grouped counts of two columns;
+            see calculate_grouped_counts.
+        columns (list): The two columns, in their grouping order.
+
+    Returns:
+        dset_stats (pandas.DataFrame): The grouped counts by the columns
+            in reverse order.
+    """
+
+    reverse = columns[::-1]
+    stats_columns = [column for column in dset_stats.columns if column not in columns]
+
+    return (
+        dset_stats[[*reverse, *stats_columns]]
+        .sort_values(reverse)
+        .reset_index(drop=True)
+    )
+
+
+def build_cube(dset):
+    """Materialise the counts of every categorical column and category pair.
+
+    The cube is built once per dataset version, so the charts of the whole
+    dataset are answered by a dictionary lookup instead of a groupby.
+
+    Args:
+        dset (pandas.DataFrame): The dataset to use.
+
+    Returns:
+        cube (dict): The number of rows, the counts keyed by column (see
+            calculate_counts) and the grouped counts keyed by ordered pair
+            of columns (see calculate_grouped_counts).
+    """
+
+    fields = get_column_lists(dset, "category")
+    cube = {"rows": dset.shape[0], "counts": {}, "pairs": {}}
+    for position, first in enumerate(fields):
+        cube["counts"][first] = calculate_counts(dset, first, sort=True)
+        for second in fields[position + 1 :]:
+            dset_stats = calculate_grouped_counts(dset, [first, second])
+            cube["pairs"][(first, second)] = dset_stats
+            cube["pairs"][(second, first)] = swap_grouped_counts(
+                dset_stats, [first, second]
+            )
+
+    return cube
+
+
+def profile_columns(columns, profile):
+    """Get the columns shown with a quality profile.
+
+    Args:
+        columns (list): The columns of the results.
+        profile (str): One of PROFILES.
+
+    Returns:
+        (list): The columns of the profile and the columns shared by every
+            profile, except the main panel.
+    """
+
+    prefix = f"{profile} profile - "
+    other_prefixes = [
+        f"{other} profile - " for other in PROFILES if other != profile
+    ] + PROFILE_EXCLUDED_PREFIXES[profile]
+
+    return [
+        column
+        for column in columns
+        if column != cb.COL_MAIN_PANEL_NAME
+        and (
+            column.startswith(prefix)
+            or not any(column.startswith(other) for other in other_prefixes)
+        )
+    ]
+
+
+def rename_profile_column(column, profile):
+    """Shorten the name of a column shown with a quality profile.
+
+    Args:
+        column (str): The column.
+        profile (str): One of PROFILES.
+
+    Returns:
+        (str): The short name, e.g. "4*" for "Outputs profile - 4 stars".
+    """
+
+    column = column.replace(f"{profile} profile - ", "")
+    for old, new in PROFILE_RENAMES:
+        column = column.replace(old, new)
+
+    return column
+
+
+def calculate_gpa(dset):
+    """Calculate the grade point average of a quality profile.
+
+    Args:
+        dset (pandas.DataFrame): The profile, with the percentages of 4*,
+            3*, 2* and 1* research.
+
+    Returns:
+        (numpy.ndarray): The grade point averages, rounded to 2 decimals.
+    """
+
+    percentages = dset[list(GPA_WEIGHTS)].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    return np.round(
+        percentages @ np.array(list(GPA_WEIGHTS.values()), dtype=np.float64) / 100,
+        decimals=2,
+    )
+
+
+def build_profiles(dset):
+    """Materialise the view of every quality profile with its GPA.
+
+    The views are built once per dataset version, so the profile tabs only
+    select the rows of the current filter from them.
+
+    Args:
+        dset (pandas.DataFrame): The results.
+
+    Returns:
+        (dict): The views keyed by profile, with short column names and the
+            GPA inserted after the unclassified percentage.
+    """
+
+    profiles = {}
+    for profile in PROFILES:
+        view = dset[profile_columns(dset.columns, profile)]
+        view.columns = [rename_profile_column(column, profile) for column in view]
+        view.insert(
+            view.columns.get_loc("Unclassified") + 1,
+            GPA_COLUMN,
+            pd.Series(calculate_gpa(view), index=view.index, dtype=view["4*"].dtype),
+        )
+        profiles[profile] = view
+
+    return profiles
+
+
+def correlation_matrix(dset, columns):
+    """Calculate the Pearson correlations of every pair of columns at once.
+
+    Like pandas.Series.corr, each pair uses the rows where both values are
+    present, but all pairs are computed with a few matrix products.
+
+    Args:
+        dset (pandas.DataFrame): The dataset to use.
+        columns (list): The numeric columns.
+
+    Returns:
+        (pandas.DataFrame): The correlations, indexed and labelled by the
+            columns; NaN for pairs with fewer than 2 rows or no variance.
+    """
+
+    values = dset[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    present = np.isfinite(values).astype(np.float64)
+    # centre the columns to limit the cancellation in the sums of squares
+    means = np.nansum(values, axis=0) / np.maximum(present.sum(axis=0), 1)
+    values = np.where(present > 0, values - means, 0)
+    pairs = present.T @ present
+    # sums[i, j]: the sum of column i over the rows where j is present too
+    sums = values.T @ present
+    squares = (values**2).T @ present
+    products = values.T @ values
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariances = pairs * products - sums * sums.T
+        variances = (pairs * squares - sums**2) * (pairs * squares - sums**2).T
+        correlations = np.where(
+            (pairs > 1) & (variances > 0), covariances / np.sqrt(variances), np.nan
+        )
+
+    return pd.DataFrame(np.clip(correlations, -1, 1), index=columns, columns=columns)
+
+
+def fit_line(dset, column_x, column_y):
+    """Fit a least-squares regression line of one column on another.
+
+    Args:
+        dset (pandas.DataFrame): The dataset to use.
+        column_x (str): The column of the explanatory variable.
+        column_y (str): The column of the response variable.
+
+    Returns:
+        (pandas.DataFrame): The ends of the line, at the smallest and largest
+            values of column_x, or None with fewer than 2 distinct values.
+    """
+
+    values = dset[[column_x, column_y]].to_numpy(dtype=np.float64, na_value=np.nan)
+    values = values[np.isfinite(values).all(axis=1)]
+    if len(values) < 2 or values[:, 0].min() == values[:, 0].max():
+        return None
+    slope, intercept = np.polyfit(values[:, 0], values[:, 1], deg=1)
+    ends = np.array([values[:, 0].min(), values[:, 0].max()])
+
+    return pd.DataFrame({column_x: ends, column_y: slope * ends + intercept})
+
+
+def scatter_points(dset, column_x, column_y, max_points=MAX_SCATTER_POINTS):
+    """Get the points of a scatter plot, binned if there are too many.
+
+    Args:
+        dset (pandas.DataFrame): The dataset to use.
+        column_x (str): The column of the x axis.
+        column_y (str): The column of the y axis.
+        max_points (int): The number of points above which the points are
+            replaced by the occupied bins of a SCATTER_BINS x SCATTER_BINS grid.
+
+    Returns:
+        (pandas.DataFrame): The points, or the centres of the occupied bins,
+            with the number of records at each.
+    """
+
+    values = dset[[column_x, column_y]].to_numpy(dtype=np.float64, na_value=np.nan)
+    values = values[np.isfinite(values).all(axis=1)]
+    if len(values) <= max_points:
+        return pd.DataFrame(
+            {
+                column_x: values[:, 0],
+                column_y: values[:, 1],
+                "records": np.ones(len(values), dtype=np.int64),
+            }
+        )
+    counts, edges_x, edges_y = np.histogram2d(
+        values[:, 0], values[:, 1], bins=SCATTER_BINS
+    )
+    occupied_x, occupied_y = np.nonzero(counts)
+
+    return pd.DataFrame(
+        {
+            column_x: ((edges_x[:-1] + edges_x[1:]) / 2)[occupied_x],
+            column_y: ((edges_y[:-1] + edges_y[1:]) / 2)[occupied_y],
+            "records": counts[occupied_x, occupied_y].astype(np.int64),
+        }
+    )
 
 
 def get_column_lists(dset, dtype):
@@ -1,18 +1,39 @@
 # pylint: disable=E0401
+# pylint: disable=E1101
 """ Module to read and write data from and to files. """
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 import pandas as pd
-import fastparquet as fp
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import streamlit as st
+from streamlit.runtime.scriptrunner import (
+    ScriptRunContext,
+    add_script_run_ctx,
+    get_script_run_ctx,
+)
+from streamlit.runtime.scriptrunner.script_run_context import (
+    SCRIPT_RUN_CONTEXT_ATTR_NAME,
+)
+from streamlit.runtime.state import SafeSessionState, SessionState
 
 import REF2021_explorer.codebook as cb
+import REF2021_explorer.logstore as ls
+import REF2021_explorer.manifest as mf
+import REF2021_explorer.process as proc
+import REF2021_explorer.snapshot as sn
 
 FETCHING_DATA = "Fetching data..."
+# the session id of the script context of the loads outside any session
+LOADER_SESSION = "loader"
 
 MOVE_TO_BACK = [
     cb.COL_MULTIPLE_SUBMISSION_NAME,
     cb.COL_MULIPLE_SUBMISSION_LETTER,
     cb.COL_JOINT_SUBMISSION,
-    cb.COL_TOTAL_FTE_JOINT
+    cb.COL_TOTAL_FTE_JOINT,
 ]
 
 # data paths
@@ -33,14 +54,32 @@ UNIT_ENV_PATH = (
 
 LOCAL_DATA_PATH = "data/"
 
-# local data for use with fastparquet
+# local data
 LOCAL_SOURCES = ["results", "inst_env_statements", "unit_env_statements"]
+# sources whose statement text columns are only read on demand; see records
+TEXT_SOURCES = ["inst_env_statements", "unit_env_statements"]
 
 DATA_EXT = ".parquet"
 LOGS_EXT = ".log"
 
 PARQUET_ENGINE = "pyarrow"
 
+# "pyarrow" serves Arrow-backed frames shared by all sessions,
+# "numpy" serves a NumPy-backed copy to every session
+DTYPE_BACKEND = os.environ.get("REF2021_DTYPE_BACKEND", "pyarrow")
+# number of threads fetching the files of a page concurrently
+FETCH_WORKERS = int(os.environ.get("REF2021_FETCH_WORKERS", "8"))
+# number of rows per batch when streaming a data set
+BATCH_SIZE = int(os.environ.get("REF2021_BATCH_SIZE", "10000"))
+
+# large sources previewed batch by batch while they load
+STREAMED_SOURCES = ["outputs", "impacts"]
+# sources with quality profiles; see process.build_profiles
+PROFILE_PAGES = ["results"]
+# larger sources are filtered and counted with SQL instead of loaded; see planner
+PLANNED_SOURCES = ["outputs", "impacts", "degrees", "income", "income_in_kind"]
+PLANNED_SOURCE_BYTES = int(os.environ.get("REF2021_PLANNED_SOURCE_BYTES", str(1024**3)))
+
 sources = {
     "data": {
         "groups": "ResearchGroups",
@@ -67,32 +106,289 @@ for source in sources["data"]:
     sources["logs"][source] = f"{LOGS_PATH}{sources['logs'][source]}{LOGS_EXT}"
 
 
+# versions kept by each cache: the current and the superseded version of
+# every source, so that the versions swapped out by the refresher are evicted
+CACHE_ENTRIES = 2 * len(sources["data"])
+
 CHAT_DB = "data/Results.parquet"
+CHAT_TABLE = "results"
+
+_loaded = set()
+_fetchers = []
+_fetchers_lock = threading.Lock()
+
+
+def source_entry(kind, page):
+    """Get the current entry of the data file or log of a page.
+
+    The snapshot is used when one is configured and holds the file,
+    otherwise the manifest.
+
+    Args:
+        kind (str): "data" or "logs".
+        page (str): The page.
+
+    Returns:
+        (dict): The manifest entry; see manifest.build_entry.
+    """
+
+    if sn.contains(f"{kind}/{page}"):
+        return sn.entry(f"{kind}/{page}")
+
+    return mf.current(sources[kind][page])
 
 
-@st.cache_data
 def get_data(page):
-    """Read the data from a parquet file.
+    """Read the data for a page at its current manifest version.
+
+    Every page filters and shows any of its columns, so the whole data set
+    is read once into the cache shared with the other loaders; see
+    data_loader.
+
+    Args:
+        page (str): The page to get the data for.
+
+    Returns:
+        (pandas.DataFrame): The data read from the file.
+    """
+
+    entry = source_entry("data", page)
+    mf.start_refresher(preload)
+    dset = data_loader()(page, entry["path"], entry["version"])
+    _loaded.add((page, entry["version"]))
+
+    return dset
+
+
+def is_planned(page):
+    """Check whether a data source is too large to load.
+
+    Args:
+        page (str): The page of the data source.
+
+    Returns:
+        (bool): True if the source is in PLANNED_SOURCES and its current
+            version is larger than PLANNED_SOURCE_BYTES.
+    """
+
+    return (
+        page in PLANNED_SOURCES
+        and source_entry("data", page)["size"] > PLANNED_SOURCE_BYTES
+    )
+
+
+def is_loaded(page):
+    """Check whether the full data for a page is already in the cache.
+
+    Args:
+        page (str): The page to check.
+
+    Returns:
+        (bool): True if the current version was loaded by this process.
+    """
+
+    entry = source_entry("data", page)
+
+    return (page, entry["version"]) in _loaded
+
+
+def iter_data(page, columns=None, batch_size=None):
+    """Stream the data for a page at its current manifest version.
+
+    The file is read one record batch at a time, so only a batch is held in
+    memory at once.
+
+    Args:
+        page (str): The page to get the data for.
+        columns (list): The columns to read; defaults to all the columns.
+        batch_size (int): The number of rows per batch; defaults to BATCH_SIZE.
+
+    Yields:
+        (pandas.DataFrame): The next batch of the data.
+    """
+
+    entry = source_entry("data", page)
+    for table in iter_tables(entry["path"], columns, batch_size):
+        yield batch_frame(entry["path"], table)
+
+
+def iter_tables(fname, columns=None, batch_size=None):
+    """Read a data file one record batch at a time.
+
+    Args:
+        fname (str): The local file name or snapshot path.
+        columns (list): The columns to read; defaults to all the columns.
+        batch_size (int): The number of rows per batch; defaults to BATCH_SIZE.
+
+    Yields:
+        (pyarrow.Table): The next batch of the data, as stored in the file.
+    """
+
+    if sn.is_snapshot_path(fname):
+        table = select_columns(sn.read_table(fname), columns)
+        for batch in table.to_batches(max_chunksize=batch_size or BATCH_SIZE):
+            yield pa.Table.from_batches([batch])
+        return
+
+    pfile = pq.ParquetFile(fname)
+    for batch in pfile.iter_batches(
+        batch_size=batch_size or BATCH_SIZE,
+        columns=columns,
+        use_pandas_metadata=True,
+    ):
+        yield pa.Table.from_batches([batch])
+
+
+def batch_frame(fname, table):
+    """Convert a batch of a data file to an Arrow-backed frame.
+
+    Args:
+        fname (str): The local file name or snapshot path.
+        table (pyarrow.Table): The batch; see iter_tables.
+
+    Returns:
+        (pandas.DataFrame): The batch.
+    """
+
+    if not sn.is_snapshot_path(fname):
+        table = encode_categoricals(table, categorical_columns(fname))
+
+    return table.to_pandas(types_mapper=arrow_types)
+
+
+def stream_data(page, preview):
+    """Load the full data for a page, passing its batches to a preview.
+
+    The batches shown by the preview are kept and the frame is built from
+    them, so the file is read only once.
+
+    Args:
+        page (str): The page to get the data for.
+        preview (callable): Called with an iterator of the data batches.
+
+    Returns:
+        (pandas.DataFrame): The data, as get_data would return it.
+    """
+
+    entry = source_entry("data", page)
+    mf.start_refresher(preload)
+    tables = []
+
+    def batches():
+        for table in iter_tables(
+            entry["path"], source_columns(page, entry["path"], None)
+        ):
+            tables.append(table)
+            yield batch_frame(entry["path"], table)
+
+    preview(batches())
+    # _tables is not part of the cache key, so this is the entry of get_data
+    dset = data_loader()(page, entry["path"], entry["version"], _tables=tables)
+    _loaded.add((page, entry["version"]))
+
+    return dset
+
+
+def data_loader():
+    """Get the cached data loader for the configured dtype backend.
+
+    Returns:
+        (callable): load_shared_data for the "pyarrow" backend,
+            load_data otherwise.
+    """
+
+    if DTYPE_BACKEND == "pyarrow":
+        return load_shared_data
+
+    return load_data
+
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_data(page, fname, version, _tables=None):  # pylint: disable=W0613
+    """Read the data into a cache that returns a copy to every caller.
 
     Args:
         page (str): The page to get the data for.
+        fname (str): The local file name.
+        version (str): The manifest version of the file, used as cache key.
+        _tables (list): The batches of the file, already read; see
+            stream_data. Not part of the cache key.
 
     Returns:
         (pandas.DataFrame): The data read from the file.
     """
 
-    fname = sources["data"][page]
-    columns_to_read = None
-    if page in LOCAL_SOURCES:
-        # filter out the environment statement columns for local data
-        pf = fp.ParquetFile(fname)
-        columns_to_read = [
+    return read_data(page, fname, tables=_tables)
+
+
+@st.cache_resource(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_shared_data(page, fname, version, _tables=None):  # pylint: disable=W0613
+    """Read Arrow-backed data into a cache shared by every session.
+
+    All callers get the same frame, so it must not be modified in place.
+
+    Args:
+        page (str): The page to get the data for.
+        fname (str): The local file name.
+        version (str): The manifest version of the file, used as cache key.
+        _tables (list): The batches of the file, already read; see
+            stream_data. Not part of the cache key.
+
+    Returns:
+        (pandas.DataFrame): The data read from the file.
+    """
+
+    return read_data(page, fname, dtype_backend="pyarrow", tables=_tables)
+
+
+def source_columns(page, fname, columns):
+    """Get the columns of a data file read for a page.
+
+    Args:
+        page (str): The page to get the data for.
+        fname (str): The local file name or snapshot path.
+        columns (list): The columns requested; None requests all the columns.
+
+    Returns:
+        (list): The columns to read, or None to read all the columns.
+    """
+
+    if columns is None and page in LOCAL_SOURCES + TEXT_SOURCES:
+        # filter out the environment statement columns; the text sources
+        # read them by record instead
+        return [
             column
-            for column in pf.columns
-            if column not in cb.COLUMNS_UNIT_ENVIRONMENT_STATEMENTS
+            for column in read_schema(fname).names
+            if column not in cb.COLUMNS_ENVIRONMENT_STATEMENTS
         ]
 
-    dset = read_parquet(fname, columns_to_read)
+    return columns
+
+
+def read_data(page, fname, columns=None, dtype_backend=None, tables=None):
+    """Read the data from a parquet file.
+
+    Args:
+        page (str): The page to get the data for.
+        fname (str): The local file name or snapshot path.
+        columns (list): The columns to read; defaults to all the columns.
+        dtype_backend (str): The dtype backend; see read_parquet.
+        tables (list): The batches of the file, already read with the
+            columns of source_columns, to build the data
+            from instead of reading the file; see stream_data.
+
+    Returns:
+        (pandas.DataFrame): The data read from the file.
+    """
+
+    columns_to_read = source_columns(page, fname, columns)
+
+    if tables is not None:
+        dset = read_tables(fname, tables, dtype_backend)
+    elif sn.is_snapshot_path(fname):
+        dset = read_snapshot(fname, columns_to_read, dtype_backend)
+    else:
+        dset = read_parquet(fname, columns_to_read, dtype_backend=dtype_backend)
 
     # move institution name column to the back which works better for visualisations
     # if cb.COL_INST_NAME in dset.columns:
@@ -103,60 +399,534 @@ def get_data(page):
 
     for column in MOVE_TO_BACK:
         if column in dset.columns:
-            columns = dset.columns.tolist()
-            columns.remove(column)
-            columns.append(column)
-            dset = dset[columns]
+            columns_order = dset.columns.tolist()
+            columns_order.remove(column)
+            columns_order.append(column)
+            dset = dset[columns_order]
 
     return dset
 
 
-@st.cache_data
+def get_cube(page):
+    """Get the aggregation cube of the data for a page at its current version.
+
+    Args:
+        page (str): The page to get the cube for.
+
+    Returns:
+        (dict): The aggregation cube; see process.build_cube.
+    """
+
+    entry = source_entry("data", page)
+
+    return load_cube(page, entry["path"], entry["version"])
+
+
+@st.cache_resource(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_cube(page, fname, version):
+    """Build the aggregation cube into a cache shared by every session.
+
+    Args:
+        page (str): The page to get the cube for.
+        fname (str): The local file name or snapshot path.
+        version (str): The manifest version of the file, used as cache key.
+
+    Returns:
+        (dict): The aggregation cube; see process.build_cube.
+    """
+
+    return proc.build_cube(data_loader()(page, fname, version))
+
+
+def get_profiles(page):
+    """Get the quality profile views of the data for a page at its current version.
+
+    Args:
+        page (str): The page to get the views for.
+
+    Returns:
+        (dict): The views keyed by profile; see process.build_profiles.
+    """
+
+    entry = source_entry("data", page)
+
+    return load_profiles(page, entry["path"], entry["version"])
+
+
+@st.cache_resource(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_profiles(page, fname, version):
+    """Build the quality profile views into a cache shared by every session.
+
+    Args:
+        page (str): The page to get the views for.
+        fname (str): The local file name or snapshot path.
+        version (str): The manifest version of the file, used as cache key.
+
+    Returns:
+        (dict): The views keyed by profile; see process.build_profiles.
+    """
+
+    return proc.build_profiles(data_loader()(page, fname, version))
+
+
+def get_correlations(page, profile, columns, rows=None):
+    """Get the correlations of some columns of a quality profile view.
+
+    Args:
+        page (str): The page to get the view for.
+        profile (str): The profile; see process.build_profiles.
+        columns (list): The numeric columns.
+        rows (numpy.ndarray): The positions of the selected rows of the
+            view; None selects all the rows.
+
+    Returns:
+        (pandas.DataFrame): The correlations; see process.correlation_matrix.
+    """
+
+    entry = source_entry("data", page)
+
+    return load_correlations(
+        page, entry["path"], entry["version"], profile, tuple(columns), rows
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_correlations(
+    page, fname, version, profile, columns, rows
+):  # pylint: disable=R0913,R0917
+    """Calculate the correlations of a profile view into a cache.
+
+    The correlations are kept per version and selection of rows, so they
+    are only calculated again when the filters change.
+
+    Args:
+        page (str): The page to get the view for.
+        fname (str): The local file name or snapshot path.
+        version (str): The manifest version of the file, used as cache key.
+        profile (str): The profile; see process.build_profiles.
+        columns (tuple): The numeric columns.
+        rows (numpy.ndarray): The positions of the selected rows, or None.
+
+    Returns:
+        (pandas.DataFrame): The correlations; see process.correlation_matrix.
+    """
+
+    view = load_profiles(page, fname, version)[profile]
+    if rows is not None:
+        view = view.take(rows)
+
+    return proc.correlation_matrix(view, list(columns))
+
+
 def get_logs(page):
-    """Read the processing logs
+    """Read the processing logs at their current manifest version.
 
     Args:
         page (str): The page to get the logs for.
 
     Returns:
-        (pandas.DataFrame): The data read from the file.
+        (dict): The processing logs; see logstore.build_store.
+    """
+
+    entry = source_entry("logs", page)
+    mf.start_refresher(preload)
+
+    return load_logs(entry["path"], entry["version"])
+
+
+@st.cache_resource(show_spinner=False, max_entries=CACHE_ENTRIES)
+def load_logs(fname, version):  # pylint: disable=W0613
+    """Read the processing logs into a store shared by every session.
+
+    Args:
+        fname (str): The local file name or snapshot path.
+        version (str): The manifest version of the file, used as cache key.
+
+    Returns:
+        (dict): The processing logs; see logstore.build_store.
+    """
+
+    if sn.is_snapshot_path(fname):
+        return ls.build_store(pa.BufferReader(sn.read_buffer(fname)))
+
+    return ls.build_store(fname)
+
+
+def preload(location, entry):
+    """Load a new version of a data file or log into the caches.
+
+    The refresher thread belongs to no session, so the loads run in the
+    loader context; see loader_context.
+
+    Args:
+        location (str): The file path or URL from sources.
+        entry (dict): The manifest entry of the new version.
+    """
+
+    run_in_context(loader_context(), load_version, location, entry)
+
+
+def load_version(location, entry):
+    """Load a version of a data file or log into the caches.
+
+    Args:
+        location (str): The file path or URL from sources.
+        entry (dict): The manifest entry of the version.
+    """
+
+    for page, data_location in sources["data"].items():
+        # the sources explored with SQL are never loaded
+        if data_location == location and not is_planned(page):
+            data_loader()(page, entry["path"], entry["version"])
+            load_cube(page, entry["path"], entry["version"])
+            if page in PROFILE_PAGES:
+                load_profiles(page, entry["path"], entry["version"])
+    for page, logs_location in sources["logs"].items():
+        if logs_location == location:
+            load_logs(entry["path"], entry["version"])
+
+
+def fetcher():
+    """Get the process-wide thread pool used to fetch files concurrently.
+
+    Returns:
+        (concurrent.futures.ThreadPoolExecutor): The thread pool.
     """
 
-    fname = sources["logs"][page]
-    logs = pd.read_csv(fname, sep="\t", header=None)
-    logs = logs.to_csv(header=False, index=False).replace('"', "")
+    with _fetchers_lock:
+        if not _fetchers:
+            _fetchers.append(
+                ThreadPoolExecutor(
+                    max_workers=FETCH_WORKERS, thread_name_prefix="fetch"
+                )
+            )
+
+    return _fetchers[0]
+
+
+def run_in_context(ctx, func, *args):
+    """Run a function in a worker thread with the caller's script context.
+
+    Args:
+        ctx (streamlit.runtime.scriptrunner.ScriptRunContext): The script
+            context of the caller, or None outside a script run.
+        func (callable): The function to run.
+        *args: The arguments of the function.
+
+    Returns:
+        (object): The result of the function.
+    """
+
+    thread = threading.current_thread()
+    previous = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    add_script_run_ctx(thread, ctx)
+    try:
+        return func(*args)
+    finally:
+        # add_script_run_ctx(thread, None) would attach the current context
+        # again, so the previous one is restored directly
+        setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous)
+
+
+def loader_context():
+    """Create a script context for the loads into the caches outside any session.
+
+    Streamlit only keeps the values computed in a thread with a script
+    context, so the threads loading the data before any session needs it
+    (see warmup) run in this context, which belongs to no session and
+    discards any message.
+
+    Returns:
+        (streamlit.runtime.scriptrunner.ScriptRunContext): The context.
+    """
+
+    return ScriptRunContext(
+        session_id=LOADER_SESSION,
+        _enqueue=lambda _msg: None,
+        query_string="",
+        session_state=SafeSessionState(SessionState(), lambda: None),
+        uploaded_file_mgr=None,
+        main_script_path="",
+        page_script_hash="",
+        user_info={},
+    )
+
+
+def submit_all(calls):
+    """Start several fetches in the fetch thread pool.
+
+    Args:
+        calls (list): The (function, *args) tuples to run,
+            e.g. [(get_data, "results"), (get_logs, "results")].
+
+    Returns:
+        (list): The futures of the calls, in order.
+    """
+
+    ctx = get_script_run_ctx()
+
+    return [fetcher().submit(run_in_context, ctx, *call) for call in calls]
 
-    return logs
 
+def fetch_all(calls):
+    """Run several fetches concurrently.
 
-def get_dataframes(page):
+    The fetches run in the bounded fetch thread pool, so the latency of a
+    cold page is that of its slowest file rather than the sum of all of
+    them. Each download has the timeout and retries set in the mirror.
+
+    Args:
+        calls (list): The (function, *args) tuples to run; see submit_all.
+
+    Returns:
+        (list): The results, in the order of the calls; the first error
+            raised by a call is raised again once all the calls are done.
+    """
+
+    futures = submit_all(calls)
+    wait(futures)
+
+    return [future.result() for future in futures]
+
+
+def get_dataframes(page, preview=None):
     """Get the data and logs for a page.
 
+    The data and logs are fetched concurrently. For the streamed sources,
+    the first time the data is loaded, the data is read batch by batch and
+    the preview is called with the batches, which then make the full data;
+    see stream_data.
+
     Args:
         page (str): The page to get the data for.
+        preview (callable): Called with an iterator of the data batches,
+            e.g. visualisations.display_streaming_preview.
 
     Returns:
-        (pandas.DataFrame, pandas.DataFrame): The data and logs.
+        (pandas.DataFrame, dict): The data and logs.
     """
 
     with st.spinner(FETCHING_DATA):
-        dset = get_data(page)
-        logs = get_logs(page)
+        if preview is not None and page in STREAMED_SOURCES and not is_loaded(page):
+            logs_future = submit_all([(get_logs, page)])[0]
+            dset = stream_data(page, preview)
+            logs = logs_future.result()
+        else:
+            dset, logs = fetch_all([(get_data, page), (get_logs, page)])
 
     return dset, logs
 
 
-def read_parquet(fname, columns_to_read=None):
+def arrow_types(arrow_type):
+    """Map Arrow string types to Arrow-backed pandas strings.
+
+    Args:
+        arrow_type (pyarrow.DataType): The Arrow type of a column.
+
+    Returns:
+        (pandas.StringDtype): The pandas dtype, or None to use the default
+            conversion (categoricals for dictionary-encoded columns and
+            NumPy for numbers).
+    """
+
+    if arrow_type in [pa.string(), pa.large_string()]:
+        return pd.StringDtype("pyarrow")
+
+    return None
+
+
+def categorical_columns(fname):
+    """Get the categorical columns stored as plain strings in a parquet file.
+
+    Files rewritten by the relayout tool store categoricals as dictionary
+    encoded strings, whose row group statistics the reader can prune on;
+    see encode_categoricals.
+
+    Args:
+        fname (str): The file name.
+
+    Returns:
+        (list): The names of the columns.
+    """
+
+    schema = pq.read_schema(fname)
+    pandas_metadata = schema.pandas_metadata or {}
+
+    return [
+        column["field_name"]
+        for column in pandas_metadata.get("columns", [])
+        if column["pandas_type"] == "categorical"
+        and not pa.types.is_dictionary(schema.field(column["field_name"]).type)
+    ]
+
+
+def encode_categoricals(table, columns):
+    """Dictionary-encode string columns with their sorted values as levels.
+
+    Args:
+        table (pyarrow.Table): The table.
+        columns (list): The columns to encode; see categorical_columns.
+
+    Returns:
+        (pyarrow.Table): The table, converted to pandas categoricals
+            by to_pandas.
+    """
+
+    for column in columns:
+        if column not in table.column_names:
+            continue
+        values = table[column]
+        levels = pc.unique(values.drop_null())
+        levels = levels.take(pc.array_sort_indices(levels))
+        dictionary_type = pa.dictionary(pa.int32(), levels.type)
+        encoded = pa.chunked_array(
+            [
+                pa.DictionaryArray.from_arrays(
+                    pc.index_in(chunk, value_set=levels), levels
+                )
+                for chunk in values.chunks
+            ],
+            type=dictionary_type,
+        )
+        table = table.set_column(
+            table.column_names.index(column),
+            table.schema.field(column).with_type(dictionary_type),
+            encoded,
+        )
+
+    return table
+
+
+def read_schema(fname):
+    """Read the schema of a data file.
+
+    Args:
+        fname (str): The local file name or snapshot path.
+
+    Returns:
+        (pyarrow.Schema): The schema.
+    """
+
+    if sn.is_snapshot_path(fname):
+        return sn.read_table(fname).schema
+
+    return pq.read_schema(fname)
+
+
+def select_columns(table, columns):
+    """Select some columns of a table, keeping its pandas index columns.
+
+    Args:
+        table (pyarrow.Table): The table.
+        columns (list): The columns to select; None selects all the columns.
+
+    Returns:
+        (pyarrow.Table): The selected columns.
+    """
+
+    if columns is None:
+        return table
+    index_columns = [
+        column
+        for column in (table.schema.pandas_metadata or {}).get("index_columns", [])
+        if isinstance(column, str) and column not in columns
+    ]
+
+    return table.select([*columns, *index_columns])
+
+
+def read_tables(fname, tables, dtype_backend=None):
+    """Build the data from the batches of a file.
+
+    The list of batches is emptied, so that the batches are released as
+    the data is converted.
+
+    Args:
+        fname (str): The local file name or snapshot path.
+        tables (list): The batches; see iter_tables.
+        dtype_backend (str): The dtype backend; see read_parquet.
+
+    Returns:
+        (pandas.DataFrame): The data.
+    """
+
+    table = pa.concat_tables(tables)
+    tables.clear()
+    if not sn.is_snapshot_path(fname):
+        table = encode_categoricals(table, categorical_columns(fname))
+    if dtype_backend == "pyarrow":
+        return table.to_pandas(
+            types_mapper=arrow_types, split_blocks=True, self_destruct=True
+        )
+
+    return table.to_pandas()
+
+
+def read_snapshot(fname, columns_to_read=None, dtype_backend=None):
+    """Read a data source from the snapshot.
+
+    The table is memory-mapped, so selecting the columns is free and only
+    the conversion to pandas touches the data.
+
+    Args:
+        fname (str): The snapshot path.
+        columns_to_read (list): The columns to read.
+        dtype_backend (str): The dtype backend; see read_parquet.
+
+    Returns:
+        (pandas.DataFrame): The data.
+    """
+
+    table = select_columns(sn.read_table(fname), columns_to_read)
+    if dtype_backend == "pyarrow":
+        return table.to_pandas(types_mapper=arrow_types, split_blocks=True)
+
+    return table.to_pandas()
+
+
+def read_parquet(fname, columns_to_read=None, filters=None, dtype_backend=None):
     """Read a parquet file.
 
+    Only the requested columns are read, and the filters are pushed down to
+    the pyarrow dataset scanner, which uses the row group statistics to skip
+    the row groups that cannot match.
+
     Args:
         fname (str): The file name.
         columns_to_read (list): The columns to read.
+        filters (list): The row filters, either a pyarrow expression or
+            tuples (column, op, value) in disjunctive normal form, e.g.
+            [("Institution name", "in", ["University of Oxford"])].
+        dtype_backend (str): "pyarrow" to keep string columns in Arrow memory
+            and dictionary-encoded columns as categoricals instead of
+            converting them to Python objects; defaults to NumPy dtypes.
 
     Returns:
         (pandas.DataFrame): The data read from the file.
     """
 
-    dset = pd.read_parquet(fname, columns=columns_to_read, engine=PARQUET_ENGINE)
+    if dtype_backend == "pyarrow":
+        table = pq.read_table(
+            fname,
+            columns=columns_to_read,
+            filters=filters,
+            use_pandas_metadata=True,
+        )
+        table = encode_categoricals(table, categorical_columns(fname))
+        # release the Arrow buffers column by column while converting them,
+        # so the peak memory stays close to the size of the frame
+        return table.to_pandas(
+            types_mapper=arrow_types, split_blocks=True, self_destruct=True
+        )
+
+    dset = pd.read_parquet(
+        fname,
+        columns=columns_to_read,
+        filters=filters,
+        engine=PARQUET_ENGINE,
+    )
+    for column in categorical_columns(fname):
+        if column in dset.columns:
+            dset[column] = dset[column].astype("category")
 
     return dset
@@ -0,0 +1,228 @@
+# pylint: disable=E0401
+""" Record store of the text-heavy data sources.
+
+The environment statement sources are mostly text, but a page only needs
+their small key columns (institution, unit of assessment) to open, and the
+text of the few records a search shows. The store of a source holds:
+
+- the key columns, read once per version and shared by every session,
+- the location of every record, its row group and offset in the row group
+  (the whole table is one row group in a snapshot), found from the Record
+  column alone,
+
+so that the text of some records is read from their row groups only. The
+texts read recently are kept in a process-wide LRU cache of up to
+CACHE_SIZE statements, so that going back to a statement is free.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow.parquet as pq
+import streamlit as st
+
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.snapshot as sn
+
+# settings
+CACHE_SIZE = int(os.environ.get("REF2021_STATEMENT_CACHE_SIZE", "256"))
+
+RECORD_COLUMN = "Record"
+
+_statements = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_store(page):
+    """Get the record store of a data source at its current version.
+
+    Args:
+        page (str): The page of the data source.
+
+    Returns:
+        (dict): The store; see build_store.
+    """
+
+    entry = rw.source_entry("data", page)
+
+    return load_store(page, entry["path"], entry["version"])
+
+
+def get_keys(page):
+    """Get the key columns of a data source, without its text columns.
+
+    Args:
+        page (str): The page of the data source.
+
+    Returns:
+        (pandas.DataFrame): The key columns, indexed by record id. The frame
+            is shared, so it must not be modified in place.
+    """
+
+    return get_store(page)["keys"]
+
+
+@st.cache_resource(show_spinner=False, max_entries=rw.CACHE_ENTRIES)
+def load_store(page, fname, version):
+    """Build the record store of a data source into a cache shared by every session.
+
+    Args:
+        page (str): The page of the data source.
+        fname (str): The local file name or snapshot path.
+        version (str): The manifest version of the file, used as cache key.
+
+    Returns:
+        (dict): The store; see build_store.
+    """
+
+    return build_store(page, fname, version)
+
+
+def record_locations(fname):
+    """Find the row group and the offset in the row group of every record.
+
+    Args:
+        fname (str): The local file name or snapshot path.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray): The record ids in
+            ascending order, and the row group and offset of each.
+    """
+
+    if sn.is_snapshot_path(fname):
+        groups = [sn.read_table(fname).column(RECORD_COLUMN)]
+    else:
+        pfile = pq.ParquetFile(fname)
+        groups = [
+            pfile.read_row_group(row_group, columns=[RECORD_COLUMN]).column(0)
+            for row_group in range(pfile.num_row_groups)
+        ]
+    records = np.concatenate(
+        [np.asarray(group, dtype=np.int64) for group in groups]
+        or [np.array([], dtype=np.int64)]
+    )
+    row_groups = np.repeat(
+        np.arange(len(groups), dtype=np.int32), [len(group) for group in groups]
+    )
+    offsets = np.concatenate(
+        [np.arange(len(group), dtype=np.int64) for group in groups]
+        or [np.array([], dtype=np.int64)]
+    )
+    order = np.argsort(records, kind="stable")
+
+    return records[order], row_groups[order], offsets[order]
+
+
+def build_store(page, fname, version):
+    """Build the record store of a data source.
+
+    Args:
+        page (str): The page of the data source.
+        fname (str): The local file name or snapshot path.
+        version (str): The manifest version of the file.
+
+    Returns:
+        (dict): The file name and version, the key columns (see get_keys)
+            and the record locations (see record_locations).
+    """
+
+    records, row_groups, offsets = record_locations(fname)
+
+    return {
+        "fname": fname,
+        "version": version,
+        "keys": rw.data_loader()(page, fname, version),
+        "records": records,
+        "row_groups": row_groups,
+        "offsets": offsets,
+    }
+
+
+def locate(store, record_ids):
+    """Find the row groups and offsets of some records.
+
+    Args:
+        store (dict): The record store.
+        record_ids (array-like): The record ids.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): The row group and offset of each.
+
+    Raises:
+        KeyError: If a record is not in the data source.
+    """
+
+    record_ids = np.asarray(record_ids, dtype=np.int64)
+    positions = np.searchsorted(store["records"], record_ids)
+    positions = np.minimum(positions, len(store["records"]) - 1)
+    if len(record_ids) and (
+        len(store["records"]) == 0 or np.any(store["records"][positions] != record_ids)
+    ):
+        raise KeyError(f"Unknown records {record_ids.tolist()}")
+
+    return store["row_groups"][positions], store["offsets"][positions]
+
+
+def read_texts(store, column, row_group, offsets):
+    """Read a text column of some rows of a row group.
+
+    Args:
+        store (dict): The record store.
+        column (str): The text column.
+        row_group (int): The row group.
+        offsets (numpy.ndarray): The offsets of the rows in the row group.
+
+    Returns:
+        (list): The texts, None for missing ones.
+    """
+
+    if sn.is_snapshot_path(store["fname"]):
+        texts = sn.read_table(store["fname"]).column(column)
+    else:
+        texts = (
+            pq.ParquetFile(store["fname"])
+            .read_row_group(int(row_group), columns=[column])
+            .column(0)
+        )
+
+    return texts.take(offsets).to_pylist()
+
+
+def get_texts(page, record_ids, column):
+    """Get a text column of some records, reading only the ones not cached.
+
+    Args:
+        page (str): The page of the data source.
+        record_ids (array-like): The record ids.
+        column (str): The text column.
+
+    Returns:
+        (list): The texts of the records, in order, None for missing ones.
+    """
+
+    store = get_store(page)
+    keys = [(page, store["version"], column, int(record)) for record in record_ids]
+    texts = {}
+    with _lock:
+        for key in keys:
+            if key in _statements:
+                _statements.move_to_end(key)
+                texts[key] = _statements[key]
+
+    missing = [key for key in keys if key not in texts]
+    if missing:
+        row_groups, offsets = locate(store, [key[3] for key in missing])
+        for row_group in np.unique(row_groups):
+            in_group = np.flatnonzero(row_groups == row_group)
+            for position, text in zip(
+                in_group, read_texts(store, column, row_group, offsets[in_group])
+            ):
+                texts[missing[position]] = text
+        with _lock:
+            for key in missing:
+                _statements[key] = texts[key]
+            while len(_statements) > CACHE_SIZE:
+                _statements.popitem(last=False)
+
+    return [texts[key] for key in keys]
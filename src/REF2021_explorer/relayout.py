@@ -0,0 +1,316 @@
+# pylint: disable=E0401
+# pylint: disable=E1101
+""" Rewrite a parquet data file with a scan-friendly layout.
+
+The rows are sorted by institution and unit of assessment and written in
+zstd-compressed row groups with dictionary encoding, row group statistics
+and a page index, so that readers pushing down an institution filter skip
+the row groups of the other institutions. A unit of assessment is only
+sorted within each institution, so a filter on it alone reads most row
+groups. Categorical
+columns are stored as dictionary-encoded strings, whose statistics pyarrow
+uses for pruning, and read back as categoricals by read_write.
+
+Run as a module to rewrite a file in place and compare the layouts:
+
+    python -m REF2021_explorer.relayout data/Results.parquet --benchmark
+"""
+import os
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import REF2021_explorer.codebook as cb
+import REF2021_explorer.read_write as rw
+
+DESCRIPTION = "Rewrite a parquet data file with a scan-friendly layout."
+
+# rows per row group: small row groups let filtered scans skip more data
+# but add per-group overhead to every full scan, which dominates for files
+# of a few thousand rows such as Results, written as a single row group
+ROW_GROUP_SIZE = 64 * 1024
+COMPRESSION = "zstd"
+SORT_BY = [cb.COL_INST_NAME, cb.COL_UNIT_OF_ASSESSMENT]
+
+BENCHMARK_PROBES = 10
+BENCHMARK_REPEAT = 5
+PRUNING_NOTE = (
+    "The file is sorted by {first} first, so a filter on {column} alone "
+    "cannot skip row groups."
+)
+
+
+def sort_table(table, columns):
+    """Sort a table by some of its columns.
+
+    Args:
+        table (pyarrow.Table): The table.
+        columns (list): The columns to sort by, in order; the columns
+            missing from the table are ignored.
+
+    Returns:
+        (pyarrow.Table): The sorted table.
+    """
+
+    columns = [column for column in columns if column in table.column_names]
+    if not columns:
+        return table
+    # dictionary columns cannot be sorted directly, so sort on their values
+    keys = pa.table(
+        {
+            column: (
+                table[column].cast(table.schema.field(column).type.value_type)
+                if pa.types.is_dictionary(table.schema.field(column).type)
+                else table[column]
+            )
+            for column in columns
+        }
+    )
+    indices = pc.sort_indices(
+        keys, sort_keys=[(column, "ascending") for column in columns]
+    )
+
+    return table.take(indices)
+
+
+def decode_dictionaries(table):
+    """Store the dictionary columns of a table as their values.
+
+    The values are still dictionary-encoded in the parquet file, and the
+    pandas metadata still lists the columns as categorical.
+
+    Args:
+        table (pyarrow.Table): The table.
+
+    Returns:
+        (pyarrow.Table): The table with the dictionary columns decoded.
+    """
+
+    schema = pa.schema(
+        [
+            (
+                field.with_type(field.type.value_type)
+                if pa.types.is_dictionary(field.type)
+                else field
+            )
+            for field in table.schema
+        ],
+        metadata=table.schema.metadata,
+    )
+
+    return table.cast(schema)
+
+
+def relayout(
+    source,
+    target,
+    row_group_size=ROW_GROUP_SIZE,
+    compression=COMPRESSION,
+    compression_level=None,
+    use_dictionary=True,
+    sort_by=None,
+):  # pylint: disable=R0913,R0917
+    """Rewrite a parquet file with a scan-friendly layout.
+
+    Args:
+        source (str): The file to rewrite.
+        target (str): The file to write, which can be the source.
+        row_group_size (int): The maximum number of rows per row group.
+        compression (str): The compression codec.
+        compression_level (int): The compression level; defaults to the
+            codec default.
+        use_dictionary (bool): Whether to dictionary-encode the columns.
+        sort_by (list): The columns to sort by; defaults to SORT_BY.
+    """
+
+    table = pq.read_table(source)
+    table = sort_table(table, SORT_BY if sort_by is None else sort_by)
+    table = decode_dictionaries(table)
+
+    with tempfile.NamedTemporaryFile(
+        dir=Path(target).parent, suffix=".tmp", delete=False
+    ) as target_file:
+        pq.write_table(
+            table,
+            target_file,
+            row_group_size=row_group_size,
+            compression=compression,
+            compression_level=compression_level,
+            use_dictionary=use_dictionary,
+            write_statistics=True,
+            write_page_index=True,
+        )
+    os.replace(target_file.name, target)
+
+
+def row_groups_to_read(fname, column, value):
+    """Count the row groups whose statistics do not rule out a value.
+
+    Args:
+        fname (str): The parquet file.
+        column (str): The column.
+        value (object): The value.
+
+    Returns:
+        (int): The number of row groups a reader has to scan.
+    """
+
+    metadata = pq.ParquetFile(fname).metadata
+    index = pq.read_schema(fname).get_field_index(column)
+    count = 0
+    for row_group in range(metadata.num_row_groups):
+        statistics = metadata.row_group(row_group).column(index).statistics
+        if (
+            statistics is None
+            or not statistics.has_min_max
+            or statistics.min <= value <= statistics.max
+        ):
+            count += 1
+
+    return count
+
+
+def benchmark_probes(fname, columns=None, count=BENCHMARK_PROBES):
+    """Pick the filter values to benchmark, spread over the sorted values.
+
+    Args:
+        fname (str): The parquet file.
+        columns (list): The columns to filter on; defaults to SORT_BY.
+        count (int): The number of values per column.
+
+    Returns:
+        (list): The (column, value) pairs.
+    """
+
+    schema = pq.read_schema(fname)
+    columns = [column for column in (columns or SORT_BY) if column in schema.names]
+    table = pq.read_table(fname, columns=columns)
+    probes = []
+    for column in columns:
+        values = table[column]
+        if pa.types.is_dictionary(values.type):
+            values = values.cast(values.type.value_type)
+        values = sorted(pc.unique(values.drop_null()).to_pylist())
+        step = max(len(values) // count, 1)
+        probes.extend((column, value) for value in values[::step][:count])
+
+    return probes
+
+
+def benchmark(fname, probes, repeat=BENCHMARK_REPEAT):
+    """Time filtered scans of a parquet file.
+
+    Args:
+        fname (str): The parquet file.
+        probes (list): The (column, value) pairs to filter on.
+        repeat (int): The number of scans per probe.
+
+    Returns:
+        (dict): The file size, number of row groups, mean time of a full
+            scan, and mean scan time and fraction of row groups read per
+            filter column.
+    """
+
+    metadata = pq.ParquetFile(fname).metadata
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rw.read_parquet(fname, dtype_backend="pyarrow")
+    results = {
+        "size (kB)": os.path.getsize(fname) / 1024,
+        "row groups": metadata.num_row_groups,
+        "full scan (ms)": 1000 * (time.perf_counter() - started) / repeat,
+    }
+    for column in dict.fromkeys(column for column, _ in probes):
+        timings = []
+        row_groups = []
+        for _, value in [probe for probe in probes if probe[0] == column]:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                rw.read_parquet(
+                    fname, filters=[(column, "==", value)], dtype_backend="pyarrow"
+                )
+            timings.append((time.perf_counter() - started) / repeat)
+            row_groups.append(row_groups_to_read(fname, column, value))
+        results[f"{column}: scan (ms)"] = 1000 * sum(timings) / len(timings)
+        results[f"{column}: row groups read (%)"] = (
+            100 * sum(row_groups) / len(row_groups) / metadata.num_row_groups
+        )
+
+    return results
+
+
+def pruning_notes(columns):
+    """Explain which filter columns cannot prune row groups.
+
+    Args:
+        columns (list): The columns the file is sorted by, in order.
+
+    Returns:
+        (list): A note for every sort column after the first one.
+    """
+
+    return [
+        PRUNING_NOTE.format(first=columns[0], column=column) for column in columns[1:]
+    ]
+
+
+def main(argv=None):
+    """Rewrite a parquet file and optionally report the layout benchmark.
+
+    Args:
+        argv (list): The command line arguments; defaults to sys.argv.
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("source", help="the parquet file to rewrite")
+    parser.add_argument("-o", "--output", help="the file to write (default: source)")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    parser.add_argument("--compression", default=COMPRESSION)
+    parser.add_argument("--compression-level", type=int)
+    parser.add_argument("--no-dictionary", action="store_false", dest="use_dictionary")
+    parser.add_argument(
+        "--sort-by", nargs="*", default=SORT_BY, help="the columns to sort by"
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="compare filtered scans before and after the rewrite",
+    )
+    args = parser.parse_args(argv)
+    target = args.output or args.source
+
+    with tempfile.TemporaryDirectory(dir=Path(target).parent) as tmp_dir:
+        rewritten = str(Path(tmp_dir) / Path(target).name)
+        relayout(
+            args.source,
+            rewritten,
+            row_group_size=args.row_group_size,
+            compression=args.compression,
+            compression_level=args.compression_level,
+            use_dictionary=args.use_dictionary,
+            sort_by=args.sort_by,
+        )
+        if args.benchmark:
+            probes = benchmark_probes(args.source, args.sort_by)
+            report = pd.DataFrame(
+                {
+                    "before": benchmark(args.source, probes),
+                    "after": benchmark(rewritten, probes),
+                }
+            )
+            print(report.round(1).to_string())
+            for note in pruning_notes(
+                list(dict.fromkeys(column for column, _ in probes))
+            ):
+                print(note)
+        os.replace(rewritten, target)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+# pylint: disable=E0401
+""" Persistent inverted index for ranked search of the statements.
+
+Every text section of a data source (e.g. the "People" section of the unit
+environment statements) gets its own index, built once per version of the
+source and persisted next to the mirrored files:
+
+- the forward index holds the term ids of every record's text, in order,
+  so that the position of a term in a record is its offset in the record,
+- the inverted index holds, for every term, the positions of its
+  occurrences in the forward index, sorted by record and position.
+
+Queries are answered from the postings alone: a term is a slice of the
+postings, a phrase is the postings of its first term whose following
+positions hold the following terms, and the records are ranked with BM25.
+When the source changes, the new index reuses the tokens of every record
+whose text is unchanged, so only the changed records are tokenised again.
+
+Query syntax: words and "quoted phrases" must all occur, OR separates
+alternatives, and NOT or a leading - excludes a word or phrase, e.g.
+
+    "research culture" equality OR diversity -gender
+"""
+import os
+import re
+import hashlib
+import logging
+import tempfile
+
+import numpy as np
+import streamlit as st
+
+import REF2021_explorer.codebook as cb
+import REF2021_explorer.mirror as mr
+import REF2021_explorer.read_write as rw
+
+LOGGER = logging.getLogger(__name__)
+
+SEARCH_DIR = "search"
+INDEX_FORMAT = 1
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOP_K = 50
+
+# indexes kept: the current and the superseded version of every section of
+# the environment statements, so that the superseded versions are evicted
+INDEX_ENTRIES = 2 * len(
+    cb.COLUMNS_INSTITUTION_ENVIRONMENT_STATEMENTS
+    + cb.COLUMNS_UNIT_ENVIRONMENT_STATEMENTS
+)
+
+INDEX_ARRAYS = [
+    "records",
+    "hashes",
+    "tokens",
+    "offsets",
+    "vocabulary",
+    "postings",
+    "posting_records",
+    "term_offsets",
+]
+
+
+def tokenise(text):
+    """Split a text into lower-case word tokens.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        (list): The tokens.
+    """
+
+    return TOKEN_PATTERN.findall(text.lower()) if isinstance(text, str) else []
+
+
+def text_hashes(texts):
+    """Hash the texts of the records, to find the unchanged ones.
+
+    Args:
+        texts (iterable): The texts, None for missing ones.
+
+    Returns:
+        (numpy.ndarray): The 64-bit hashes, as uint64.
+    """
+
+    return np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(
+                    text.encode("utf-8") if isinstance(text, str) else b"",
+                    digest_size=8,
+                ).digest(),
+                "little",
+            )
+            for text in texts
+        ],
+        dtype=np.uint64,
+    )
+
+
+def build_forward(records, texts, previous=None):
+    """Tokenise the texts of the records into a forward index.
+
+    Args:
+        records (numpy.ndarray): The record ids.
+        texts (list): The texts of the records.
+        previous (dict): An index of an earlier version of the texts, whose
+            tokens and vocabulary are reused for the unchanged texts.
+
+    Returns:
+        (dict): The record ids, text hashes, term ids of all the texts
+            (tokens), the offsets of each record in the tokens, and the
+            vocabulary.
+    """
+
+    hashes = text_hashes(texts)
+    term_ids = {}
+    reusable = {}
+    if previous is not None:
+        term_ids = {term: number for number, term in enumerate(previous["vocabulary"])}
+        for text_hash, start, stop in zip(
+            previous["hashes"], previous["offsets"][:-1], previous["offsets"][1:]
+        ):
+            reusable[text_hash] = previous["tokens"][start:stop]
+
+    pieces = []
+    for text, text_hash in zip(texts, hashes):
+        if text_hash in reusable:
+            pieces.append(reusable[text_hash])
+        else:
+            pieces.append(
+                np.array(
+                    [
+                        term_ids.setdefault(token, len(term_ids))
+                        for token in tokenise(text)
+                    ],
+                    dtype=np.int32,
+                )
+            )
+    LOGGER.info(
+        "Tokenised %d of %d texts",
+        sum(text_hash not in reusable for text_hash in hashes),
+        len(hashes),
+    )
+
+    return {
+        "records": np.asarray(records, dtype=np.int64),
+        "hashes": hashes,
+        "tokens": (
+            np.concatenate(pieces).astype(np.int32)
+            if pieces
+            else np.array([], dtype=np.int32)
+        ),
+        "offsets": np.concatenate(
+            [[0], np.cumsum([len(piece) for piece in pieces], dtype=np.int64)]
+        ).astype(np.int64),
+        "vocabulary": np.array(list(term_ids), dtype=str),
+    }
+
+
+def invert(index):
+    """Add the inverted index to a forward index.
+
+    Args:
+        index (dict): The forward index; see build_forward.
+
+    Returns:
+        (dict): The index with the postings (the positions of every term in
+            the tokens, grouped by term), the record number of each posting
+            and the offsets of each term in the postings.
+    """
+
+    postings = np.argsort(index["tokens"], kind="stable")
+    index["postings"] = postings
+    index["posting_records"] = (
+        np.searchsorted(index["offsets"], postings, side="right") - 1
+    ).astype(np.int32)
+    index["term_offsets"] = np.searchsorted(
+        index["tokens"][postings], np.arange(len(index["vocabulary"]) + 1)
+    )
+
+    return prepare(index)
+
+
+def prepare(index):
+    """Add the lookup tables used by the queries to an index.
+
+    Args:
+        index (dict): The index.
+
+    Returns:
+        (dict): The index with the term ids, record lengths and mean length.
+    """
+
+    index["term_ids"] = {
+        term: number for number, term in enumerate(index["vocabulary"])
+    }
+    index["lengths"] = np.diff(index["offsets"])
+    index["mean_length"] = (
+        max(float(index["lengths"].mean()), 1.0) if len(index["lengths"]) else 1.0
+    )
+
+    return index
+
+
+def index_path(page, section, digest):
+    """Get the file name of a persisted index.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        digest (str): The content hash of the data source.
+
+    Returns:
+        (pathlib.Path): The file name.
+    """
+
+    section_key = hashlib.blake2b(section.encode("utf-8"), digest_size=6).hexdigest()
+
+    return mr.CACHE_DIR / SEARCH_DIR / f"{page}-{section_key}-{digest}.npz"
+
+
+def save_index(index, path):
+    """Persist an index atomically.
+
+    Args:
+        index (dict): The index.
+        path (pathlib.Path): The file name.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, suffix=".tmp", delete=False
+    ) as index_file:
+        np.savez(
+            index_file,
+            format=INDEX_FORMAT,
+            **{name: index[name] for name in INDEX_ARRAYS},
+        )
+    os.replace(index_file.name, path)
+
+
+def read_index(path):
+    """Read a persisted index.
+
+    Args:
+        path (pathlib.Path): The file name.
+
+    Returns:
+        (dict): The index, or None if the file is missing or unreadable.
+    """
+
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            if int(arrays["format"]) != INDEX_FORMAT:
+                return None
+            return prepare({name: arrays[name] for name in INDEX_ARRAYS})
+    except (OSError, KeyError, ValueError) as error:
+        LOGGER.warning("Ignoring the search index %s: %s", path, error)
+        return None
+
+
+def previous_index(path):
+    """Read the most recent index of an earlier version of the same section.
+
+    Args:
+        path (pathlib.Path): The file name of the index to build.
+
+    Returns:
+        (dict): The index, or None if there is none.
+    """
+
+    prefix = path.name.rsplit("-", 1)[0]
+    candidates = sorted(
+        path.parent.glob(f"{prefix}-*.npz"),
+        key=lambda candidate: candidate.stat().st_mtime,
+        reverse=True,
+    )
+    for candidate in candidates:
+        if candidate != path:
+            index = read_index(candidate)
+            if index is not None:
+                return index
+
+    return None
+
+
+def remove_superseded(path):
+    """Delete the persisted indexes of the earlier versions of a section.
+
+    Args:
+        path (pathlib.Path): The file name of the current index.
+    """
+
+    prefix = path.name.rsplit("-", 1)[0]
+    for candidate in path.parent.glob(f"{prefix}-*.npz"):
+        if candidate != path:
+            try:
+                candidate.unlink()
+            except OSError as error:
+                LOGGER.warning(
+                    "Cannot delete the search index %s: %s", candidate, error
+                )
+
+
+def get_index(page, section):
+    """Get the search index of a section at the current version of its source.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+
+    Returns:
+        (dict): The index; see build_index.
+    """
+
+    entry = rw.source_entry("data", page)
+
+    return load_index(page, section, entry["path"], entry["version"], entry["hash"])
+
+
+@st.cache_resource(show_spinner=False, max_entries=INDEX_ENTRIES)
+def load_index(page, section, fname, version, digest):  # pylint: disable=W0613
+    """Load a persisted search index, building it if needed.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        fname (str): The local file name or snapshot path of the source.
+        version (str): The manifest version of the source, used as cache key.
+        digest (str): The content hash of the source, naming the index file.
+
+    Returns:
+        (dict): The index; see build_index.
+    """
+
+    return open_index(page, section, fname, digest)
+
+
+def open_index(page, section, fname, digest):
+    """Read a persisted search index, building and persisting it if needed.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        fname (str): The local file name or snapshot path of the source.
+        digest (str): The content hash of the source, naming the index file.
+
+    Returns:
+        (dict): The index; see build_index.
+    """
+
+    path = index_path(page, section, digest)
+    index = read_index(path) if path.exists() else None
+    if index is None:
+        index = build_index(page, section, fname, previous=previous_index(path))
+        save_index(index, path)
+        remove_superseded(path)
+
+    return index
+
+
+def build_index(page, section, fname, previous=None):
+    """Build the search index of a section.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        fname (str): The local file name or snapshot path of the source.
+        previous (dict): An index of an earlier version of the section.
+
+    Returns:
+        (dict): The forward and inverted index; see build_forward and invert.
+    """
+
+    dset = rw.read_data(page, fname, columns=[section])
+
+    return invert(
+        build_forward(dset.index.to_numpy(), dset[section].tolist(), previous)
+    )
+
+
+def parse_query(query):
+    """Parse a query into alternatives of required and excluded clauses.
+
+    Args:
+        query (str): The query; see the module description.
+
+    Returns:
+        (list): The alternatives, each a list of (excluded, terms) clauses,
+            where terms is a tuple of one word or of the words of a phrase.
+    """
+
+    alternatives = [[]]
+    exclude = False
+    for match in QUERY_PATTERN.finditer(query):
+        minus, phrase, word = match.groups()
+        if word in ["OR", "AND", "NOT"]:
+            if word == "OR" and alternatives[-1]:
+                alternatives.append([])
+            exclude = word == "NOT"
+            continue
+        if phrase is None and word.startswith("-") and len(word) > 1:
+            minus, word = "-", word[1:]
+        terms = tuple(tokenise(word if phrase is None else phrase))
+        if terms:
+            alternatives[-1].append((exclude or minus == "-", terms))
+        exclude = False
+
+    return [clauses for clauses in alternatives if clauses]
+
+
+def match_terms(index, terms):
+    """Find the records containing a word or phrase.
+
+    Args:
+        index (dict): The index.
+        terms (tuple): The words, in order.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): The record numbers, in order, and
+            the number of occurrences in each.
+    """
+
+    term_ids = [index["term_ids"].get(term) for term in terms]
+    if None in term_ids:
+        return np.array([], dtype=np.int32), np.array([], dtype=np.int64)
+    start, stop = (
+        index["term_offsets"][term_ids[0]],
+        index["term_offsets"][term_ids[0] + 1],
+    )
+    positions = index["postings"][start:stop]
+    records = index["posting_records"][start:stop]
+    found = np.ones(len(positions), dtype=bool)
+    record_ends = index["offsets"][records + 1]
+    for shift, term_id in enumerate(term_ids[1:], start=1):
+        following = positions + shift
+        found &= following < record_ends
+        found[found] = index["tokens"][following[found]] == term_id
+
+    return np.unique(records[found], return_counts=True)
+
+
+def bm25(index, records, counts):
+    """Score the records containing a word or phrase with BM25.
+
+    Args:
+        index (dict): The index.
+        records (numpy.ndarray): The record numbers.
+        counts (numpy.ndarray): The number of occurrences in each record.
+
+    Returns:
+        (numpy.ndarray): The scores.
+    """
+
+    total = len(index["records"])
+    idf = np.log(1 + (total - len(records) + 0.5) / (len(records) + 0.5))
+    norm = 1 - BM25_B + BM25_B * index["lengths"][records] / index["mean_length"]
+
+    return idf * counts * (BM25_K1 + 1) / (counts + BM25_K1 * norm)
+
+
+def match_clauses(index, clauses, scores):
+    """Find the records matching all the clauses of an alternative.
+
+    Args:
+        index (dict): The index.
+        clauses (list): The (excluded, terms) clauses; see parse_query.
+        scores (numpy.ndarray): The score of every record, to which the
+            scores of the required clauses are added.
+
+    Returns:
+        (numpy.ndarray): Whether each record matches.
+    """
+
+    total = len(index["records"])
+    included = np.ones(total, dtype=bool)
+    excluded = np.zeros(total, dtype=bool)
+    for exclude, terms in clauses:
+        found, counts = match_terms(index, terms)
+        mask = np.zeros(total, dtype=bool)
+        mask[found] = True
+        if exclude:
+            excluded |= mask
+        else:
+            included &= mask
+            scores[found] += bm25(index, found, counts)
+
+    return included & ~excluded
+
+
+def search(index, query, records=None, k=TOP_K):
+    """Find the records best matching a query.
+
+    Args:
+        index (dict): The index.
+        query (str): The query; see the module description.
+        records (array-like): The record ids to search in; defaults to all.
+        k (int): The number of records to return.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray, int): The ids of the best k records
+            and their scores, best first, and the number of records matching.
+    """
+
+    total = len(index["records"])
+    matched = np.zeros(total, dtype=bool)
+    scores = np.zeros(total, dtype=np.float64)
+    for clauses in parse_query(query):
+        matched |= match_clauses(index, clauses, scores)
+    if records is not None:
+        matched &= np.isin(index["records"], np.asarray(records))
+
+    found = np.flatnonzero(matched)
+    best = found[np.lexsort((found, -scores[found]))][:k]
+
+    return index["records"][best], scores[best], len(found)
@@ -0,0 +1,41 @@
+# pylint: disable=E0401
+""" Launch the app, warming up the caches as soon as the server starts.
+
+Use instead of `streamlit run src/REF2021_explorer/Home.py`, with the same
+options, e.g.
+
+    REF2021_WARMUP=1 python -m REF2021_explorer.serve --server.port=8501
+"""
+import sys
+import time
+import threading
+from pathlib import Path
+
+from streamlit import runtime
+from streamlit.web import cli
+
+import REF2021_explorer.warmup as wu
+
+HOME = str(Path(__file__).parent / "Home.py")
+RUNTIME_POLL_INTERVAL = 0.1
+
+
+def warm_up_when_ready():
+    """Wait for the Streamlit runtime to exist, then start the warm-up."""
+
+    while not runtime.exists():
+        time.sleep(RUNTIME_POLL_INTERVAL)
+    wu.start()
+
+
+def main():
+    """Run the Streamlit server."""
+
+    if wu.WARMUP:
+        threading.Thread(target=warm_up_when_ready, daemon=True).start()
+    sys.argv = ["streamlit", "run", HOME, *sys.argv[1:]]
+    sys.exit(cli.main())  # pylint: disable=E1120
+
+
+if __name__ == "__main__":
+    main()
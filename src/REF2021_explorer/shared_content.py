@@ -2,6 +2,7 @@
 """ Shared text for the app. """
 import streamlit as st
 import REF2021_explorer.read_write as rw
+import REF2021_explorer.warmup as wu
 
 # settings
 LAYOUT = "wide"
@@ -20,6 +21,7 @@ PAGE_TITLES = {
     "unit_env_statements": "Unit Environment Statements",
     "results": "Results",
     "results_chat": "Results Chat",
+    "search": "Search All Texts",
 }
 
 
@@ -91,11 +93,17 @@ MENU_ITEMS = {
 
 # feedback
 PROC_TEXT = "Processing request..."
+WARMUP_TEXT = "Loading data sets ({done}/{total})..."
+STREAMING_TEXT = "Loading the data set, showing the records read so far..."
 
 # labels
 RECORDS_LABEL = "Records"
 INSTITUTIONS_LABEL = "Institutions"
 HITS_LABEL = "Number of search hits"
+SCORE_LABEL = "Score"
+DOWNLOAD_CSV_LABEL = "Download as CSV"
+SOURCE_LABEL = "Source"
+SECTION_LABEL = "Section"
 CATEGORY_LABEL_SINGULAR = "level"
 CATEGORY_LABEL_PLURAL = "levels"
 OBJECT_LABEL = "string"
@@ -107,6 +115,7 @@ DISTRIBUTION_SELECT_PROMPT_1 = "Select the first categorical field to plot"
 DISTRIBUTION_SELECT_PROMPT_2 = "Select the second categorical field to plot"
 GROUPED_DISTRIBUTION_SELECT_PROMPT = "Select columns to plot"
 BIN_NUMBER_PROMPT = "Select number of bins"
+BIN_METHOD_PROMPT = "Select the bins"
 SELECT_STATS_PROMPT = "Select what to plot"
 SELECT_DATA_RANGE_PROMPT = "Select data range"
 EXCLUDE_NEGATIVE_PROMPT = "Exclude negative values"
@@ -121,7 +130,42 @@ SELECT_INSTITUTION_PLACEHOLDER = (
 )
 SELECT_SECTION_PROMPT = "Select the section to search in"
 SEARCH_TERM_PROMPT = "Search term(s)"
+SEARCH_SYNTAX_TEXT = (
+    'All the words and "quoted phrases" must occur; use OR for alternatives '
+    "and NOT or a leading - to exclude a word or phrase."
+)
+EXACT_SEARCH_PROMPT = "Match the exact text, including parts of words"
+SEARCH_RESULTS_TEXT = "Showing the {shown} best matching of {total} records."
+SEARCH_FIRST_RESULTS_TEXT = "Showing the first {shown} of {total} matching records."
+SHOW_SECTION_PROMPT = "Show the whole section of"
+SEARCH_ALL_TEXT = (
+    "Searches every section of the institution and unit environment "
+    "statements and of the impact case studies at once, and shows the best "
+    "matching sections first."
+)
+SEARCH_FAILED_WARNING = "Some sections could not be searched: {sections}"
+BATCH_TERMS_PROMPT = "Terms to count, one per line"
+BATCH_UPLOAD_PROMPT = "Or upload a text file of terms, one per line"
+BATCH_SEARCH_TEXT = (
+    "Counts the occurrences of every term in the selected section, ignoring "
+    "case and including parts of words, by institution."
+)
 SELECT_UOA_PROMPT = "Select the unit of assessment"
+LOGS_SEARCH_PROMPT = "Show only the lines containing"
+LOGS_PAGE_PROMPT = "Page"
+LOGS_FROM_END_PROMPT = "Start from the end"
+FILTER_COLUMNS_PROMPT = "Filter dataframe on"
+FILTER_VALUES_PROMPT = "Values for {column}"
+FILTER_PATTERN_PROMPT = "Pattern in {column}"
+# the choice of the rows missing a value in the filters of levels and values
+MISSING_VALUE_LABEL = "(missing)"
+PLANNED_TEXT = (
+    "This dataset is too large to load, so it is filtered and summarised "
+    "where it is stored."
+)
+PLANNED_ROWS_TEXT = "Showing the first {shown} of {total} records."
+LOGS_LINES_TEXT = "Lines {start}-{stop} of {total}"
+LOGS_HITS_TEXT = "Matching lines {start}-{stop} of {total}"
 
 
 # headers
@@ -131,6 +175,7 @@ DESCRIBE_HEADER = f"{HEADER_STYLE} :card_index_dividers: View the fields descrip
 LOGS_HEADER = f"{HEADER_STYLE} :spiral_note_pad: View the processing logs"
 VISUALISE_HEADER = f"{HEADER_STYLE} :bar_chart: Visualise data "
 EXPLORE_HEADER = f"{HEADER_STYLE} :flashlight: Select, explore and visualise data"
+BATCH_SEARCH_HEADER = f"{HEADER_STYLE} :abacus: Count many terms at once"
 BROWSE_STATEMENTS_HEADER = (
     f"{HEADER_STYLE} :bookmark_tabs: Browse the submitted statements"
 )
@@ -181,6 +226,9 @@ CLEAR_CHAT_BUTTON = "Clear chat history"
 # warnings
 NO_SELECTED_RECORDS_WARNING = "No records match the selection"
 NOT_SUITABLE_FOR_HISTOGRAM_WARNING = "The data is not suitable for a histogram"
+NOT_SUITABLE_FOR_LOG_BINS_WARNING = (
+    "Only the positive values can be shown with log bins"
+)
 PREFIX_WARNING = "Warning: "
 
 # descriptions
@@ -214,7 +262,7 @@ OPENAI_KEY_ERROR = "OpenAI authentication failed, try setting another key"
 CHAT_PROMPT = f"""
 
 You are a research assistant for the Research Excellence Framework 2021. Data
-is stored in parquet format within the '{rw.CHAT_DB}' table. You must respond to questions
+is stored within the "{rw.CHAT_TABLE}" table. You must respond to questions
 with a valid SQL query. Do not return any natural language explanation, only
 the SQL query. Ensure that columns with spaces are quoted in the query.
 
@@ -250,12 +298,14 @@ You can ask questions such as:
 
 
 def page_config(page):
-    """Set the page configuration.
+    """Set the page configuration and start the cache warm-up if enabled.
 
     Args:
         page (str): The page name.
     """
 
+    if wu.WARMUP:
+        wu.start()
     st.set_page_config(
         page_title=PAGE_TITLES[page],
         layout=LAYOUT,
@@ -278,16 +328,26 @@ def sidebar_content(path):
             st.warning(WARNING_TEXT, icon="⚠️")
             if path == "home":
                 st.markdown(SIDEBAR_HOME_PROMPT)
+                (done, total) = wu.progress()
+                if done < total:
+                    st.progress(
+                        done / total, text=WARMUP_TEXT.format(done=done, total=total)
+                    )
 
 
-def prepare_page(page):
+def prepare_page(page, preview=None, plan=False):
     """Prepare the page.
 
     Args:
         page (str): The page name.
+        preview (callable): Displays the data while it streams in the first
+            time it is loaded; see read_write.get_dataframes.
+        plan (bool): Whether the page can explore its data source with SQL
+            instead of loading it, if the source is too large to load; see
+            read_write.is_planned.
 
     Returns:
-        tuple: The data set and logs.
+        tuple: The data set, or None if it is too large to load, and logs.
     """
 
     page_config(page)
@@ -297,8 +357,14 @@ def prepare_page(page):
     if page == "home":
         dset = None
         logs = None
+    elif plan and rw.is_planned(page):
+        dset = None
+        logs = rw.get_logs(page)
     else:
-        (dset, logs) = rw.get_dataframes(page)
+        placeholder = st.empty()
+        with placeholder.container():
+            (dset, logs) = rw.get_dataframes(page, preview=preview)
+        placeholder.empty()
 
     return (dset, logs)
 
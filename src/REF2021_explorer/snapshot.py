@@ -0,0 +1,436 @@
+# pylint: disable=E0401
+""" Single-file snapshot of every data source, log and derived table.
+
+The snapshot is one file holding the data sources as uncompressed Arrow IPC
+files, the processing logs as raw bytes and the derived tables (e.g. the
+catalogs) as JSON, followed by an index of its contents. The file is memory
+mapped, so opening a source is constant time and needs no network access.
+
+    [MAGIC] [item] [item] ... [index JSON] [index length] [MAGIC]
+
+Items are addressed by keys "<kind>/<page>", e.g. "data/results",
+"logs/results" or "catalog/results", and their local paths are the key
+prefixed with PATH_PREFIX, so they can be used as cache keys like file names.
+
+Build a snapshot of the current files with:
+
+    python -m REF2021_explorer.snapshot snapshot.arrows
+
+and serve it by setting REF2021_SNAPSHOT to its path. The build fails if a
+file cannot be fetched, unless --allow-missing is passed.
+"""
+import os
+import sys
+import json
+import struct
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+LOGGER = logging.getLogger(__name__)
+
+DESCRIPTION = "Pack the data sources, logs and catalogs into one snapshot file."
+
+# settings
+SNAPSHOT_LOCATION = os.environ.get("REF2021_SNAPSHOT")
+
+MAGIC = b"REF2021SNAPSHOT1"
+LENGTH_FORMAT = "<Q"
+ALIGNMENT = 64
+SNAPSHOT_FORMAT = 1
+PATH_PREFIX = "snapshot:"
+
+_bundles = []
+_lock = threading.Lock()
+
+
+def open_bundle():
+    """Memory-map the configured snapshot once per process.
+
+    Returns:
+        (dict): The buffer over the memory-mapped file and its index, or
+            None if no snapshot is configured.
+    """
+
+    if not SNAPSHOT_LOCATION:
+        return None
+    with _lock:
+        if not _bundles:
+            _bundles.append(read_bundle(SNAPSHOT_LOCATION))
+            LOGGER.info(
+                "Opened snapshot %s with %d items",
+                SNAPSHOT_LOCATION,
+                len(_bundles[0]["index"]["items"]),
+            )
+
+    return _bundles[0]
+
+
+def read_bundle(fname):
+    """Memory-map a snapshot and read its index.
+
+    Args:
+        fname (str): The snapshot file name.
+
+    Returns:
+        (dict): The buffer over the memory-mapped file and its index.
+    """
+
+    # one zero-copy buffer over the whole file, sliced without locking
+    data = pa.memory_map(str(fname)).read_buffer()
+    trailer = len(MAGIC) + struct.calcsize(LENGTH_FORMAT)
+    if (
+        data.size < len(MAGIC) + trailer
+        or data[: len(MAGIC)].to_pybytes() != MAGIC
+        or data[-len(MAGIC) :].to_pybytes() != MAGIC
+    ):
+        raise ValueError(f"{fname} is not a snapshot")
+    (index_length,) = struct.unpack(
+        LENGTH_FORMAT, data[-trailer : -len(MAGIC)].to_pybytes()
+    )
+    index = json.loads(
+        data[-trailer - index_length : -trailer].to_pybytes().decode("utf-8")
+    )
+    if index.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{fname} has an unsupported snapshot format")
+
+    return {"buffer": data, "index": index}
+
+
+def contains(key):
+    """Check whether the configured snapshot holds an item.
+
+    Args:
+        key (str): The item key, e.g. "data/results".
+
+    Returns:
+        (bool): True if a snapshot is configured and holds the item.
+    """
+
+    bundle = open_bundle()
+
+    return bundle is not None and key in bundle["index"]["items"]
+
+
+def entry(key):
+    """Get the manifest entry of a snapshot item.
+
+    Args:
+        key (str): The item key.
+
+    Returns:
+        (dict): The name, size, hash and version of the file the item was
+            built from, and the snapshot path of the item.
+    """
+
+    item = open_bundle()["index"]["items"][key]
+
+    return {
+        "name": item["name"],
+        "size": item["size"],
+        "hash": item["hash"],
+        "version": item["version"],
+        "path": f"{PATH_PREFIX}{key}",
+    }
+
+
+def is_snapshot_path(fname):
+    """Check whether a local path points into the snapshot.
+
+    Args:
+        fname (str): The local path.
+
+    Returns:
+        (bool): True for snapshot paths.
+    """
+
+    return str(fname).startswith(PATH_PREFIX)
+
+
+def read_buffer(fname):
+    """Get the bytes of a snapshot item without copying them.
+
+    Args:
+        fname (str): The snapshot path of the item.
+
+    Returns:
+        (pyarrow.Buffer): The bytes of the item.
+    """
+
+    bundle = open_bundle()
+    item = bundle["index"]["items"][fname[len(PATH_PREFIX) :]]
+
+    return bundle["buffer"].slice(item["offset"], item["length"])
+
+
+def read_table(fname):
+    """Get a data source from the snapshot without copying it.
+
+    Args:
+        fname (str): The snapshot path of the item.
+
+    Returns:
+        (pyarrow.Table): The data.
+    """
+
+    return pa.ipc.open_file(read_buffer(fname)).read_all()
+
+
+def read_json(fname):
+    """Get a derived table stored as JSON from the snapshot.
+
+    Args:
+        fname (str): The snapshot path of the item.
+
+    Returns:
+        (object): The decoded JSON.
+    """
+
+    return json.loads(read_buffer(fname).to_pybytes().decode("utf-8"))
+
+
+def serialise(payload):
+    """Serialise a snapshot item that is not a table.
+
+    Args:
+        payload (bytes or object): Raw bytes, or any other object, stored
+            as JSON.
+
+    Returns:
+        (str, bytes): The kind of the item and its bytes.
+    """
+
+    if isinstance(payload, bytes):
+        return "bytes", payload
+
+    return "json", json.dumps(payload).encode("utf-8")
+
+
+def write_table(sink, payload):
+    """Write a table to a snapshot as an Arrow IPC file, batch by batch.
+
+    Args:
+        sink (file): The snapshot file, positioned at the item.
+        payload (pyarrow.Table or pyarrow.RecordBatchReader): The table, or
+            its batches, which are written as they are read.
+    """
+
+    with pa.ipc.new_file(sink, payload.schema) as writer:
+        if isinstance(payload, pa.Table):
+            writer.write_table(payload)
+        else:
+            for batch in payload:
+                writer.write_batch(batch)
+
+
+def encoded_batches(fname, strings, batch_size):
+    """Read a parquet file batch by batch with one dictionary per categorical.
+
+    The levels of every categorical column are collected in a first pass
+    over those columns, so that all the batches share their dictionaries,
+    as an Arrow IPC file requires: the dictionary columns keep their levels
+    in the order to_pandas unifies them, and the categoricals stored as
+    plain strings get their sorted values, as with
+    read_write.encode_categoricals.
+
+    Args:
+        fname (str): The parquet file name.
+        strings (list): The categorical columns stored as plain strings;
+            see read_write.categorical_columns.
+        batch_size (int): The number of rows per batch.
+
+    Returns:
+        (pyarrow.RecordBatchReader): The batches.
+    """
+
+    pfile = pq.ParquetFile(fname)
+    columns = [
+        field.name
+        for field in pfile.schema_arrow
+        if pa.types.is_dictionary(field.type) or field.name in strings
+    ]
+    levels = {}
+    if columns:
+        for batch in pfile.iter_batches(batch_size, columns=columns):
+            for column in columns:
+                values = batch[column]
+                values = (
+                    values.dictionary
+                    if pa.types.is_dictionary(values.type)
+                    else pc.unique(values.drop_null())
+                )
+                if column in levels:
+                    values = pa.concat_arrays([levels[column], values])
+                levels[column] = pc.unique(values)
+    for column in strings:
+        if column in levels:
+            levels[column] = levels[column].take(pc.array_sort_indices(levels[column]))
+    schema = pfile.schema_arrow
+    for column, column_levels in levels.items():
+        index = schema.get_field_index(column)
+        schema = schema.set(
+            index,
+            schema.field(index).with_type(
+                pa.dictionary(pa.int32(), column_levels.type)
+            ),
+        )
+
+    return pa.RecordBatchReader.from_batches(
+        schema,
+        (
+            encode_batch(batch, schema, levels)
+            for batch in pfile.iter_batches(batch_size)
+        ),
+    )
+
+
+def encode_batch(batch, schema, levels):
+    """Dictionary-encode the categorical columns of a batch with given levels.
+
+    Args:
+        batch (pyarrow.RecordBatch): The batch.
+        schema (pyarrow.Schema): The schema of the encoded batch.
+        levels (dict): The levels of the categorical columns, keyed by column.
+
+    Returns:
+        (pyarrow.RecordBatch): The encoded batch.
+    """
+
+    arrays = batch.columns
+    for column, column_levels in levels.items():
+        index = batch.schema.get_field_index(column)
+        values = arrays[index]
+        if pa.types.is_dictionary(values.type):
+            values = values.dictionary_decode()
+        arrays[index] = pa.DictionaryArray.from_arrays(
+            pc.index_in(values, value_set=column_levels), column_levels
+        )
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_bundle(target, items):
+    """Write a snapshot.
+
+    Args:
+        target (str): The snapshot file name.
+        items (dict): The (manifest entry, payload) tuples keyed by item
+            key; see entry, write_table and serialise.
+    """
+
+    index = {"format": SNAPSHOT_FORMAT, "items": {}}
+    with tempfile.NamedTemporaryFile(
+        dir=Path(target).parent, suffix=".tmp", delete=False
+    ) as bundle_file:
+        try:
+            bundle_file.write(MAGIC)
+            for key, (source_entry, payload) in items.items():
+                # align the items so that memory-mapped Arrow buffers are aligned
+                bundle_file.write(b"\0" * (-bundle_file.tell() % ALIGNMENT))
+                offset = bundle_file.tell()
+                if isinstance(payload, (pa.Table, pa.RecordBatchReader)):
+                    kind = "table"
+                    write_table(bundle_file, payload)
+                else:
+                    kind, data = serialise(payload)
+                    bundle_file.write(data)
+                index["items"][key] = {
+                    "kind": kind,
+                    "offset": offset,
+                    "length": bundle_file.tell() - offset,
+                    **{
+                        field: source_entry[field]
+                        for field in ["name", "size", "hash", "version"]
+                    },
+                }
+            index_data = json.dumps(index, indent=2).encode("utf-8")
+            bundle_file.write(index_data)
+            bundle_file.write(struct.pack(LENGTH_FORMAT, len(index_data)))
+            bundle_file.write(MAGIC)
+        except BaseException:
+            bundle_file.close()
+            os.unlink(bundle_file.name)
+            raise
+    os.replace(bundle_file.name, target)
+
+
+def build(target, pages=None, allow_missing=False):
+    """Build a snapshot of the current data sources, logs and catalogs.
+
+    The data sources are streamed into the snapshot batch by batch, so they
+    are never held in memory as a whole.
+
+    Args:
+        target (str): The snapshot file name.
+        pages (list): The pages to include; defaults to every page in
+            read_write.sources.
+        allow_missing (bool): Whether to skip the pages whose files cannot
+            be fetched, with a warning, instead of failing.
+
+    Raises:
+        OSError: If a file cannot be fetched and allow_missing is False.
+        ValueError: If a file cannot be fetched and allow_missing is False.
+    """
+
+    # pylint: disable=C0415
+    import REF2021_explorer.manifest as mf
+    import REF2021_explorer.metadata as md
+    import REF2021_explorer.read_write as rw
+
+    items = {}
+    for page in pages or rw.sources["data"]:
+        try:
+            data_entry = mf.current(rw.sources["data"][page])
+            logs_entry = mf.current(rw.sources["logs"][page])
+        except (OSError, ValueError) as error:
+            if not allow_missing:
+                raise
+            LOGGER.warning("Skipping %s: %s", page, error)
+            continue
+        batches = encoded_batches(
+            data_entry["path"],
+            rw.categorical_columns(data_entry["path"]),
+            rw.BATCH_SIZE,
+        )
+        items[f"data/{page}"] = (data_entry, batches)
+        items[f"catalog/{page}"] = (data_entry, md.build_catalog(data_entry["path"]))
+        with open(logs_entry["path"], "rb") as logs_file:
+            items[f"logs/{page}"] = (logs_entry, logs_file.read())
+        LOGGER.info("Added %s version %s", page, data_entry["version"])
+
+    write_bundle(target, items)
+
+
+def main(argv=None):
+    """Build a snapshot, exiting with an error if a source is missing.
+
+    Args:
+        argv (list): The command line arguments; defaults to sys.argv.
+    """
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "target", nargs="?", default="snapshot.arrows", help="the snapshot to write"
+    )
+    parser.add_argument(
+        "--allow-missing",
+        action="store_true",
+        help="skip the pages whose files cannot be fetched instead of failing",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        build(args.target, allow_missing=args.allow_missing)
+    except (OSError, ValueError) as error:
+        sys.exit(f"Cannot build the snapshot: {error}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,182 @@
+# pylint: disable=E0401
+""" Keyword-in-context snippets of the statement search hits.
+
+Rather than sending the whole section of every hit to the browser, the
+search results show a few bounded snippets of text around the matches,
+cut on the server: the matches are found with a regular expression built
+from the search (see word_pattern and text_pattern), and the snippets hold
+at most MAX_SNIPPETS matches with SNIPPET_CONTEXT characters either side,
+merged when they overlap. The offsets of the matches in the snippet are
+kept, so that they can be highlighted.
+"""
+import re
+
+import REF2021_explorer.search_index as si
+
+SNIPPET_CONTEXT = 80
+MAX_SNIPPETS = 3
+ELLIPSIS = "…"
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+MARKDOWN_PATTERN = re.compile(r"([\\`*_{}\[\]()#+\-.!<>|~$:])")
+
+# the ILIKE wildcards as regular expressions
+WILDCARD_PATTERNS = {"%": ".*?", "_": "."}
+
+
+def word_pattern(query):
+    """Build the regular expression matching the words and phrases of a search.
+
+    Args:
+        query (str): The search query; see search_index.parse_query.
+
+    Returns:
+        (re.Pattern): The pattern matching any required word or phrase as
+            whole words, ignoring case, or None if there are none.
+    """
+
+    phrases = {
+        r"\W+".join(re.escape(term) for term in terms)
+        for clauses in si.parse_query(query)
+        for exclude, terms in clauses
+        if not exclude
+    }
+    if not phrases:
+        return None
+    alternatives = "|".join(sorted(phrases, key=len, reverse=True))
+
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+
+
+def text_pattern(term):
+    """Build the regular expression matching a term as `ILIKE '%term%'` does.
+
+    Args:
+        term (str): The term, possibly with ILIKE wildcards.
+
+    Returns:
+        (re.Pattern): The pattern, ignoring case.
+    """
+
+    return re.compile(
+        "".join(WILDCARD_PATTERNS.get(char, re.escape(char)) for char in term),
+        re.IGNORECASE | re.DOTALL,
+    )
+
+
+def find_matches(text, pattern, max_matches):
+    """Find the first non-empty matches of a pattern in a text.
+
+    Args:
+        text (str): The text.
+        pattern (re.Pattern): The pattern.
+        max_matches (int): The number of matches to find.
+
+    Returns:
+        (list): The (start, stop) offsets of the matches.
+    """
+
+    matches = []
+    for match in pattern.finditer(text):
+        if match.end() > match.start():
+            matches.append(match.span())
+        if len(matches) == max_matches:
+            break
+
+    return matches
+
+
+def match_windows(matches, context):
+    """Group the matches into windows of text, merging the overlapping ones.
+
+    Args:
+        matches (list): The (start, stop) offsets of the matches, in order.
+        context (int): The number of characters to keep either side of a match.
+
+    Returns:
+        (list): The [start, stop, matches] of every window.
+    """
+
+    windows = []
+    for start, stop in matches:
+        window_start, window_stop = max(start - context, 0), stop + context
+        if windows and window_start <= windows[-1][1]:
+            windows[-1][1] = window_stop
+            windows[-1][2].append((start, stop))
+        else:
+            windows.append([window_start, window_stop, [(start, stop)]])
+
+    return windows
+
+
+def snippet(text, pattern, context=SNIPPET_CONTEXT, max_snippets=MAX_SNIPPETS):
+    """Cut the snippets of a text around the matches of a pattern.
+
+    Args:
+        text (str): The text.
+        pattern (re.Pattern): The pattern; see word_pattern and text_pattern.
+        context (int): The number of characters to keep either side of a match.
+        max_snippets (int): The number of matches to keep.
+
+    Returns:
+        (str, list): The snippets joined by ellipses, with their whitespace
+            collapsed, and the (start, stop) offsets of the matches in it.
+    """
+
+    if not isinstance(text, str) or pattern is None:
+        return "", []
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    matches = find_matches(text, pattern, max_snippets)
+    if not matches:
+        return text[: 2 * context] + (ELLIPSIS if len(text) > 2 * context else ""), []
+
+    windows = match_windows(matches, context)
+    parts = []
+    highlights = []
+    length = 0
+    for window_start, window_stop, spans in windows:
+        prefix = ELLIPSIS if window_start > 0 else ""
+        part = prefix + text[window_start:window_stop]
+        offset = length + len(prefix) - window_start
+        highlights.extend((start + offset, stop + offset) for start, stop in spans)
+        parts.append(part)
+        length += len(part)
+    if windows[-1][1] < len(text):
+        parts.append(ELLIPSIS)
+
+    return "".join(parts), highlights
+
+
+def escape_markdown(text):
+    """Escape the characters of a text that markdown would interpret.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        (str): The escaped text.
+    """
+
+    return MARKDOWN_PATTERN.sub(r"\\\1", text)
+
+
+def highlight_markdown(text, highlights):
+    """Format a snippet as markdown, with its matches in bold.
+
+    Args:
+        text (str): The snippet.
+        highlights (list): The (start, stop) offsets of the matches.
+
+    Returns:
+        (str): The markdown.
+    """
+
+    parts = []
+    position = 0
+    for start, stop in highlights:
+        parts.append(escape_markdown(text[position:start]))
+        parts.append(f"**{escape_markdown(text[start:stop])}**")
+        position = stop
+    parts.append(escape_markdown(text[position:]))
+
+    return "".join(parts)
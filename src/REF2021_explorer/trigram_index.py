@@ -0,0 +1,208 @@
+# pylint: disable=E0401
+""" Trigram index for exact substring search of the statements.
+
+The ranked search of search_index matches whole words, but a search for
+part of a word or an acronym inside a longer token needs the substring
+semantics of `"section" ILIKE '%term%'`. To answer it without scanning the
+whole text column, every text section of a data source gets an index of
+the records containing each case-folded trigram (three consecutive
+characters), built once per version of the source and kept in memory:
+
+- the candidate records of a term are those containing all its trigrams,
+  found by intersecting their postings, rarest first,
+- the candidates are then checked for the term itself, so the hits are
+  exactly those of ILIKE, in the order of the source.
+
+Terms shorter than a trigram are checked against every record, and terms
+holding the ILIKE wildcards % and _ or characters outside ASCII, which
+DuckDB may case-fold differently from Python, are left to DuckDB.
+"""
+from collections import defaultdict
+
+import numpy as np
+import streamlit as st
+
+import REF2021_explorer.codebook as cb
+import REF2021_explorer.database as db
+import REF2021_explorer.read_write as rw
+
+TRIGRAM_LENGTH = 3
+WILDCARDS = ["%", "_"]
+# indexes kept: the current and the superseded version of every section of
+# the environment statements, so that the superseded versions are evicted
+INDEX_ENTRIES = 2 * len(
+    cb.COLUMNS_INSTITUTION_ENVIRONMENT_STATEMENTS
+    + cb.COLUMNS_UNIT_ENVIRONMENT_STATEMENTS
+)
+
+
+def fold(text):
+    """Case-fold a text as ILIKE compares it to an ASCII term.
+
+    DuckDB lowers every character on its own, so the dotted capital I is
+    lowered to a plain "i" rather than to "i" and a combining dot as by
+    str.lower.
+
+    Args:
+        text (str): The text, or None.
+
+    Returns:
+        (str): The lower-case text, empty for missing ones.
+    """
+
+    return text.replace("\u0130", "i").lower() if isinstance(text, str) else ""
+
+
+def trigrams(text):
+    """Get the distinct trigrams of a case-folded text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        (set): The trigrams.
+    """
+
+    return {
+        text[position : position + TRIGRAM_LENGTH]
+        for position in range(len(text) - TRIGRAM_LENGTH + 1)
+    }
+
+
+def build_index(records, texts):
+    """Build the trigram index of the texts of some records.
+
+    Args:
+        records (numpy.ndarray): The record ids.
+        texts (list): The texts of the records.
+
+    Returns:
+        (dict): The record ids, the case-folded texts and the postings, the
+            record numbers containing each trigram in ascending order.
+    """
+
+    texts = [fold(text) for text in texts]
+    postings = defaultdict(list)
+    for number, text in enumerate(texts):
+        for trigram in trigrams(text):
+            postings[trigram].append(number)
+
+    return {
+        "records": np.asarray(records, dtype=np.int64),
+        "texts": texts,
+        "postings": {
+            trigram: np.array(numbers, dtype=np.int32)
+            for trigram, numbers in postings.items()
+        },
+    }
+
+
+def get_index(page, section):
+    """Get the trigram index of a section at the current version of its source.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+
+    Returns:
+        (dict): The index; see build_index.
+    """
+
+    entry = rw.source_entry("data", page)
+
+    return load_index(page, section, entry["path"], entry["version"])
+
+
+@st.cache_resource(show_spinner=False, max_entries=INDEX_ENTRIES)
+def load_index(page, section, fname, version):  # pylint: disable=W0613
+    """Build the trigram index of a section into a cache shared by every session.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        fname (str): The local file name or snapshot path of the source.
+        version (str): The manifest version of the source, used as cache key.
+
+    Returns:
+        (dict): The index; see build_index.
+    """
+
+    dset = rw.read_data(page, fname, columns=[section])
+
+    return build_index(dset.index.to_numpy(), dset[section].tolist())
+
+
+def candidates(index, term):
+    """Find the records containing all the trigrams of a case-folded term.
+
+    Args:
+        index (dict): The index.
+        term (str): The case-folded term.
+
+    Returns:
+        (numpy.ndarray): The record numbers, in ascending order.
+    """
+
+    if len(term) < TRIGRAM_LENGTH:
+        return np.arange(len(index["records"]), dtype=np.int32)
+    postings = []
+    for trigram in trigrams(term):
+        if trigram not in index["postings"]:
+            return np.array([], dtype=np.int32)
+        postings.append(index["postings"][trigram])
+    postings.sort(key=len)
+    found = postings[0]
+    for numbers in postings[1:]:
+        if len(found) == 0:
+            break
+        found = np.intersect1d(found, numbers, assume_unique=True)
+
+    return found
+
+
+def search(index, term, records=None):
+    """Find the records whose text contains a term, ignoring case.
+
+    Args:
+        index (dict): The index.
+        term (str): The ASCII term, without ILIKE wildcards.
+        records (array-like): The record ids to search in; defaults to all.
+
+    Returns:
+        (numpy.ndarray): The ids of the matching records, in source order.
+    """
+
+    term = fold(term)
+    found = candidates(index, term)
+    if records is not None:
+        found = found[np.isin(index["records"][found], np.asarray(records))]
+    found = [number for number in found if term in index["texts"][number]]
+
+    return index["records"][np.array(found, dtype=np.int64)]
+
+
+def query(page, section, term, records=None):
+    """Find the records whose section matches `ILIKE '%term%'`.
+
+    The trigram index answers the ASCII terms without wildcards and DuckDB
+    the others.
+
+    Args:
+        page (str): The page of the data source.
+        section (str): The text column.
+        term (str): The term.
+        records (array-like): The record ids to search in; defaults to all.
+
+    Returns:
+        (numpy.ndarray): The ids of the matching records, in source order.
+    """
+
+    if term.isascii() and not any(wildcard in term for wildcard in WILDCARDS):
+        return search(get_index(page, section), term, records)
+    sql_stmt = f'SELECT "Record" FROM "{page}" WHERE "{section}" ILIKE ?'
+    params = [f"%{term}%"]
+    if records is not None:
+        sql_stmt += ' AND "Record" IN (SELECT UNNEST(?))'
+        params.append(np.asarray(records).tolist())
+
+    return db.query(sql_stmt, params).df()["Record"].to_numpy(dtype=np.int64)
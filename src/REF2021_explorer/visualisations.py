@@ -1,17 +1,29 @@
 # pylint: disable=E0401
+# pylint: disable=C0302
 """ Visualisation functions. """
 import importlib
 import numpy as np
 import pandas as pd
 import streamlit as st
 from streamlit_extras.chart_container import chart_container
-from streamlit_extras.dataframe_explorer import dataframe_explorer
 import streamlit_scrollable_textbox as stx
 import altair as alt
 
+import REF2021_explorer.batch_search as bs
 import REF2021_explorer.codebook as cb
+import REF2021_explorer.cross_search as cs
+import REF2021_explorer.filters as flt
+import REF2021_explorer.histograms as hg
+import REF2021_explorer.logstore as ls
+import REF2021_explorer.metadata as md
+import REF2021_explorer.planner as pl
 import REF2021_explorer.process as proc
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.records as rs
+import REF2021_explorer.search_index as si
 import REF2021_explorer.shared_content as sh
+import REF2021_explorer.snippets as snp
+import REF2021_explorer.trigram_index as ti
 
 importlib.reload(sh)
 
@@ -27,6 +39,8 @@ DESCRIPTION_MEASURES = ["min", "max", "mean", "std"]
 
 BIN_OPTIONS = [5, 10, 25, 50]
 
+PREVIEW_ROWS = 100
+
 
 def clean_titles(title):
     """Clean titles.
@@ -96,6 +110,45 @@ def show_counts_percent_chart(
         )
 
 
+def show_scatter_chart(dset, column_x, column_y, correlations=None):
+    """Draw a scatter plot with its regression line fitted on the server.
+
+    Only the fitted line and the points, binned when there are more than
+    process.MAX_SCATTER_POINTS, are sent to the browser.
+
+    Args:
+        dset (pandas.DataFrame): dataset
+        column_x (str): column for the x axis
+        column_y (str): column for the y axis
+        correlations (pandas.DataFrame): correlation matrix including both
+            columns; see process.correlation_matrix
+    """
+
+    if correlations is None:
+        correlations = proc.correlation_matrix(dset, [column_x, column_y])
+    correlation_coefficient = correlations.loc[column_x, column_y]
+    points = proc.scatter_points(dset, column_x, column_y)
+    scatter = alt.Chart(points).mark_circle().encode(x=column_x, y=column_y)
+    if points[COLUMN_STATS[0]].max() > 1:
+        scatter = scatter.encode(
+            size=alt.Size(COLUMN_STATS[0], type="quantitative"),
+            tooltip=[column_x, column_y, COLUMN_STATS[0]],
+        )
+    chart = scatter
+    line = proc.fit_line(dset, column_x, column_y)
+    if line is not None:
+        chart = scatter + alt.Chart(line).mark_line(color="red").encode(
+            x=column_x, y=column_y
+        )
+
+    st.altair_chart(
+        chart.properties(
+            title=f"Correlation coefficient: {correlation_coefficient:.2f}"
+        ),
+        use_container_width=True,
+    )
+
+
 def show_counts_percent_grouped_chart(
     dset,
     title,
@@ -227,44 +280,128 @@ def display_added_columns(dset):
         stx.scrollableTextbox("\n".join(columns_added_to_print), key="stx_added")
 
 
-def display_data_description(dset, description=""):
+def display_data_description(dset, description="", page=None):
     """Display a description of the data.
 
     Args:
         dset (pandas.DataFrame): dataset
         logs (str): logs
         description (str): description
+        page (str): page of the dataset, to read the field statistics from its catalog
     """
 
     display_description(description)
 
     display_added_columns(dset)
 
-    display_fields(dset)
+    display_fields(dset, page=page)
+
 
+def display_logs(logs, key="logs"):
+    """Display one page of the logs, optionally filtered by a keyword.
 
-def display_logs(logs):
-    """Display logs.
+    Only the lines on the page are sent to the browser.
 
     Args:
-        logs (str): logs
+        logs (dict): log store; see logstore.build_store
+        key (str): prefix of the widget keys
     """
 
-    stx.scrollableTextbox(logs, key="stx_logs")
+    cols = st.columns([0.6, 0.2, 0.2], gap="small")
+    keyword = cols[0].text_input(sh.LOGS_SEARCH_PROMPT, key=f"{key}_search")
+    if keyword:
+        line_numbers = ls.search(logs, keyword)
+        total = len(line_numbers)
+    else:
+        line_numbers = None
+        total = ls.line_count(logs)
+    number = cols[1].number_input(
+        sh.LOGS_PAGE_PROMPT,
+        min_value=1,
+        max_value=ls.page_count(total),
+        key=f"{key}_page",
+    )
+    cols[2].markdown("")
+    from_end = cols[2].toggle(sh.LOGS_FROM_END_PROMPT, key=f"{key}_from_end")
 
+    positions = ls.page_range(total, number, from_end=from_end)
+    if line_numbers is None:
+        lines = ls.get_lines(logs, positions)
+        caption = sh.LOGS_LINES_TEXT
+    else:
+        lines = [
+            f"{line_numbers[position] + 1}: {line}"
+            for position, line in zip(
+                positions, ls.get_lines(logs, line_numbers[positions])
+            )
+        ]
+        caption = sh.LOGS_HITS_TEXT
+    st.caption(
+        caption.format(
+            start=positions.start + 1 if lines else 0,
+            stop=positions.stop,
+            total=total,
+        )
+    )
+    stx.scrollableTextbox("\n".join(lines), key=f"stx_{key}")
 
-def display_fields(dset):
-    """Display fields.
+
+def get_field_values(dset, column_name, statistics):
+    """Get the sorted distinct values of a field.
+
+    Args:
+        dset (pandas.DataFrame): dataset
+        column_name (str): field name
+        statistics (dict): catalog statistics of the fields
+
+    Returns:
+        list: sorted distinct values
+    """
+
+    if "values" in statistics.get(column_name, {}):
+        return statistics[column_name]["values"]
+
+    return sorted(dset[column_name].dropna().unique())
+
+
+def get_field_description(dset, column_name, statistics):
+    """Get the min, max, mean and std of a numeric field.
 
     Args:
         dset (pandas.DataFrame): dataset
+        column_name (str): field name
+        statistics (dict): catalog statistics of the fields
+
+    Returns:
+        dict: description measures
+    """
+
+    if "mean" in statistics.get(column_name, {}):
+        return {
+            measure: statistics[column_name][measure]
+            for measure in DESCRIPTION_MEASURES
+        }
+
+    return dset[column_name].describe().loc[DESCRIPTION_MEASURES].to_dict()
+
+
+def display_fields(dset, page=None):
+    """Display fields.
+
+    Args:
+        dset (pandas.DataFrame): dataset, with all the records of the page
+        page (str): page of the dataset, to read the field statistics from its catalog
     """
 
     st.markdown(sh.FIELDS_TITLE)
+    statistics = {}
+    if page is not None:
+        statistics = md.column_statistics(md.get_catalog(page))
     column_dtypes = [(column, str(dtype)) for column, dtype in dset.dtypes.items()]
     for [column_name, column_type] in column_dtypes:
         if column_type == "category":
-            categories_count = dset[column_name].nunique()
+            categories = get_field_values(dset, column_name, statistics)
+            categories_count = len(categories)
             if categories_count > 1:
                 categories_count_text = sh.CATEGORY_LABEL_PLURAL
             else:
@@ -274,7 +411,7 @@ def display_fields(dset):
                 f"{categories_count} {categories_count_text}*"
             )
             if column_name not in cb.FIELDS_TO_NOT_DISPLAY:
-                categories = "\n".join(sorted(dset[column_name].dropna().unique()))
+                categories = "\n".join(categories)
                 if categories_count > 1:
                     stx.scrollableTextbox(categories, key=f"stx_{column_name}")
                 else:
@@ -283,15 +420,12 @@ def display_fields(dset):
 
         elif column_type in ["int64", "float64"]:
             column_type = "number"
-            column_description = pd.DataFrame(
-                data=[
-                    dset[column_name]
-                    .describe()
-                    .loc[DESCRIPTION_MEASURES]
-                    .round(0)
-                    .astype(int)
-                    .to_dict()
-                ]
+            column_description = (
+                pd.DataFrame(
+                    data=[get_field_description(dset, column_name, statistics)]
+                )
+                .round(0)
+                .astype(int)
             )
 
             st.markdown(f"**{column_name}** - *{column_type}*")
@@ -299,7 +433,7 @@ def display_fields(dset):
         elif column_type in ["string", "object"]:
             st.markdown(f"**{column_name}** - *{sh.OBJECT_LABEL}*")
             if column_name not in cb.FIELDS_TO_NOT_DISPLAY:
-                items = "\n".join(sorted(dset[column_name].dropna().unique()))
+                items = "\n".join(get_field_values(dset, column_name, statistics))
                 stx.scrollableTextbox(items, key=f"stx_{column_name}")
         else:
             st.markdown(f"`{column_name}` ({column_type})")
@@ -314,15 +448,54 @@ def display_metrics(dset, labels=None):
         dset (pandas.DataFrame): dataset
     """
 
+    show_metrics(dset.shape[0], dset[cb.COL_INST_NAME].nunique(), labels=labels)
+
+
+def show_metrics(nrecords, ninstitutions, labels=None):
+    """Show the numbers of records and institutions.
+
+    Args:
+        nrecords (int): number of records
+        ninstitutions (int): number of institutions
+        labels (list): labels of the two metrics
+    """
+
     if labels is None:
         labels = [sh.RECORDS_LABEL, sh.INSTITUTIONS_LABEL]
     with st.container(border=True):
         cols = st.columns(2)
-        cols[0].metric(label=labels[0], value=dset.shape[0])
-        cols[1].metric(
-            label=labels[1],
-            value=dset[cb.COL_INST_NAME].nunique(),
-        )
+        cols[0].metric(label=labels[0], value=nrecords)
+        cols[1].metric(label=labels[1], value=ninstitutions)
+
+
+def display_streaming_preview(batches, rows=PREVIEW_ROWS):
+    """Display the metrics and first rows of a dataset while it streams in.
+
+    Only the institution names seen so far are kept besides the current
+    batch, so the preview needs little memory whatever the dataset size.
+
+    Args:
+        batches (iterator): The batches of the dataset; see read_write.iter_data.
+        rows (int): The number of first rows to show.
+    """
+
+    st.caption(sh.STREAMING_TEXT)
+    with st.container(border=True):
+        cols = st.columns(2)
+        records_metric = cols[0].empty()
+        institutions_metric = cols[1].empty()
+    first_rows = st.empty()
+
+    records = 0
+    institutions = set()
+    for batch in batches:
+        if records == 0:
+            first_rows.dataframe(batch.head(rows), use_container_width=False)
+        records += batch.shape[0]
+        if cb.COL_INST_NAME in batch.columns:
+            institutions.update(batch[cb.COL_INST_NAME].dropna().unique())
+        records_metric.metric(label=sh.RECORDS_LABEL, value=records)
+        institutions_metric.metric(label=sh.INSTITUTIONS_LABEL, value=len(institutions))
 
 
 def display_dataframe(dset, data_prefix=""):
@@ -351,13 +524,45 @@ def display_table_from_dictionary(dict_data):
         st.text(f"{items[0]} \t{items[1]}")
 
 
-def display_distributions(dset, data_prefix="", key=None):
+def display_distributions(dset, data_prefix="", key=None, page=None):
     """Display distributions for a selected column.
 
     Args:
         dset (pandas.DataFrame): dataset
         data_prefix (str): data prefix
         key (str): key
+        page (str): page of the dataset, whose aggregation cube answers the
+            distributions; the cube is only read, and built the first time,
+            when a chart is requested (see process.build_cube)
+    """
+
+    display_distribution_charts(
+        proc.get_column_lists(dset, "category"),
+        dset.shape[0],
+        lambda column: proc.calculate_counts(
+            dset, column, sort=True, cube=None if page is None else rw.get_cube(page)
+        ),
+        lambda columns: proc.calculate_grouped_counts(
+            dset, columns, cube=None if page is None else rw.get_cube(page)
+        ),
+        data_prefix=data_prefix,
+        key=key,
+    )
+
+
+def display_distribution_charts(
+    fields, nrecords, count_values, count_groups, data_prefix="", key=None
+):  # pylint: disable=R0913,R0917
+    """Display the distributions of one or two selected columns.
+
+    Args:
+        fields (list): categorical columns to choose from
+        nrecords (int): number of records
+        count_values (callable): counts of a column; see process.calculate_counts
+        count_groups (callable): counts of a list of columns; see
+            process.calculate_grouped_counts
+        data_prefix (str): data prefix
+        key (str): key
     """
 
     st.markdown(
@@ -366,8 +571,6 @@ def display_distributions(dset, data_prefix="", key=None):
         )
     )
 
-    fields = proc.get_column_lists(dset, "category")
-
     # one-variable distribution
     st.divider()
     st.markdown(sh.ONE_VARIABLE_DISTRIBUTION_TITLE)
@@ -386,12 +589,11 @@ def display_distributions(dset, data_prefix="", key=None):
                 key=f"radio_{key}_{column_to_plot}",
             )
 
-        dset_stats_one_var = proc.calculate_counts(dset, column_to_plot, sort=True)
+        dset_stats_one_var = count_values(column_to_plot)
 
         show_counts_percent_chart(
             dset_stats_one_var,
-            f"{clean_titles(column_to_plot)} "
-            f"(N = {dset.shape[0]}{data_prefix} records)",
+            f"{clean_titles(column_to_plot)} " f"(N = {nrecords}{data_prefix} records)",
             column_to_plot,
             stats_type=stats_type_one_var,
         )
@@ -402,7 +604,10 @@ def display_distributions(dset, data_prefix="", key=None):
     cols = st.columns(3)
     with cols[0]:
         column_one_to_plot = st.selectbox(
-            sh.DISTRIBUTION_SELECT_PROMPT_1, fields, key=f"select_{key}_two_1", index=None
+            sh.DISTRIBUTION_SELECT_PROMPT_1,
+            fields,
+            key=f"select_{key}_two_1",
+            index=None,
         )
     if column_one_to_plot:
         fields_2 = [field for field in fields if field != column_one_to_plot]
@@ -422,13 +627,11 @@ def display_distributions(dset, data_prefix="", key=None):
                     horizontal=True,
                     key=f"radio_{key}_{column_one_to_plot}_{column_two_to_plot}",
                 )
-            dset_stats_two_vars = proc.calculate_grouped_counts(
-                dset, [column_one_to_plot, column_two_to_plot]
-            )
+            dset_stats_two_vars = count_groups([column_one_to_plot, column_two_to_plot])
             show_counts_percent_grouped_chart(
                 dset_stats_two_vars,
                 f"{clean_titles(column_one_to_plot)} by {clean_titles(column_two_to_plot)} "
-                f"(N = {dset.shape[0]}{data_prefix} records)",
+                f"(N = {nrecords}{data_prefix} records)",
                 [
                     column_one_to_plot,
                     column_two_to_plot,
@@ -450,7 +653,7 @@ def display_histograms(dset, data_prefix="", key=None):
     column_selected = st.selectbox(
         sh.DISTRIBUTION_SELECT_PROMPT, fields, key=key, index=0
     )
-    cols = st.columns(2)
+    cols = st.columns(3)
     with cols[0]:
         stats_type = st.radio(
             sh.SELECT_STATS_PROMPT,
@@ -460,6 +663,14 @@ def display_histograms(dset, data_prefix="", key=None):
             key=f"radio_{key}_{column_selected}",
         )
     with cols[1]:
+        method = st.radio(
+            sh.BIN_METHOD_PROMPT,
+            options=hg.BIN_METHODS,
+            index=0,
+            horizontal=True,
+            key=f"radio_bins_{key}_{column_selected}",
+        )
+    with cols[2]:
         bins = st.select_slider(
             sh.BIN_NUMBER_PROMPT,
             options=BIN_OPTIONS,
@@ -467,23 +678,15 @@ def display_histograms(dset, data_prefix="", key=None):
             key=f"slider_bins_{key}_{column_selected}",
         )
     if column_selected:
-        dset_temp = pd.cut(dset[column_selected], bins).apply(
-            lambda x: pd.Interval(
-                int(round(x.left)), int(round(x.right)), closed="right"
-            )
-        )
-        dset_plot = dset_temp.value_counts(normalize=False).to_frame(
-            name=COLUMN_STATS[0]
-        )
-        dset_plot = dset_plot.merge(
-            dset_temp.value_counts(normalize=True).to_frame(name=COLUMN_STATS[1]),
-            how="left",
-            left_index=True,
-            right_index=True,
-        )
-        dset_plot[COLUMN_STATS[1]] = np.round(dset_plot[COLUMN_STATS[1]] * 100)
-        dset_plot.index.name = column_selected
-        dset_plot.index = dset_plot.index.astype(str)
+        values = dset[column_selected].to_numpy(dtype=float, na_value=np.nan)
+        dset_plot = hg.histogram(values, bins, method, column_selected)
+        if dset_plot is None:
+            st.warning(sh.NOT_SUITABLE_FOR_HISTOGRAM_WARNING)
+            return
+        if method == hg.LOG and dset_plot[COLUMN_STATS[0]].sum() < np.sum(
+            np.isfinite(values)
+        ):
+            st.caption(sh.NOT_SUITABLE_FOR_LOG_BINS_WARNING)
 
         with st.container(border=True):
             show_counts_percent_chart(
@@ -494,11 +697,12 @@ def display_histograms(dset, data_prefix="", key=None):
             )
 
 
-def display_grouped_distribution(dset, key=None):
+def display_grouped_distribution(dset, key=None, cube=None):
     """Display a grouped distribution for a selected column.
 
     Args:
         dset (pandas.DataFrame): dataset
+        cube (dict): aggregation cube of the dataset; see process.build_cube
     """
     fields = proc.get_column_lists(dset, "category")
     columns_to_plot = st.multiselect(
@@ -509,23 +713,32 @@ def display_grouped_distribution(dset, key=None):
         default=None,
     )
     if len(columns_to_plot) == 2:
-        dset_stats = proc.calculate_grouped_counts(dset, columns_to_plot)
+        dset_stats = proc.calculate_grouped_counts(dset, columns_to_plot, cube=cube)
         with chart_container(dset_stats, export_formats=sh.DATA_EXPORT_FORMATS):
             show_grouped_counts_chart(
                 dset_stats, columns_to_plot[0], columns_to_plot[1], columns_to_plot[0]
             )
 
 
-def display_data_explorer(dset, key=None, do_histograms=False):
+def display_data_explorer(dset, key=None, do_histograms=False, page=None):
     """Display a data explorer for a selected dataset.
 
     Args:
         dset (pandas.DataFrame): dataset
+        page (str): page of the dataset, whose aggregation cube answers the
+            distributions while no records are filtered out
     """
 
     with st.container(border=True):
         st.markdown(sh.DATA_EXPLORER_DESCRIPTION)
-        dset_explore = dataframe_explorer(dset)
+        dset_explore = flt.filter_dataframe(
+            dset,
+            index=None if page is None else flt.get_index(page),
+            key=f"filters_{page}",
+        )
+        cube_page = None
+        if dset_explore.shape[0] == dset.shape[0]:
+            cube_page = page
 
         if dset_explore.shape[0] == 0:
             st.warning(sh.NO_SELECTED_RECORDS_WARNING)
@@ -554,7 +767,7 @@ def display_data_explorer(dset, key=None, do_histograms=False):
             with tabs[0]:
                 if not do_histograms:
                     display_distributions(
-                        dset_explore, data_prefix=data_prefix, key=key
+                        dset_explore, data_prefix=data_prefix, key=key, page=cube_page
                     )
                 else:
                     vtabs = st.tabs(
@@ -562,7 +775,10 @@ def display_data_explorer(dset, key=None, do_histograms=False):
                     )
                     with vtabs[0]:
                         display_distributions(
-                            dset_explore, data_prefix=data_prefix, key=key
+                            dset_explore,
+                            data_prefix=data_prefix,
+                            key=key,
+                            page=cube_page,
                         )
                     with vtabs[1]:
                         display_histograms(
@@ -570,3 +786,277 @@ def display_data_explorer(dset, key=None, do_histograms=False):
                         )
             with tabs[1]:
                 display_dataframe(dset_explore, data_prefix=data_prefix)
+
+
+def display_planned_explorer(page, key=None):
+    """Display a data explorer for a data source too large to load.
+
+    The filters are translated into SQL and the metrics, distributions and
+    rows shown are queried from the source; see planner.
+
+    Args:
+        page (str): page of the data source
+        key (str): key
+    """
+
+    catalog = md.get_catalog(page)
+    show_metrics(
+        catalog["rows"],
+        len(md.column_statistics(catalog)[cb.COL_INST_NAME].get("values", [])),
+    )
+    with st.container(border=True):
+        st.markdown(sh.DATA_EXPLORER_DESCRIPTION)
+        st.caption(sh.PLANNED_TEXT)
+        states = pl.filter_states(catalog, key=f"filters_{page}")
+        nrecords, ninstitutions = pl.count_rows(page, states)
+
+        if nrecords == 0:
+            st.warning(sh.NO_SELECTED_RECORDS_WARNING)
+            return
+        data_prefix = ""
+        if states:
+            data_prefix = " selected"
+            show_metrics(
+                nrecords,
+                ninstitutions,
+                labels=[
+                    f"{sh.SELECTED_LABEL} {sh.RECORDS_LABEL.lower()}",
+                    f"{sh.SELECTED_LABEL} {sh.INSTITUTIONS_LABEL.lower()}",
+                ],
+            )
+
+        tabs = st.tabs(
+            [
+                sh.VISUALISE_TAB_HEADER.replace(
+                    sh.DATA_TEXT_TO_REPLACE,
+                    f"{data_prefix}{sh.DATA_TEXT_TO_REPLACE}",
+                ),
+                sh.SHOW_TAB_HEADER.replace(
+                    sh.DATA_TEXT_TO_REPLACE,
+                    f"{data_prefix}{sh.DATA_TEXT_TO_REPLACE}",
+                ),
+            ]
+        )
+        with tabs[0]:
+            display_distribution_charts(
+                pl.category_columns(catalog),
+                nrecords,
+                lambda column: pl.count_values(page, states, column, nrecords),
+                lambda columns: pl.count_groups(page, states, columns),
+                data_prefix=data_prefix,
+                key=key,
+            )
+        with tabs[1]:
+            dset_rows = pl.select_rows(page, states, catalog)
+            if dset_rows.shape[0] < nrecords:
+                st.caption(
+                    sh.PLANNED_ROWS_TEXT.format(
+                        shown=dset_rows.shape[0], total=nrecords
+                    )
+                )
+            display_dataframe(dset_rows, data_prefix=data_prefix)
+
+
+def search_statements(page, section, query, records=None, exact=False):
+    """Search a section of the statements.
+
+    Args:
+        page (str): page of the data source
+        section (str): the text column to search
+        query (str): the search query, or the text to find if exact
+        records (array-like): the record ids to search in; defaults to all
+        exact (bool): whether to find the query as a substring
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray, int, re.Pattern): the ids of the hits
+            to show, their scores (None if exact), the number of hits and
+            the pattern of the matches
+    """
+
+    if exact:
+        record_ids = ti.query(page, section, query, records)
+        return record_ids[: si.TOP_K], None, len(record_ids), snp.text_pattern(query)
+    record_ids, scores, total = si.search(si.get_index(page, section), query, records)
+
+    return record_ids, scores, total, snp.word_pattern(query)
+
+
+def hit_labels(dset_hits, scores=None):
+    """Label the search hits with the columns describing them and their scores.
+
+    Args:
+        dset_hits (pandas.DataFrame): the columns describing the hits
+        scores (numpy.ndarray): the scores of the hits, if ranked
+
+    Returns:
+        (dict): the labels by record id, e.g. "University · UoA 1 · score 2.50"
+    """
+
+    labels = {}
+    for position, (record, row) in enumerate(dset_hits.iterrows()):
+        labels[record] = " · ".join(str(value) for value in row)
+        if scores is not None:
+            labels[record] += f" · {sh.SCORE_LABEL.lower()} {scores[position]:.2f}"
+
+    return labels
+
+
+def display_full_section(page, section, labels):
+    """Display the whole section of the record chosen by the user.
+
+    Only the chosen record is read from the data source; see records.
+
+    Args:
+        page (str): page of the data source
+        section (str): the text column
+        labels (dict): the labels of the records to choose from, by record id
+    """
+
+    record = st.selectbox(
+        sh.SHOW_SECTION_PROMPT,
+        [None, *labels],
+        format_func=lambda record: "" if record is None else labels[record],
+        key=f"full_section_{page}",
+    )
+    if record is not None:
+        text = rs.get_texts(page, [record], section)[0]
+        stx.scrollableTextbox(text or "", key=f"stx_section_{page}")
+
+
+def display_statement_search(
+    page, section, query, columns, records=None, exact=False
+):  # pylint: disable=R0913,R0917
+    """Display the snippets of the records whose section best matches a search.
+
+    The records are ranked with the search index of the section; see
+    search_index. Exact searches find every record containing the query, as
+    ILIKE would, in the order of the data source; see trigram_index. Only
+    the section of the first hits is read, by record (see records), and
+    only the snippets of text around the matches are shown (see snippets).
+
+    Args:
+        page (str): page of the data source
+        section (str): the text column to search
+        query (str): the search query, or the text to find if exact
+        columns (list): the columns describing a record
+        records (array-like): the record ids to search in; defaults to all
+        exact (bool): whether to find the query as a substring
+    """
+
+    record_ids, scores, total, pattern = search_statements(
+        page, section, query, records, exact
+    )
+    if total == 0:
+        st.error(sh.NO_SELECTED_RECORDS_WARNING)
+        return
+    st.metric(sh.HITS_LABEL, total)
+    if total > len(record_ids):
+        st.caption(
+            (sh.SEARCH_FIRST_RESULTS_TEXT if exact else sh.SEARCH_RESULTS_TEXT).format(
+                shown=len(record_ids), total=total
+            )
+        )
+
+    labels = hit_labels(rs.get_keys(page).loc[record_ids, columns], scores)
+    for record, text in zip(record_ids, rs.get_texts(page, record_ids, section)):
+        st.markdown(
+            f"**{snp.escape_markdown(labels[record])}**  \n"
+            + snp.highlight_markdown(*snp.snippet(text, pattern))
+        )
+
+    display_full_section(page, section, labels)
+
+
+def display_batch_search(page, section, by, records=None):
+    """Display the hit matrix of a list of terms typed or uploaded by the user.
+
+    Args:
+        page (str): page of the data source
+        section (str): the text column to search
+        by (list): the key columns to count the hits by
+        records (array-like): the record ids to search in; defaults to all
+    """
+
+    st.caption(sh.BATCH_SEARCH_TEXT)
+    cols = st.columns(2)
+    with cols[0]:
+        text = st.text_area(sh.BATCH_TERMS_PROMPT, key=f"batch_terms_{page}")
+    with cols[1]:
+        uploaded = st.file_uploader(
+            sh.BATCH_UPLOAD_PROMPT, type=["txt", "csv"], key=f"batch_file_{page}"
+        )
+    if uploaded is not None:
+        text = "\n".join([text, uploaded.getvalue().decode("utf-8", "replace")])
+    terms = bs.parse_terms(text)
+    if not (section and terms):
+        return
+
+    dset_hits = bs.hit_matrix(page, section, terms, by=by, records=records)
+    st.dataframe(dset_hits, use_container_width=USE_CONTAINER_WIDTH)
+    st.download_button(
+        sh.DOWNLOAD_CSV_LABEL,
+        dset_hits.to_csv(),
+        file_name=f"{page}_hits.csv",
+        mime="text/csv",
+        key=f"batch_download_{page}",
+    )
+
+
+def display_cross_search(query):
+    """Display the snippets of the best matching sections of all the texts.
+
+    Every section of every text source is searched at once; see
+    cross_search. Only the sections of the best hits are read, and only the
+    snippets of text around the matches are shown.
+
+    Args:
+        query (str): the search query
+    """
+
+    dset_hits, dset_totals = cs.search(query)
+    failed = dset_totals[dset_totals[cs.HITS_COLUMN].isna()]
+    if not failed.empty:
+        st.warning(
+            sh.SEARCH_FAILED_WARNING.format(
+                sections=", ".join(failed[cs.SECTION_COLUMN])
+            )
+        )
+    total = int(dset_totals[cs.HITS_COLUMN].sum())
+    if total == 0:
+        st.error(sh.NO_SELECTED_RECORDS_WARNING)
+        return
+    st.metric(sh.HITS_LABEL, total)
+    st.dataframe(
+        dset_totals.assign(
+            **{cs.PAGE_COLUMN: dset_totals[cs.PAGE_COLUMN].map(sh.PAGE_TITLES)}
+        ).rename(
+            columns={
+                cs.PAGE_COLUMN: sh.SOURCE_LABEL,
+                cs.SECTION_COLUMN: sh.SECTION_LABEL,
+                cs.HITS_COLUMN: sh.HITS_LABEL,
+            }
+        ),
+        hide_index=True,
+        use_container_width=USE_CONTAINER_WIDTH,
+    )
+    if total > len(dset_hits):
+        st.caption(sh.SEARCH_RESULTS_TEXT.format(shown=len(dset_hits), total=total))
+
+    sections = {
+        (page, section): cs.hit_texts(page, section, dset_group[cs.RECORD_COLUMN])
+        for (page, section), dset_group in dset_hits.groupby(
+            [cs.PAGE_COLUMN, cs.SECTION_COLUMN], sort=False
+        )
+    }
+    pattern = snp.word_pattern(query)
+    for hit in dset_hits.itertuples(index=False):
+        row = sections[(hit.page, hit.section)].loc[hit.Record]
+        label = " · ".join(
+            [sh.PAGE_TITLES[hit.page], hit.section]
+            + [str(value) for value in row.drop(hit.section)]
+            + [f"{sh.SCORE_LABEL.lower()} {hit.score:.2f}"]
+        )
+        st.markdown(
+            f"**{snp.escape_markdown(label)}**  \n"
+            + snp.highlight_markdown(*snp.snippet(row[hit.section], pattern))
+        )
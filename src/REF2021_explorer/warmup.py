@@ -0,0 +1,150 @@
+# pylint: disable=E0401
+""" Opt-in warm-up of the data caches when the server starts.
+
+Every data source, its catalog, its aggregation cube and its processing
+logs are loaded into the caches by a thread pool, in priority order, with
+the same calls as the pages make, so that the pages find them in the caches:
+the environment statement pages only read their key columns, through their
+record store, and have no cube, only the Results page has profiles, and
+the sources explored with SQL only load their catalog and logs.
+Streamlit caches lock each value while it is computed, so a page visit that
+arrives during the warm-up waits for the in-flight load instead of starting
+a second one.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import REF2021_explorer.metadata as md
+import REF2021_explorer.read_write as rw
+import REF2021_explorer.records as rs
+
+LOGGER = logging.getLogger(__name__)
+
+# settings
+WARMUP = os.environ.get("REF2021_WARMUP", "").lower() in ["1", "true", "yes"]
+WARMUP_WORKERS = int(os.environ.get("REF2021_WARMUP_WORKERS", "4"))
+WARMUP_ORDER = [
+    page.strip()
+    for page in os.environ.get(
+        "REF2021_WARMUP_ORDER",
+        "results,inst_env_statements,unit_env_statements,outputs,impacts,"
+        "degrees,income,income_in_kind,groups",
+    ).split(",")
+    if page.strip()
+]
+
+
+status = {}
+_executors = []
+_lock = threading.Lock()
+
+
+def page_loaders(page, planned=False):
+    """Get the loaders of the items a page reads.
+
+    Args:
+        page (str): The page.
+        planned (bool): Whether the source of the page is explored with SQL
+            instead of loaded; see read_write.is_planned.
+
+    Returns:
+        (dict): The functions loading each item of the page, keyed by item.
+    """
+
+    if planned:
+        return {"catalog": md.get_catalog, "logs": rw.get_logs}
+    if page in rw.TEXT_SOURCES:
+        return {
+            "data": rs.get_store,
+            "catalog": md.get_catalog,
+            "logs": rw.get_logs,
+        }
+    loaders = {
+        "data": rw.get_data,
+        "catalog": md.get_catalog,
+        "cube": rw.get_cube,
+        "logs": rw.get_logs,
+    }
+    if page in rw.PROFILE_PAGES:
+        loaders["profiles"] = rw.get_profiles
+
+    return loaders
+
+
+def warm_up(page, kind):
+    """Load one item into the caches and record its status.
+
+    Args:
+        page (str): The page to load.
+        kind (str): The item to load; see page_loaders.
+    """
+
+    status[(page, kind)] = "loading"
+    started = time.perf_counter()
+    try:
+        loader = page_loaders(page, rw.is_planned(page)).get(kind)
+        if loader is None:  # the source is explored with SQL, not loaded
+            status[(page, kind)] = "skipped"
+            return
+        rw.run_in_context(rw.loader_context(), loader, page)
+    except Exception as error:  # pylint: disable=W0718
+        status[(page, kind)] = "failed"
+        LOGGER.warning("Warm-up of %s %s failed: %s", page, kind, error)
+        return
+    status[(page, kind)] = "done"
+    done, total = progress()
+    LOGGER.info(
+        "Warmed up %s %s in %.1fs (%d/%d)",
+        page,
+        kind,
+        time.perf_counter() - started,
+        done,
+        total,
+    )
+
+
+def start(order=None, workers=None):
+    """Start the warm-up once per process.
+
+    Args:
+        order (list): The pages in priority order; defaults to WARMUP_ORDER,
+            followed by any other page in read_write.sources.
+        workers (int): The number of loader threads; defaults to WARMUP_WORKERS.
+    """
+
+    if order is None:
+        order = WARMUP_ORDER
+    order = [page for page in order if page in rw.sources["data"]]
+    order.extend(page for page in rw.sources["data"] if page not in order)
+
+    with _lock:
+        if _executors:
+            return
+        _executors.append(
+            ThreadPoolExecutor(
+                max_workers=workers or WARMUP_WORKERS, thread_name_prefix="warmup"
+            )
+        )
+        for page in order:
+            for kind in page_loaders(page):
+                status[(page, kind)] = "pending"
+                _executors[0].submit(warm_up, page, kind)
+        _executors[0].shutdown(wait=False)
+    LOGGER.info("Warm-up started for %s", ", ".join(order))
+
+
+def progress():
+    """Get the progress of the warm-up.
+
+    Returns:
+        (int, int): The number of finished items (loaded, failed or
+            skipped) and the total number of items; (0, 0) if the warm-up
+            has not started.
+    """
+
+    states = list(status.values())
+
+    return sum(state in ["done", "failed", "skipped"] for state in states), len(states)
@@ -0,0 +1,157 @@
+# pylint: disable=E0401
+""" Tests of the local mirror with file:// and local HTTP sources. """
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import REF2021_explorer.mirror as mr
+
+
+@pytest.fixture(name="cache_dir", autouse=True)
+def fixture_cache_dir(tmp_path, monkeypatch):
+    """Mirror into a temporary cache directory."""
+
+    monkeypatch.setattr(mr, "CACHE_DIR", tmp_path / "cache")
+
+    return mr.CACHE_DIR
+
+
+@pytest.fixture(name="source")
+def fixture_source(tmp_path):
+    """A local data file and its file:// URL."""
+
+    fname = tmp_path / "source" / "data.parquet"
+    fname.parent.mkdir()
+    fname.write_bytes(b"version 1")
+
+    return fname, fname.as_uri()
+
+
+@pytest.fixture(name="server")
+def fixture_server(source):
+    """A local HTTP server serving the directory of the data file."""
+
+    handler = partial(SimpleHTTPRequestHandler, directory=str(source[0].parent))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/{source[0].name}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def count_stores(monkeypatch):
+    """Count the calls to mirror.store.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): The patcher of the test.
+
+    Returns:
+        (list): One item per call.
+    """
+
+    calls = []
+    store = mr.store
+
+    def counting_store(chunks):
+        calls.append(True)
+        return store(chunks)
+
+    monkeypatch.setattr(mr, "store", counting_store)
+
+    return calls
+
+
+def temporary_files(cache):
+    """List the partial downloads left in the cache.
+
+    Args:
+        cache (pathlib.Path): The cache directory.
+
+    Returns:
+        (list): The temporary files.
+    """
+
+    return list((cache / mr.OBJECTS_DIR).glob("*.tmp"))
+
+
+def test_file_revalidation(source, monkeypatch):
+    """An unchanged file is not copied again, a changed one is."""
+
+    fname, location = source
+    first = mr.fetch(location)
+    assert Path(first).read_bytes() == b"version 1"
+
+    stores = count_stores(monkeypatch)
+    assert mr.fetch(location) == first
+    assert not stores
+
+    fname.write_bytes(b"version 2")
+    stat = fname.stat()
+    os.utime(fname, (stat.st_atime, stat.st_mtime + 10))
+    second = mr.fetch(location)
+    assert second != first
+    assert Path(second).read_bytes() == b"version 2"
+    assert len(stores) == 1
+
+
+def test_http_revalidation(source, server, monkeypatch):
+    """An unmodified URL is answered by 304 and a modified one downloaded."""
+
+    fname, _ = source
+    first = mr.fetch(server)
+    assert Path(first).read_bytes() == b"version 1"
+
+    stores = count_stores(monkeypatch)
+    assert mr.fetch(server) == first
+    assert not stores
+
+    fname.write_bytes(b"version 2")
+    stat = fname.stat()
+    os.utime(fname, (stat.st_atime, stat.st_mtime + 10))
+    second = mr.fetch(server)
+    assert Path(second).read_bytes() == b"version 2"
+    assert len(stores) == 1
+
+
+def test_offline(source):
+    """Offline mode serves the mirrored copy without reading the source."""
+
+    fname, location = source
+    with pytest.raises(FileNotFoundError):
+        mr.fetch(location, offline=True)
+
+    mirrored = mr.fetch(location)
+    fname.unlink()
+    assert mr.fetch(location, offline=True) == mirrored
+    assert Path(mirrored).read_bytes() == b"version 1"
+
+
+def test_failed_download(source, cache_dir, monkeypatch):
+    """A download failing midway leaves no partial file and keeps the copy."""
+
+    fname, location = source
+    read_chunks = mr.read_chunks
+
+    def broken_chunks(_fname):
+        yield b"version"
+        raise ConnectionResetError("connection reset")
+
+    monkeypatch.setattr(mr, "read_chunks", broken_chunks)
+    with pytest.raises(ConnectionResetError):
+        mr.fetch(location)
+    assert not temporary_files(cache_dir)
+
+    monkeypatch.setattr(mr, "read_chunks", read_chunks)
+    mirrored = mr.fetch(location)
+
+    monkeypatch.setattr(mr, "read_chunks", broken_chunks)
+    fname.write_bytes(b"version 2")
+    stat = fname.stat()
+    os.utime(fname, (stat.st_atime, stat.st_mtime + 10))
+    assert mr.fetch(location) == mirrored
+    assert not temporary_files(cache_dir)